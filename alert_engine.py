@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+客流告警 - 每次爬取后只对数据有变化的景点评估规则，支持回差（滞回）与冷却时间
+
+规则（ALERT_RULES_FILE 指向的 JSON 列表，未设置时使用 DEFAULT_RULES）：
+    {"name": "承载率超过80%", "metric": "occupancy", "above": 0.8, "clear": 0.7, "cooldown": 3600}
+    {"name": "拥挤", "metric": "SSD", "equals": "拥挤", "codes": ["1", "2"]}
+
+- metric: occupancy（NUM / MAX_NUM）、num（NUM），或接口中的任意字段（如 SSD、TYPE，配合 equals）
+- above / clear: 数值规则在 >= above 时触发，降到 clear 以下才解除（默认 above 的 90%）
+- equals: 字段等于该值时触发，不等时解除
+- cooldown: 同一规则同一景点两次触发之间的最短秒数
+- codes: 只对这些景点 CODE 生效；不给出时对所有景点生效
+
+告警输出（ALERT_SINKS，逗号分隔）：stdout、file:<路径>（JSONL）、webhook:<URL>（POST JSON）
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+import requests
+
+from crawl_sources import DEFAULT_SOURCE
+
+ALERT_RULES_FILE = os.getenv('ALERT_RULES_FILE')
+ALERT_SINKS = os.getenv('ALERT_SINKS', 'stdout')
+# 上一次快照与告警状态的保存路径（不设置时只保存在进程内，函数计算热启动时沿用）
+ALERT_STATE_FILE = os.getenv('ALERT_STATE_FILE')
+# webhook 的连接 / 读取超时（秒）：告警在数据写入之后发送，仍不宜让慢的接收端拖长一次爬取
+WEBHOOK_TIMEOUT = float(os.getenv('ALERT_WEBHOOK_TIMEOUT', '3'))
+# 数值规则未给出 clear 时，解除阈值为 above 的该比例
+DEFAULT_CLEAR_RATIO = 0.9
+
+DEFAULT_RULES = [
+    {'name': '承载率超过80%', 'metric': 'occupancy', 'above': 0.8, 'clear': 0.7, 'cooldown': 3600},
+    {'name': '舒适度变为拥挤', 'metric': 'SSD', 'equals': '拥挤', 'cooldown': 3600},
+]
+# 判断景点数据是否变化的字段
+WATCHED_FIELDS = ('NUM', 'MAX_NUM', 'SSD', 'TYPE')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Rule:
+    __slots__ = ('name', 'metric', 'above', 'clear', 'equals', 'cooldown', 'codes')
+
+    def __init__(self, name, metric, above=None, clear=None, equals=None, cooldown=0, codes=None):
+        if (above is None) == (equals is None):
+            raise ValueError(f"规则 {name} 需要且只能给出 above 或 equals 之一")
+        self.name = name
+        self.metric = metric
+        self.above = above
+        self.clear = above * DEFAULT_CLEAR_RATIO if above is not None and clear is None else clear
+        self.equals = equals
+        self.cooldown = cooldown
+        self.codes = tuple(codes) if codes else None
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(item['name'], item['metric'], above=item.get('above'), clear=item.get('clear'),
+                   equals=item.get('equals'), cooldown=item.get('cooldown', 0), codes=item.get('codes'))
+
+    def value(self, row):
+        if self.metric == 'occupancy':
+            num, max_num = _number(row.get('NUM')), _number(row.get('MAX_NUM'))
+            return num / max_num if num is not None and max_num else None
+        if self.metric == 'num':
+            return _number(row.get('NUM'))
+        return row.get(self.metric)
+
+    def check(self, value, active):
+        """回差：未触发时超过 above 才触发，已触发时降到 clear 以下才解除；返回新的触发状态"""
+        if value is None:
+            return active
+        if self.equals is not None:
+            return value == self.equals
+        return value >= self.clear if active else value >= self.above
+
+
+class StdoutSink:
+    def emit(self, alerts):
+        for alert in alerts:
+            mark = '告警' if alert['state'] == 'firing' else '解除'
+            print(f"[{mark}] {alert['rule']}: {alert['name']}（{alert['metric']} = {alert['value']}）")
+
+
+class FileSink:
+    """追加到本地 JSONL 文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """一次 POST 发送本次的所有告警：{"alerts": [...]}"""
+
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def emit(self, alerts):
+        response = self.session.post(self.url, json={'alerts': alerts}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def parse_sinks(spec=ALERT_SINKS):
+    """'stdout,file:/tmp/alerts.jsonl,webhook:https://...' -> [sink, ...]"""
+    sinks = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, target = item.partition(':')
+        if kind == 'stdout':
+            sinks.append(StdoutSink())
+        elif kind == 'file' and target:
+            sinks.append(FileSink(target))
+        elif kind == 'webhook' and target:
+            sinks.append(WebhookSink(target))
+        else:
+            raise ValueError(f"无效的告警输出: {item}")
+    return sinks
+
+
+def load_rules(path=ALERT_RULES_FILE):
+    """规则名是告警状态的键，重名时抛出 ValueError"""
+    if not path:
+        return [Rule.from_dict(item) for item in DEFAULT_RULES]
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = [Rule.from_dict(item) for item in json.load(f)]
+    names = set()
+    for rule in rules:
+        if rule.name in names:
+            raise ValueError(f"规则名重复: {rule.name}")
+        names.add(rule.name)
+    return rules
+
+
+def load_config(rules_path=ALERT_RULES_FILE, sinks_spec=ALERT_SINKS):
+    """
+    -> (rules, sinks)
+
+    规则文件不存在、格式有误或规则名重复时改用 DEFAULT_RULES，告警输出配置有误时改用 stdout，并打印警告：
+    告警配置错误不能让爬虫无法启动
+    """
+    try:
+        rules = load_rules(rules_path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"警告: 告警规则 {rules_path} 加载失败，使用默认规则: {e!r}")
+        rules = load_rules(None)
+    try:
+        sinks = parse_sinks(sinks_spec)
+    except ValueError as e:
+        print(f"警告: 告警输出配置有误，输出到 stdout: {e}")
+        sinks = [StdoutSink()]
+    return rules, sinks
+
+
+class AlertEngine:
+    """
+    增量告警引擎
+
+    - snapshot: 上一次爬取各景点的 WATCHED_FIELDS，本次只评估与之不同的景点
+    - 规则按 CODE 建立索引，每个变化的景点只评估其专属规则与全局规则，
+      评估开销与变化的景点数成正比，与规则总数无关
+    - states: {(规则名, CODE): [是否触发, 上次触发时间]}，按规则名而不是规则序号，
+      规则文件调整顺序或增删规则后重新加载时，状态仍对应原来的规则
+
+    冷却期内再次超过阈值不告警；之后该景点数据再变化时重新评估
+    """
+
+    def __init__(self, rules=None, sinks=None, state_path=ALERT_STATE_FILE):
+        self.rules = load_rules() if rules is None else list(rules)
+        self.sinks = parse_sinks() if sinks is None else list(sinks)
+        self.state_path = state_path
+        self.global_rules = []
+        self.rules_by_code = {}
+        for index, rule in enumerate(self.rules):
+            if rule.codes is None:
+                self.global_rules.append(index)
+            else:
+                for code in rule.codes:
+                    self.rules_by_code.setdefault(code, []).append(index)
+        self.snapshot = {}
+        self.states = {}
+        self.evaluated = 0
+        if state_path:
+            self._load_state()
+
+    def evaluate(self, rows, now=None):
+        """评估一次爬取的 rows，向各输出发送本次的告警，返回告警列表"""
+        now = now or datetime.now()
+        alerts = []
+        self.evaluated = 0
+        for row in rows:
+            code = row.get('CODE') or row.get('NAME')
+            if not code:
+                continue
+            fields = [row.get(field) for field in WATCHED_FIELDS]
+            if self.snapshot.get(code) == fields:
+                continue
+            self.snapshot[code] = fields
+            for index in self.rules_by_code.get(code, ()):
+                self._apply(index, code, row, now, alerts)
+            for index in self.global_rules:
+                self._apply(index, code, row, now, alerts)
+
+        if alerts:
+            self._emit(alerts)
+        if self.state_path:
+            self._save_state()
+        return alerts
+
+    def _apply(self, index, code, row, now, alerts):
+        self.evaluated += 1
+        rule = self.rules[index]
+        value = rule.value(row)
+        state = self.states.get((rule.name, code))
+        active = state is not None and state[0]
+        firing = rule.check(value, active)
+        if firing == active:
+            return
+        if firing:
+            last_fired = state[1] if state else None
+            if last_fired is not None and (now - last_fired).total_seconds() < rule.cooldown:
+                # 冷却期内不再触发，也不记为触发状态，冷却结束后仍超过阈值时再告警
+                return
+            self.states[(rule.name, code)] = [True, now]
+        else:
+            state[0] = False
+        alerts.append({
+            'rule': rule.name,
+            'state': 'firing' if firing else 'resolved',
+            'code': row.get('CODE'),
+            'name': row.get('NAME'),
+            'metric': rule.metric,
+            'value': round(value, 4) if isinstance(value, float) else value,
+            'time': row.get('TIME'),
+            'at': now.isoformat(),
+        })
+
+    def _emit(self, alerts):
+        for sink in self.sinks:
+            try:
+                sink.emit(alerts)
+            except Exception as e:
+                print(f"告警发送失败（{type(sink).__name__}）: {e}")
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        # 已删除的规则的状态不再恢复
+        names = {rule.name for rule in self.rules}
+        self.snapshot = state.get('snapshot', {})
+        for name, code, active, fired_at in state.get('states', []):
+            if name in names:
+                self.states[(name, code)] = [active, datetime.fromisoformat(fired_at) if fired_at else None]
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'snapshot': self.snapshot,
+                'states': [[name, code, active, fired_at.isoformat() if fired_at else None]
+                           for (name, code), (active, fired_at) in self.states.items()],
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+
+# 同一进程内复用的告警引擎（按数据源区分，函数计算热启动时保留上一次快照与告警状态）
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_engine(source=DEFAULT_SOURCE):
+    """
+    其他数据源的状态文件为 ALERT_STATE_FILE 加上数据源名，如 alerts.hangzhou.json
+
+    在爬虫初始化时调用，规则与输出配置有误时按 load_config() 回退，不抛出异常
+    """
+    with _shared_lock:
+        engine = _shared.get(source)
+        if engine is None:
+            state_path = ALERT_STATE_FILE
+            if state_path and source != DEFAULT_SOURCE:
+                base, ext = os.path.splitext(state_path)
+                state_path = f"{base}.{source}{ext or '.json'}"
+            rules, sinks = load_config(ALERT_RULES_FILE, ALERT_SINKS)
+            engine = _shared[source] = AlertEngine(rules, sinks, state_path=state_path)
+        return engine
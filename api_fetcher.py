@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""接口请求层 - 连接复用、短超时、截止时间内的抖动指数退避重试、对冲请求与熔断"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 连接 / 读取超时（秒）
+CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', '10'))
+# 单次爬取的总截止时间（秒），包括所有重试与退避等待
+FETCH_DEADLINE = float(os.getenv('API_FETCH_DEADLINE', '40'))
+MAX_ATTEMPTS = int(os.getenv('API_MAX_ATTEMPTS', '4'))
+# 退避等待：min(BACKOFF_MAX, BACKOFF_BASE * 2^n) 内均匀随机
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# 对冲请求：首个请求耗时超过历史延迟的该分位数时，再并发发出一个请求，取先成功者（0 为关闭）
+HEDGE_PERCENTILE = float(os.getenv('API_HEDGE_PERCENTILE', '0.9'))
+# 延迟样本不足时使用的对冲等待时间（秒）
+HEDGE_DEFAULT_DELAY = 3.0
+HEDGE_MIN_SAMPLES = 10
+# 熔断：连续失败达到阈值后，在冷却时间内直接放弃请求
+BREAKER_THRESHOLD = int(os.getenv('API_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.getenv('API_BREAKER_COOLDOWN', '300'))
+
+# 这些状态码视为临时故障，可以重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class FetchError(Exception):
+    """在截止时间内未能获取到数据"""
+
+
+class CircuitOpenError(FetchError):
+    """熔断器打开，本次不发起请求"""
+
+
+class _Fatal(Exception):
+    """不可重试的错误（如 4xx）"""
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器
+
+    - closed: 正常放行；连续失败 threshold 次后转为 open
+    - open: 冷却期内拒绝请求；冷却结束后转为 half_open
+    - half_open: 只放行一个试探请求，试探进行中其他调用直接拒绝；成功则恢复 closed，失败则重新 open
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and self.clock() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self.probing:
+                    return False
+                self.probing = True
+            return self.state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = self.clock()
+
+
+class LatencyTracker:
+    """最近成功请求的延迟样本，用于计算对冲阈值"""
+
+    def __init__(self, maxlen=200):
+        self.samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def percentile(self, q):
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[int(q * (len(ordered) - 1))]
+
+
+class ApiFetcher:
+    """
+    带重试、对冲与熔断的 GET 请求
+
+    fetch() 返回解析后的 JSON；validate(data) 返回 False 的响应（如业务错误码）视为临时故障重试。
+    limiter（有 reserve() 的限流器）给定时，每个 HTTP 请求（含重试与对冲请求）发出前都按它等待。
+    每次尝试（含对冲请求）记录在 attempts 中：
+    {'attempt': 第几轮, 'hedge': 是否对冲请求, 'status': HTTP状态码, 'latency': 秒, 'error': 错误信息}
+    """
+
+    def __init__(self, url, headers=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 deadline=FETCH_DEADLINE, max_attempts=MAX_ATTEMPTS, hedge_percentile=HEDGE_PERCENTILE,
+                 breaker=None, session=None, validate=None, seed=None, limiter=None):
+        self.url = url
+        self.headers = headers or {}
+        self.validate = validate
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self.latency = LatencyTracker()
+        self.rng = random.Random(seed)
+        self.session = session or self._new_session()
+        # 落败的请求会继续执行到超时，多留两个线程，避免下一轮的对冲请求排队
+        self._pool = ThreadPoolExecutor(max_workers=4) if hedge_percentile else None
+        self.attempts = []
+
+    @staticmethod
+    def _new_session():
+        session = requests.Session()
+        # 重试由本类控制，连接池保持长连接
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def hedge_delay(self):
+        """发出对冲请求前的等待时间"""
+        if len(self.latency.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return self.latency.percentile(self.hedge_percentile)
+
+    def fetch(self):
+        """在截止时间内获取数据，失败时抛出 FetchError（熔断时为 CircuitOpenError）"""
+        self.attempts = []
+        if not self.breaker.allow():
+            if self.breaker.state == 'half_open':
+                raise CircuitOpenError("熔断试探请求进行中，跳过本次请求")
+            raise CircuitOpenError(f"熔断中（连续失败 {self.breaker.failures} 次），跳过本次请求")
+
+        give_up_at = time.monotonic() + self.deadline
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                data = self._attempt(attempt, remaining)
+            except _Fatal as e:
+                self.breaker.record_failure()
+                raise FetchError(str(e)) from None
+            except Exception as e:
+                last_error = e
+            else:
+                self.breaker.record_success()
+                return data
+
+            backoff = self.rng.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+            if attempt == self.max_attempts or time.monotonic() + backoff >= give_up_at:
+                break
+            time.sleep(backoff)
+
+        self.breaker.record_failure()
+        raise FetchError(f"{len(self.attempts)} 次请求均失败，最后错误: {last_error}")
+
+    def summary(self):
+        """本次 fetch 的请求次数与各次延迟，用于日志"""
+        parts = []
+        for a in list(self.attempts):
+            # 落败的对冲请求可能仍在进行中
+            latency = '进行中' if a['latency'] is None else f"{a['latency']:.2f}s"
+            parts.append(f"{latency}{'(对冲)' if a['hedge'] else ''}{'' if a['error'] is None else '✗'}")
+        return f"{len(self.attempts)} 次请求: {', '.join(parts)}"
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False)
+        self.session.close()
+
+    def _attempt(self, attempt, remaining):
+        """一轮请求：首个请求超过对冲阈值仍未返回时并发发出第二个请求，取先成功的结果"""
+        timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+        if self._pool is None:
+            return self._request(attempt, False, timeout)
+
+        futures = [self._pool.submit(self._request, attempt, False, timeout)]
+        done, _ = wait(futures, timeout=min(self.hedge_delay(), remaining))
+        if not done:
+            futures.append(self._pool.submit(self._request, attempt, True, timeout))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except _Fatal:
+                    raise
+                except Exception as e:
+                    error = e
+        raise error
+
+    def _request(self, attempt, hedge, timeout):
+        if self.limiter is not None:
+            delay = self.limiter.reserve()
+            if delay > 0:
+                time.sleep(delay)
+        record = {'attempt': attempt, 'hedge': hedge, 'status': None, 'latency': None, 'error': None}
+        self.attempts.append(record)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.url, headers=self.headers, timeout=timeout)
+            record['status'] = response.status_code
+            if response.status_code in RETRY_STATUS:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise _Fatal(f"HTTP {response.status_code}")
+            data = response.json()
+            if self.validate is not None and not self.validate(data):
+                raise ValueError(f"响应校验失败: {str(data)[:100]}")
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['latency'] = time.perf_counter() - start
+        self.latency.add(record['latency'])
+        return data
+
+
+# 同一进程内复用的请求器（函数计算热启动时保留连接、延迟样本与熔断状态）
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_fetcher(url, headers=None, validate=None, limiter=None):
+    with _shared_lock:
+        fetcher = _shared.get(url)
+        if fetcher is None:
+            fetcher = _shared[url] = ApiFetcher(url, headers, validate=validate, limiter=limiter)
+        elif limiter is not None:
+            fetcher.limiter = limiter
+        return fetcher
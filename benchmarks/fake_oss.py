@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""本地 OSS 替身 - 实现代码中用到的 oss2.Bucket 方法，支持延迟与故障注入"""
+
+import os
+import bisect
+import hashlib
+import random
+import threading
+import time
+from collections import Counter
+
+import oss2
+from oss2.models import SimplifiedObjectInfo
+from oss2.headers import OSS_NEXT_APPEND_POSITION
+
+
+class FakeResult:
+    """模拟 oss2 返回的各类 Result 对象，只保留代码会读取的属性"""
+
+    def __init__(self, status=200, **attrs):
+        self.status = status
+        self.headers = {}
+        self.request_id = 'fake'
+        self.__dict__.update(attrs)
+
+
+class FakeObjectStream(FakeResult):
+    """模拟 GetObjectResult：可 read() 的文件对象"""
+
+    def __init__(self, content, etag, status=200):
+        super().__init__(status=status, content_length=len(content), etag=etag)
+        self._content = content
+
+    def read(self, amt=None):
+        if amt is None:
+            content, self._content = self._content, b''
+        else:
+            content, self._content = self._content[:amt], self._content[amt:]
+        return content
+
+
+class FakeBucket:
+    """
+    以本地目录为存储的 Bucket 替身，对象 key 即目录下的相对路径。
+
+    - latency: 每次请求的固定延迟（秒），latency_jitter 为额外的随机延迟上限
+    - method_latency: {方法名: 延迟秒数}，覆盖个别方法的延迟
+    - failure_rate: 每次请求以该概率抛出 503 ServerError
+    - requests / failures / bytes_read / bytes_written: 请求计数、注入的故障数与流量统计
+    """
+
+    def __init__(self, root, bucket_name='fake-bucket', latency=0.0, latency_jitter=0.0,
+                 method_latency=None, failure_rate=0.0, seed=0):
+        self.root = os.path.abspath(root)
+        self.bucket_name = bucket_name
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.method_latency = method_latency or {}
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+
+        self.requests = Counter()
+        self.failures = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._keys = []
+        self._meta = {}
+        self._writes = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                self._keys.append(key)
+                self._meta[key] = self._stat(path)
+        self._keys.sort()
+
+    # ---------- 统计 ----------
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.failures = 0
+            self.bytes_read = 0
+            self.bytes_written = 0
+
+    def stats(self):
+        return {
+            'requests': dict(self.requests),
+            'total_requests': sum(self.requests.values()),
+            'failures': self.failures,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written
+        }
+
+    # ---------- oss2.Bucket 接口 ----------
+
+    def object_exists(self, key, headers=None):
+        self._request('object_exists')
+        return key in self._meta
+
+    def head_object(self, key, headers=None, params=None):
+        self._request('head_object')
+        size, etag, mtime = self._require(key)
+        return FakeResult(content_length=size, etag=etag, last_modified=mtime, object_type='Appendable')
+
+    def get_object(self, key, byte_range=None, headers=None, progress_callback=None, process=None, params=None):
+        self._request('get_object')
+        size, etag, _ = self._require(key)
+        if byte_range and (byte_range[0] or 0) >= size:
+            # 与 OSS 一致：非法范围默认返回整个文件，指定 standard 行为时返回 416
+            if (headers or {}).get('x-oss-range-behavior') == 'standard':
+                raise oss2.exceptions.ServerError(416, {}, b'', {'Code': 'InvalidRange',
+                                                                 'Message': 'The requested range cannot be satisfied'})
+            byte_range = None
+        with open(self._path(key), 'rb') as f:
+            if byte_range:
+                start, end = byte_range
+                start = 0 if start is None else start
+                end = size - 1 if end is None else min(end, size - 1)
+                f.seek(start)
+                content = f.read(max(end - start + 1, 0))
+            else:
+                content = f.read()
+        with self._lock:
+            self.bytes_read += len(content)
+        return FakeObjectStream(content, etag, status=206 if byte_range else 200)
+
+    def append_object(self, key, position, data, headers=None, progress_callback=None, init_crc=None):
+        self._request('append_object')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            size = self._meta[key][0] if key in self._meta else 0
+            if position != size:
+                raise oss2.exceptions.PositionNotEqualToLength(
+                    409, {OSS_NEXT_APPEND_POSITION: str(size)}, b'',
+                    {'Code': 'PositionNotEqualToLength', 'Message': 'Position is not equal to file length'})
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as f:
+                f.write(data)
+            self._touch(key)
+            self.bytes_written += len(data)
+            return FakeResult(next_position=self._meta[key][0], etag=self._meta[key][1], crc=None)
+
+    def put_object(self, key, data, headers=None, progress_callback=None):
+        self._request('put_object')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            self._touch(key)
+            self.bytes_written += len(data)
+            return FakeResult(etag=self._meta[key][1], crc=None)
+
+    def copy_object(self, source_bucket_name, source_key, target_key, headers=None, params=None):
+        self._request('copy_object')
+        self._require(source_key)
+        with self._lock:
+            target = self._path(target_key)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(self._path(source_key), 'rb') as src, open(target, 'wb') as dst:
+                dst.write(src.read())
+            self._touch(target_key)
+            return FakeResult(etag=self._meta[target_key][1])
+
+    def delete_object(self, key, params=None, headers=None):
+        self._request('delete_object')
+        with self._lock:
+            if key in self._meta:
+                os.remove(self._path(key))
+                del self._meta[key]
+                self._keys.pop(bisect.bisect_left(self._keys, key))
+        return FakeResult(status=204)
+
+    def list_objects(self, prefix='', delimiter='', marker='', max_keys=100, headers=None):
+        self._request('list_objects')
+        object_list, prefix_list = [], []
+        next_marker = ''
+        with self._lock:
+            if delimiter and marker.endswith(delimiter):
+                # 上一页以公共前缀结束，从该前缀之后继续
+                idx = bisect.bisect_left(self._keys, marker[:-1] + chr(ord(delimiter) + 1))
+            elif marker:
+                idx = bisect.bisect_right(self._keys, marker)
+            else:
+                idx = bisect.bisect_left(self._keys, prefix)
+            while idx < len(self._keys) and len(object_list) + len(prefix_list) < max_keys:
+                key = self._keys[idx]
+                if not key.startswith(prefix):
+                    break
+                rest = key[len(prefix):]
+                if delimiter and delimiter in rest:
+                    common = prefix + rest.split(delimiter, 1)[0] + delimiter
+                    prefix_list.append(common)
+                    next_marker = common
+                    # 跳过该公共前缀下的所有对象
+                    idx = bisect.bisect_left(self._keys, common[:-1] + chr(ord(delimiter) + 1))
+                    continue
+                size, etag, mtime = self._meta[key]
+                object_list.append(SimplifiedObjectInfo(key, mtime, etag, 'Appendable', size, 'Standard'))
+                next_marker = key
+                idx += 1
+            is_truncated = idx < len(self._keys) and self._keys[idx].startswith(prefix)
+
+        return FakeResult(object_list=object_list, prefix_list=prefix_list,
+                          is_truncated=is_truncated, next_marker=next_marker if is_truncated else '')
+
+    # ---------- 内部实现 ----------
+
+    def _request(self, method):
+        with self._lock:
+            self.requests[method] += 1
+            delay = self.method_latency.get(method, self.latency)
+            if self.latency_jitter:
+                delay += self.rng.random() * self.latency_jitter
+            failed = self.failure_rate and self.rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise oss2.exceptions.ServerError(503, {}, b'', {'Code': 'ServiceUnavailable',
+                                                             'Message': 'injected failure'})
+
+    def _require(self, key):
+        meta = self._meta.get(key)
+        if meta is None:
+            raise oss2.exceptions.NoSuchKey(404, {}, b'', {'Code': 'NoSuchKey', 'Message': key})
+        return meta
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def _stat(self, path, generation=0):
+        st = os.stat(path)
+        # 写入计数参与计算，保证同一时间戳内的多次写入也会得到不同的 ETag
+        etag = hashlib.md5(f"{st.st_size}-{st.st_mtime_ns}-{generation}".encode()).hexdigest().upper()
+        return st.st_size, etag, int(st.st_mtime)
+
+    def _touch(self, key):
+        if key not in self._meta:
+            bisect.insort(self._keys, key)
+        self._writes += 1
+        self._meta[key] = self._stat(self._path(key), self._writes)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+回归检查 - 在本地 OSS 替身上验证曾经出过问题的行为，检查失败时以非零状态退出
+
+    python benchmarks/regression_checks.py
+    python benchmarks/regression_checks.py --only manifest_concurrent_flush
+"""
+
+import os
+import sys
+import json
+import random
+import shutil
+import logging
+import argparse
+import contextlib
+import time
+import tempfile
+import threading
+import subprocess
+import traceback
+from datetime import datetime
+
+import oss2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'web'))
+
+from fake_oss import FakeBucket  # noqa: E402
+from oss_manifest import ManifestWriter, read_manifest  # noqa: E402
+from oss_inventory import OSSInventory, load_inventory  # noqa: E402
+from oss_writer import AppendWriter  # noqa: E402
+from migrate_oss_data import OSSDataMigrator  # noqa: E402
+from api_fetcher import ApiFetcher, CircuitBreaker, CircuitOpenError  # noqa: E402
+from crawl_sources import Source, crawl_all  # noqa: E402
+from tourist_crawler import TouristCrawler  # noqa: E402
+from stub_api import StubApi, StubApiServer  # noqa: E402
+import alert_engine  # noqa: E402
+import data_loader  # noqa: E402
+import json_codec  # noqa: E402
+
+
+# ---------- 检查：每个检查接收独立的临时目录 ----------
+
+def check_manifest_concurrent_flush(work_dir):
+    """多个写入者同时刷新同一分区的清单，合并后的清单包含所有写入者的对象"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'), latency=0.002, latency_jitter=0.004, seed=1)
+    partition = 'tourist_data/2025/11/'
+    writers = [ManifestWriter(bucket, writer_id=f"w{i}") for i in range(6)]
+    for round_no in range(5):
+        for i, writer in enumerate(writers):
+            key = f"{partition}_shards/w{i}/{round_no:02d}.jsonl"
+            writer.record(key, 0, 100 + round_no, f"etag-{i}-{round_no}", 1, first='t', last='t')
+        threads = [threading.Thread(target=writer.flush) for writer in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        merged = read_manifest(bucket, partition)
+        expected = {f"{partition}_shards/w{i}/{r:02d}.jsonl" for i in range(len(writers)) for r in range(round_no + 1)}
+        missing = expected - set(merged['objects'])
+        assert not missing, f"第 {round_no + 1} 轮合并后的清单缺少 {sorted(missing)}"
+        assert merged['complete'], "新分区的第一批写入应得到完整的清单"
+
+    # 读取端采用合并后的清单，清单目录不作为旧格式数据
+    inventory = OSSInventory(bucket, cache_path=None)
+    objects = inventory.refresh_partition('2025/11/', manifest=True)
+    assert set(objects) == expected, "分区内容应与合并后的清单一致"
+    for writer_index in range(len(writers)):
+        bucket.put_object(f"{partition}_shards/w{writer_index}/00.jsonl", b'{}\n')
+    inventory.refresh()
+    assert not inventory.legacy, f"清单目录被当作旧格式数据: {sorted(inventory.legacy)}"
+
+
+def check_manifest_incomplete_for_existing_data(work_dir):
+    """分区中已有清单之前写入的对象时，分片写入者新建的清单不完整，读取端列举分区，不遗漏已有数据"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    existing_key = 'tourist_data/2025/11/01.jsonl'
+    bucket.put_object(existing_key, b'{"timestamp": "2025-11-01T10:00:00", "data": {"rows": []}}\n')
+    manifest = ManifestWriter(bucket, writer_id='fc-x')
+    writer = AppendWriter(bucket, mode='sharded', writer_id='fc-x', manifest=manifest)
+    writer.append(existing_key, b'{"timestamp": "2025-11-01T10:10:00", "data": {"rows": []}}\n')
+    writer.append('tourist_data/2025/11/02.jsonl', b'{"timestamp": "2025-11-02T10:00:00", "data": {"rows": []}}\n')
+    assert manifest.flush() == 1
+    assert not read_manifest(bucket, 'tourist_data/2025/11/')['complete'], "分区已有数据时清单被标记为完整"
+
+    inventory = OSSInventory(bucket, cache_path=None)
+    inventory.refresh_partition('2025/11/', manifest=True)
+    keys = inventory.sources(existing_key)
+    assert existing_key in keys and len(keys) == 2, f"已有数据被遗漏: {keys}"
+
+    # 新分区的第一批写入仍得到完整的清单
+    writer.append('tourist_data/2025/12/01.jsonl', b'{"timestamp": "2025-12-01T10:00:00", "data": {"rows": []}}\n')
+    assert manifest.flush() == 1
+    assert read_manifest(bucket, 'tourist_data/2025/12/')['complete'], "新分区的第一批写入应得到完整的清单"
+
+
+def check_migrator_skips_source_namespaces(work_dir):
+    """未注册（TOURIST_SOURCES_FILE 未设置）的数据源命名空间不当作旧数据迁移"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    source_key = 'tourist_data/hangzhou/2025/11/07.jsonl'
+    source_content = json.dumps({'timestamp': '2025-11-07T10:00:00',
+                                 'data': {'rows': [{'CODE': '1', 'NAME': '西湖', 'NUM': 1}]}}) + '\n'
+    bucket.put_object(source_key, source_content.encode('utf-8'))
+    bucket.put_object('tourist_data/_backup/by_date/2025-11-06.json', b'{}')
+    legacy_key = 'tourist_data/by_date/2025-11-07.json'
+    bucket.put_object(legacy_key, json.dumps({
+        'date': '2025-11-07', 'last_updated': '2025-11-07T10:00:00',
+        'data': [{'fetch_time': '2025-11-07T10:00:00', 'rows': [{'CODE': '1', 'NAME': '豫园', 'NUM': 1}]}],
+    }, ensure_ascii=False).encode('utf-8'))
+
+    migrator = OSSDataMigrator(dry_run=False, use_cache=False, bucket=bucket)
+    migrator.inventory.cache_path = None
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        old_files = migrator.list_old_data_files()
+        for key in old_files:
+            migrator.migrate_file(key)
+    assert old_files == [legacy_key], f"只有 by_date/ 下的文件是旧数据，实际: {old_files}"
+    assert sorted(migrator.inventory.skipped_dirs) == ['tourist_data/_backup/', 'tourist_data/hangzhou/']
+    assert bucket.get_object(source_key).read() == source_content.encode('utf-8'), "其他数据源的文件被修改或删除"
+
+
+def _stub_crawlers(bucket, servers, min_interval=0, **fetcher_options):
+    """每个替身服务一个数据源与爬虫；请求器单独创建，不复用进程内按地址缓存的请求器（端口可能被复用）"""
+    crawlers = []
+    for i, server in enumerate(servers):
+        crawler = TouristCrawler(bucket=bucket, source=Source(f"stub{i}", server.url, min_interval=min_interval))
+        crawler.fetcher = ApiFetcher(server.url, crawler.headers, validate=lambda data: data.get('code') == 200,
+                                     limiter=crawler.source.limiter, seed=i, **fetcher_options)
+        crawlers.append(crawler)
+    return crawlers
+
+
+def _crawl(crawlers):
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        results = crawl_all(crawlers)
+        return results, time.perf_counter() - start
+
+
+def check_sources_crawled_concurrently(work_dir):
+    """多个数据源并发爬取，总耗时接近最慢的数据源而不是各数据源之和"""
+    latencies = [0.3, 0.6, 0.9]
+    servers = [StubApiServer(StubApi(latency=latency, latency_jitter=0, seed=i)).start()
+               for i, latency in enumerate(latencies)]
+    try:
+        crawlers = _stub_crawlers(FakeBucket(os.path.join(work_dir, 'oss')), servers, hedge_percentile=0)
+        results, wall = _crawl(crawlers)
+    finally:
+        for server in servers:
+            server.stop()
+    assert all(r['success'] for r in results), f"有数据源爬取失败: {results}"
+    assert wall < max(latencies) + 0.5, f"总耗时 {wall:.2f}s，应接近最慢数据源的 {max(latencies)}s"
+    assert wall < sum(latencies) * 0.8, f"总耗时 {wall:.2f}s 接近各数据源之和 {sum(latencies)}s，没有并发"
+
+
+def check_sources_isolated(work_dir):
+    """一个数据源持续 503、一个数据源很慢，不影响其他数据源的成功与耗时"""
+    stubs = [StubApi(latency=0.05, latency_jitter=0), StubApi(latency=0.05, latency_jitter=0),
+             StubApi(latency=2.0, latency_jitter=0), StubApi(latency=0.05, latency_jitter=0)]
+    stubs[1].outage = True
+    servers = [StubApiServer(stub).start() for stub in stubs]
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    try:
+        crawlers = _stub_crawlers(bucket, servers, hedge_percentile=0, deadline=3, max_attempts=3)
+        results, _ = _crawl(crawlers)
+    finally:
+        for server in servers:
+            server.stop()
+    by_name = {r['source']: r for r in results}
+    assert not by_name['stub1']['success'], "持续 503 的数据源不应成功"
+    assert stubs[1].requests == 3, f"持续 503 的数据源应重试到 3 次，实际 {stubs[1].requests} 次"
+    for name in ('stub0', 'stub2', 'stub3'):
+        assert by_name[name]['success'], f"{name} 受到其他数据源的影响: {by_name[name]}"
+    for name in ('stub0', 'stub3'):
+        assert by_name[name]['fetch_s'] < 1.0, f"{name} 的请求被慢数据源拖慢: {by_name[name]['fetch_s']:.2f}s"
+    for crawler in crawlers:
+        keys = [obj.key for obj in bucket.list_objects(prefix=crawler.source.prefix).object_list]
+        assert bool(keys) == (crawler.source.name != 'stub1'), f"{crawler.source.name} 的写入不符合预期: {keys}"
+
+
+def check_rate_limit_per_request(work_dir):
+    """重试与对冲请求同样遵守数据源的最小请求间隔（以服务端收到请求的时间为准）"""
+    min_interval = 0.4
+    stub = StubApi(latency=0.3, latency_jitter=0, error_rate=1.0)
+    with StubApiServer(stub) as server:
+        crawler, = _stub_crawlers(FakeBucket(os.path.join(work_dir, 'oss')), [server], min_interval=min_interval,
+                                  deadline=10, max_attempts=3)
+        # 预置延迟样本，使对冲阈值很小：每一轮都会发出对冲请求
+        for _ in range(20):
+            crawler.fetcher.latency.add(0.01)
+        results, _ = _crawl([crawler])
+        crawler.fetcher.close()
+        times = list(stub.request_times)
+    assert not results[0]['success']
+    assert any(a['hedge'] for a in crawler.fetcher.attempts), "没有发出对冲请求，检查未覆盖对冲"
+    assert len(times) >= 4, f"只收到 {len(times)} 个请求，检查未覆盖重试"
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) >= min_interval - 0.05, f"请求间隔 {min(gaps):.3f}s 小于最小间隔 {min_interval}s: {gaps}"
+
+
+def check_breaker_single_probe(work_dir):
+    """熔断冷却结束后只放行一个试探请求：并发调用中只有一个通过，试探失败重新熔断，成功后全部放行"""
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow(), "连续失败达到阈值后应熔断"
+
+    def concurrent_allows(n=16):
+        barrier = threading.Barrier(n)
+        allowed = []
+
+        def call():
+            barrier.wait()
+            allowed.append(breaker.allow())
+        threads = [threading.Thread(target=call) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return allowed.count(True)
+
+    now[0] = 10
+    assert concurrent_allows() == 1, "冷却结束后应只放行一个试探请求"
+    breaker.record_failure()
+    assert breaker.state == 'open' and concurrent_allows() == 0, "试探失败后应重新熔断"
+    now[0] = 20
+    assert concurrent_allows() == 1
+    breaker.record_success()
+    assert breaker.state == 'closed' and concurrent_allows() == 16, "试探成功后应恢复放行"
+
+    # 试探请求进行中，其他 fetch() 直接放弃，不发出请求
+    stub = StubApi(latency=0.5, latency_jitter=0)
+    with StubApiServer(stub) as server:
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record_failure()
+        fetchers = [ApiFetcher(server.url, breaker=breaker, hedge_percentile=0) for _ in range(4)]
+        errors = []
+
+        def fetch(fetcher):
+            try:
+                fetcher.fetch()
+            except CircuitOpenError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=fetch, args=(fetcher,)) for fetcher in fetchers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for fetcher in fetchers:
+            fetcher.close()
+    assert stub.requests == 1 and len(errors) == 3, f"试探期间发出了 {stub.requests} 个请求"
+    assert breaker.state == 'closed'
+
+
+_ALERT_CONFIG_PROBE = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+from fake_oss import FakeBucket
+from crawl_sources import Source
+from tourist_crawler import TouristCrawler
+crawler = TouristCrawler(bucket=FakeBucket(sys.argv[3]), source=Source('alert', 'http://127.0.0.1:9/'))
+row = {'CODE': '1', 'NAME': '外滩', 'NUM': 900, 'MAX_NUM': 1000, 'SSD': '拥挤', 'TIME': '2025-11-07 10:00', 'TYPE': '开放'}
+ok = crawler.upload_data({'total': '1', 'rows': [row], 'code': 200})
+print(json.dumps({'ok': ok, 'rules': [rule.name for rule in crawler.alerts.rules],
+                  'sinks': [type(sink).__name__ for sink in crawler.alerts.sinks],
+                  'evaluated': bool(crawler.alerts.snapshot)}))
+"""
+
+
+def check_crawler_survives_bad_alert_config(work_dir):
+    """告警规则文件缺失 / 格式有误、ALERT_SINKS 有误时，爬虫仍能创建并写入数据，告警回退到默认配置"""
+    bad_rules = os.path.join(work_dir, 'rules.json')
+    with open(bad_rules, 'w', encoding='utf-8') as f:
+        json.dump([{'name': '缺少 metric', 'above': 0.8}], f)
+    configs = [(os.path.join(work_dir, 'missing.json'), 'stdout'), (bad_rules, 'stdout'),
+               ('', 'stdout,pager:oncall'), ('', 'file:')]
+    # 配置在模块导入时从环境变量读取，因此每种配置在单独的进程中创建爬虫
+    for i, (rules_path, sinks_spec) in enumerate(configs):
+        env = dict(os.environ, ALERT_RULES_FILE=rules_path, ALERT_SINKS=sinks_spec)
+        env.pop('ALERT_STATE_FILE', None)
+        proc = subprocess.run([sys.executable, '-c', _ALERT_CONFIG_PROBE, ROOT_DIR, BENCH_DIR,
+                               os.path.join(work_dir, f'oss{i}')],
+                              env=env, capture_output=True, text=True, encoding='utf-8')
+        assert proc.returncode == 0, f"配置 {i} 下爬虫无法运行:\n{proc.stderr[-2000:]}"
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        assert result['ok'], f"配置 {i} 下写入失败"
+        assert result['rules'] == [rule['name'] for rule in alert_engine.DEFAULT_RULES], result
+        assert result['sinks'] == ['StdoutSink'], result
+        assert result['evaluated'], f"配置 {i} 下没有评估告警"
+        assert '警告' in proc.stdout, f"配置 {i} 下没有打印回退警告"
+
+
+def check_alert_state_by_rule_name(work_dir):
+    """告警状态按规则名保存：规则文件调整顺序后状态不串到其他规则；规则名重复时改用默认规则"""
+    rules = [{'name': '承载率高', 'metric': 'occupancy', 'above': 0.8, 'clear': 0.7},
+             {'name': '拥挤', 'metric': 'SSD', 'equals': '拥挤'}]
+    state_path = os.path.join(work_dir, 'alerts.json')
+    row = {'CODE': '1', 'NAME': '外滩', 'NUM': 900, 'MAX_NUM': 1000, 'SSD': '舒适'}
+    engine = alert_engine.AlertEngine(alert_engine.load_rules(_write_json(work_dir, 'rules.json', rules)), [],
+                                      state_path=state_path)
+    assert [a['rule'] for a in engine.evaluate([row])] == ['承载率高']
+
+    # 调换顺序后重新加载：承载率仍处于触发状态（不重复告警），拥挤规则没有继承它的状态
+    reordered = alert_engine.load_rules(_write_json(work_dir, 'reordered.json', rules[::-1]))
+    engine = alert_engine.AlertEngine(reordered, [], state_path=state_path)
+    alerts = engine.evaluate([dict(row, NUM=950, SSD='拥挤')])
+    assert [(a['rule'], a['state']) for a in alerts] == [('拥挤', 'firing')], alerts
+    alerts = engine.evaluate([dict(row, NUM=500, SSD='拥挤')])
+    assert [(a['rule'], a['state']) for a in alerts] == [('承载率高', 'resolved')], alerts
+
+    duplicated = _write_json(work_dir, 'duplicated.json', [rules[0], dict(rules[1], name='承载率高')])
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        loaded, _ = alert_engine.load_config(duplicated, 'stdout')
+    assert [rule.name for rule in loaded] == [r['name'] for r in alert_engine.DEFAULT_RULES], "规则名重复时应改用默认规则"
+
+
+class _RecordingSink:
+    """记录发送告警时 OSS 中已有的对象"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.seen = None
+
+    def emit(self, alerts):
+        self.seen = {obj.key for obj in oss2.ObjectIterator(self.bucket, prefix='tourist_data/')}
+
+
+def check_alerts_sent_after_upload(work_dir):
+    """告警在数据与分区清单都写入之后才发送，慢的 webhook 不拖延写入"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    sink = _RecordingSink(bucket)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        crawler = TouristCrawler(bucket=bucket, source=Source('alerts', 'http://127.0.0.1:9/'))
+        crawler.alerts = alert_engine.AlertEngine(sinks=[sink])
+        row = {'CODE': '1', 'NAME': '外滩', 'NUM': 900, 'MAX_NUM': 1000, 'SSD': '拥挤',
+               'TIME': '2025-11-07 10:00', 'TYPE': '开放'}
+        assert crawler.upload_data({'total': '1', 'rows': [row], 'code': 200})
+    assert sink.seen is not None, "没有发送告警"
+    written = {obj.key for obj in oss2.ObjectIterator(bucket, prefix='tourist_data/')}
+    assert sink.seen == written, f"发送告警时尚未写入: {sorted(written - sink.seen)}"
+    assert any('/_manifest/' in key for key in sink.seen), "发送告警时分区清单尚未写入"
+
+
+def _write_json(work_dir, name, value):
+    path = os.path.join(work_dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False)
+    return path
+
+
+def check_spot_index_empty_window(work_dir):
+    """景点在窗口内没有读数时仍写出空的索引并记录签名：旧索引不再引用已删除的分块，下次构建直接复用"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    previous_month = data_loader.detail_months(datetime.now(), 2)[0]
+    day = previous_month.replace('/', '-') + '10'
+    lines = [json.dumps({'timestamp': f"{day}T{hour:02d}:00:00",
+                         'spot': {'CODE': '1', 'NAME': '豫园', 'NUM': hour, 'MAX_NUM': 100,
+                                  'TIME': f"{day} {hour:02d}:00"}}, ensure_ascii=False)
+             for hour in range(9, 12)]
+    bucket.put_object(f"tourist_data/{previous_month}豫园.jsonl", ('\n'.join(lines) + '\n').encode('utf-8'))
+    spots = [{'CODE': '1', 'NAME': '豫园'}]
+    data_dir, state_path = os.path.join(work_dir, 'data'), os.path.join(work_dir, 'build_state.json')
+    logical = data_loader.index_logical(data_loader.safe_name('豫园'))
+
+    def build_once(months):
+        build = data_loader.SiteBuild(data_dir=data_dir, state_path=state_path)
+        # 本月的源文件不存在，读取时的警告是预期的
+        disabled = logging.root.manager.disable
+        logging.disable(logging.WARNING)
+        try:
+            data_loader.process_spot_details(bucket, spots, build=build, months=months, workers=1)
+        finally:
+            logging.disable(disabled)
+        return build
+
+    build = build_once(2)
+    assert build.read(logical)['chunks'], "两个月的窗口应包含上个月的分块"
+
+    # 窗口缩小到本月：上个月的分块被删除，索引必须随之更新
+    build = build_once(1)
+    assert logical in build.files, "窗口内没有读数时索引被丢弃"
+    index = build.read(logical)
+    assert not index['chunks'] and index['count'] == 0, f"索引仍引用窗口外的分块: {index['chunks']}"
+    spot_dir = os.path.dirname(logical) + '/'
+    stale = [name for name in build.files if name.startswith(spot_dir) and name != logical]
+    assert not stale, f"构建清单中残留已删除的分块: {stale}"
+    for name, hashed in build.files.items():
+        assert os.path.exists(os.path.join(data_dir, hashed)), f"构建清单引用的文件不存在: {name}"
+
+    build = build_once(1)
+    assert build.reused == 1 and build.written == 0, "签名未记录，无数据的景点每次构建都会重新处理"
+
+
+def check_json_codec_floats(work_dir):
+    """json 与 orjson 写法不同的浮点数（NaN / Infinity、绝对值小于 1e-4 或不小于 1e16）的输出与 json 相同"""
+    payloads = [
+        {'ratio': float('nan'), 'name': '豫园'},
+        {'rows': [{'NUM': 1, 'rate': [0.5, float('inf')]}], 'latest': None},
+        [[-float('inf')], (1.0, None)],
+        {'ratio': 2.5e-05}, {'ratio': 1e-05}, {'ratio': -9.9e-05}, {'ratio': 1e-07},
+        {'nested': [{'share': 0.5}, {'share': 3.2e-05}]}, {'total': 1e16}, {'total': -2.5e20},
+    ]
+    for payload in payloads:
+        assert json_codec._has_json_only_float(payload), f"未检测到写法不同的浮点数: {payload}"
+    assert not json_codec._has_json_only_float({'a': [None, 0.0, -0.0, 1e-4, 0.7834, 9.9e15, {'b': (1, '0')}]})
+
+    # 各数量级的随机浮点数
+    rng = random.Random(0)
+    payloads += [{'rows': [{'NUM': rng.randint(0, 10 ** 6), 'rate': rng.uniform(-1, 1) * 10 ** rng.randint(-8, 18)}
+                           for _ in range(20)]} for _ in range(200)]
+    encoder = json_codec.current_encoder()
+    try:
+        # 已安装 orjson 时检查 orjson 路径，否则检查标准库路径
+        json_codec.use_encoder('auto')
+        for payload in payloads:
+            expected = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+            assert json_codec.encode(payload) == expected, f"{json_codec.current_encoder()} 的输出与 json 不同: {payload}"
+    finally:
+        json_codec.use_encoder(encoder)
+
+
+def check_inventory_snapshot_round_trip(work_dir):
+    """本地快照保存后重新加载，与刚列举的清单一致（包括跳过的顶层目录）"""
+    bucket = FakeBucket(os.path.join(work_dir, 'oss'))
+    for key in ('tourist_data/2025/11/07.jsonl', 'tourist_data/2025/11/_shards/w0/07.jsonl',
+                'tourist_data/by_date/2025-11-06.json', 'tourist_data/hangzhou/2025/11/07.jsonl',
+                'tourist_data/_backup/by_date/2025-11-06.json'):
+        bucket.put_object(key, b'{}\n')
+    cache_path = os.path.join(work_dir, 'inventory.json')
+    fresh = OSSInventory(bucket, cache_path=cache_path)
+    fresh.refresh()
+    fresh.save()
+    assert sorted(fresh.skipped_dirs) == ['tourist_data/_backup/', 'tourist_data/hangzhou/'], fresh.skipped_dirs
+
+    loaded = load_inventory(bucket, cache_path=cache_path)
+    assert loaded is not None, "快照未能加载"
+    for attr in ('partitions', 'legacy', 'skipped_dirs'):
+        assert getattr(loaded, attr) == getattr(fresh, attr), f"重新加载后 {attr} 不一致"
+
+
+CHECKS = [
+    ('manifest_concurrent_flush', check_manifest_concurrent_flush),
+    ('manifest_incomplete_for_existing_data', check_manifest_incomplete_for_existing_data),
+    ('migrator_skips_source_namespaces', check_migrator_skips_source_namespaces),
+    ('inventory_snapshot_round_trip', check_inventory_snapshot_round_trip),
+    ('sources_crawled_concurrently', check_sources_crawled_concurrently),
+    ('sources_isolated', check_sources_isolated),
+    ('rate_limit_per_request', check_rate_limit_per_request),
+    ('breaker_single_probe', check_breaker_single_probe),
+    ('crawler_survives_bad_alert_config', check_crawler_survives_bad_alert_config),
+    ('alert_state_by_rule_name', check_alert_state_by_rule_name),
+    ('alerts_sent_after_upload', check_alerts_sent_after_upload),
+    ('spot_index_empty_window', check_spot_index_empty_window),
+    ('json_codec_floats', check_json_codec_floats),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地 OSS 替身上运行回归检查')
+    parser.add_argument('--only', nargs='*', help='只运行指定检查')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    failed = 0
+    for name, check in CHECKS:
+        if args.only and name not in args.only:
+            continue
+        work_dir = tempfile.mkdtemp(prefix=f'check-{name}-')
+        try:
+            check(work_dir)
+            print(f"✓ {name}")
+        except Exception:
+            failed += 1
+            print(f"✗ {name}\n{traceback.format_exc()}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""基准测试 - 在本地 OSS 替身上测量爬虫、数据加载与迁移的耗时、请求数和内存峰值"""
+
+import os
+import sys
+import io
+import json
+import shutil
+import logging
+import argparse
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'web'))
+
+from fake_oss import FakeBucket  # noqa: E402
+from tourist_crawler import TouristCrawler  # noqa: E402
+from oss_writer import AppendWriter  # noqa: E402
+from migrate_oss_data import OSSDataMigrator  # noqa: E402
+import data_loader  # noqa: E402
+from spot_matrix import SpotMatrix  # noqa: E402
+from alert_engine import AlertEngine, Rule  # noqa: E402
+from stage_profiler import start_profiling, stop_profiling  # noqa: E402
+from generate_mock_data import generate_raw_data  # noqa: E402
+
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results', 'history.jsonl')
+
+
+class BenchContext:
+    """一次基准运行共享的数据目录与 Bucket 参数"""
+
+    def __init__(self, args, work_dir):
+        self.args = args
+        self.work_dir = work_dir
+        self.oss_root = os.path.join(work_dir, 'oss')
+        self.output_dir = os.path.join(work_dir, 'site')
+        self.legacy_stash = os.path.join(work_dir, 'legacy_stash')
+
+    def bucket(self):
+        return FakeBucket(self.oss_root,
+                          latency=self.args.latency_ms / 1000.0,
+                          latency_jitter=self.args.jitter_ms / 1000.0,
+                          failure_rate=self.args.failure_rate,
+                          seed=self.args.seed)
+
+    def clean_site(self):
+        """删除输出与增量构建状态，保证每轮都是完整构建"""
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.output_dir, 'spots'), exist_ok=True)
+        if os.path.exists(data_loader.BUILD_STATE_PATH):
+            os.remove(data_loader.BUILD_STATE_PATH)
+
+    def latest_payload(self):
+        """取最新一天最后一次爬取的完整数据，作为爬虫上传的输入"""
+        data_root = os.path.join(self.oss_root, 'tourist_data')
+        year = max(d for d in os.listdir(data_root) if d.isdigit())
+        month = max(os.listdir(os.path.join(data_root, year)))
+        month_dir = os.path.join(data_root, year, month)
+        day = max(f for f in os.listdir(month_dir) if f[:2].isdigit() and f.endswith('.jsonl'))
+        with open(os.path.join(month_dir, day), 'r', encoding='utf-8') as f:
+            last_line = f.read().strip().split('\n')[-1]
+        return json.loads(last_line)['data']
+
+    def legacy_keys(self):
+        keys = []
+        for legacy_dir in ('by_date', 'by_name'):
+            base = os.path.join(self.oss_root, 'tourist_data', legacy_dir)
+            for dirpath, _, filenames in os.walk(base):
+                for filename in filenames:
+                    rel = os.path.relpath(os.path.join(dirpath, filename), self.oss_root)
+                    keys.append(rel.replace(os.sep, '/'))
+        return sorted(keys)
+
+    def stash_legacy(self):
+        for legacy_dir in ('by_date', 'by_name'):
+            src = os.path.join(self.oss_root, 'tourist_data', legacy_dir)
+            if os.path.exists(src):
+                shutil.copytree(src, os.path.join(self.legacy_stash, legacy_dir))
+
+    def restore_legacy(self):
+        """迁移会删除旧文件，每轮之前恢复"""
+        for legacy_dir in ('by_date', 'by_name'):
+            src = os.path.join(self.legacy_stash, legacy_dir)
+            dst = os.path.join(self.oss_root, 'tourist_data', legacy_dir)
+            if os.path.exists(dst):
+                shutil.rmtree(dst)
+            if os.path.exists(src):
+                shutil.copytree(src, dst)
+        backup = os.path.join(self.oss_root, 'tourist_data', '_backup')
+        if os.path.exists(backup):
+            shutil.rmtree(backup)
+
+
+# ---------- 场景：每个场景返回 (准备函数, 执行函数)，准备阶段不计时 ----------
+
+def scenario_process_overview_data(ctx):
+    def setup():
+        ctx.clean_site()
+        return ctx.bucket()
+
+    def run(bucket):
+        return data_loader.process_overview_data(bucket)
+    return setup, run
+
+
+def scenario_process_spot_details(ctx):
+    def setup():
+        ctx.clean_site()
+        bucket = ctx.bucket()
+        all_spots = data_loader.process_overview_data(ctx.bucket())
+        return bucket, all_spots
+
+    def run(state):
+        bucket, all_spots = state
+        data_loader.process_spot_details(bucket, all_spots)
+    return setup, run
+
+
+def scenario_process_spot_details_incremental(ctx):
+    """源数据未变化时的重复构建"""
+    def setup():
+        ctx.clean_site()
+        all_spots = data_loader.process_overview_data(ctx.bucket())
+        data_loader.process_spot_details(ctx.bucket(), all_spots)
+        return ctx.bucket(), all_spots
+
+    def run(state):
+        bucket, all_spots = state
+        data_loader.process_spot_details(bucket, all_spots)
+    return setup, run
+
+
+def scenario_process_history(ctx):
+    """从头补建全部天数的聚合立方体与分位数草图"""
+    def setup():
+        ctx.clean_site()
+        return ctx.bucket()
+
+    def run(bucket):
+        data_loader.process_history(bucket, ctx.args.days)
+    return setup, run
+
+
+def scenario_update_matrix(ctx):
+    """从头建立全部天数的矩阵缓存"""
+    path = os.path.join(ctx.work_dir, 'matrix')
+
+    def setup():
+        shutil.rmtree(path, ignore_errors=True)
+        return ctx.bucket()
+
+    def run(bucket):
+        data_loader.update_matrix(bucket, ctx.args.days, path=path)
+    return setup, run
+
+
+def scenario_read_matrix(ctx):
+    """从矩阵缓存读取所有景点的完整序列"""
+    path = os.path.join(ctx.work_dir, 'matrix')
+
+    def setup():
+        if not os.path.exists(os.path.join(path, 'header.json')):
+            data_loader.update_matrix(ctx.bucket(), ctx.args.days, path=path)
+        return ctx.bucket()
+
+    def run(bucket):
+        matrix = SpotMatrix(path)
+        for code, _ in matrix.spots:
+            matrix.series(code)
+        matrix.close()
+    return setup, run
+
+
+def scenario_fetch_time_slice(ctx):
+    """昨天 14:00-16:00 的完整数据（时间索引 + 一次 Range GET）"""
+    day = datetime.now() - timedelta(days=1)
+
+    def setup():
+        return ctx.bucket()
+
+    def run(bucket):
+        data_loader.fetch_time_slice(bucket, day, '14:00', '16:00')
+    return setup, run
+
+
+def scenario_fetch_latest_snapshot(ctx):
+    def setup():
+        return ctx.bucket()
+
+    def run(bucket):
+        data_loader.fetch_latest_snapshot(bucket)
+    return setup, run
+
+
+def scenario_upload_data(ctx):
+    payload = ctx.latest_payload()
+
+    def setup():
+        return TouristCrawler(bucket=ctx.bucket())
+
+    def run(crawler):
+        for _ in range(ctx.args.crawls):
+            crawler.upload_data(payload)
+    return setup, run
+
+
+def scenario_upload_data_sharded(ctx):
+    """两个写入者各自追加到自己的分片"""
+    payload = ctx.latest_payload()
+
+    def setup():
+        bucket = ctx.bucket()
+        crawlers = [TouristCrawler(bucket=bucket) for _ in range(2)]
+        for i, crawler in enumerate(crawlers):
+            crawler.writer = AppendWriter(bucket, mode='sharded', writer_id=f"bench-{i}", manifest=crawler.manifest)
+        return bucket, crawlers
+
+    def run(state):
+        _, crawlers = state
+        for _ in range(ctx.args.crawls):
+            for crawler in crawlers:
+                crawler.upload_data(payload)
+    return setup, run
+
+
+def scenario_evaluate_alerts(ctx):
+    """每个景点 20 条专属规则 + 2 条全局规则，连续 100 次爬取，每次约 10% 的景点数据变化"""
+    rows = ctx.latest_payload()['rows']
+    codes = [row.get('CODE') or row.get('NAME') for row in rows]
+    rules = [Rule(f"承载率{50 + i}%", 'occupancy', above=(50 + i) / 100, cooldown=3600, codes=[code])
+             for code in codes for i in range(20)]
+    rules += [Rule('承载率超过80%', 'occupancy', above=0.8, clear=0.7, cooldown=3600),
+              Rule('舒适度变为拥挤', 'SSD', equals='拥挤', cooldown=3600)]
+    rng = random.Random(ctx.args.seed)
+    crawls = []
+    current = [dict(row) for row in rows]
+    for _ in range(100):
+        for row in rng.sample(current, max(1, len(current) // 10)):
+            row['NUM'] = rng.randint(0, int(row.get('MAX_NUM') or 1000))
+        crawls.append([dict(row) for row in current])
+    start = datetime.now()
+
+    def setup():
+        return ctx.bucket(), AlertEngine(rules=rules, sinks=[], state_path=None)
+
+    def run(state):
+        _, engine = state
+        for i, crawl in enumerate(crawls):
+            engine.evaluate(crawl, start + timedelta(minutes=20 * i))
+    return setup, run
+
+
+def scenario_migrate_file(ctx):
+    def setup():
+        ctx.restore_legacy()
+        migrator = OSSDataMigrator(dry_run=False, use_cache=False, bucket=ctx.bucket())
+        migrator.inventory.cache_path = None
+        return migrator, ctx.legacy_keys()
+
+    def run(state):
+        migrator, keys = state
+        for key in keys:
+            migrator.migrate_file(key)
+    return setup, run
+
+
+SCENARIOS = [
+    ('process_overview_data', scenario_process_overview_data),
+    ('process_spot_details', scenario_process_spot_details),
+    ('process_spot_details_incremental', scenario_process_spot_details_incremental),
+    ('process_history', scenario_process_history),
+    ('update_matrix', scenario_update_matrix),
+    ('read_matrix', scenario_read_matrix),
+    ('fetch_time_slice', scenario_fetch_time_slice),
+    ('fetch_latest_snapshot', scenario_fetch_latest_snapshot),
+    ('upload_data', scenario_upload_data),
+    ('upload_data_sharded', scenario_upload_data_sharded),
+    ('evaluate_alerts', scenario_evaluate_alerts),
+    ('migrate_file', scenario_migrate_file),
+]
+
+
+def measure(name, factory, ctx):
+    """重复执行 repeat 次计时，再额外执行一次开启 tracemalloc 统计内存峰值"""
+    setup, run = factory(ctx)
+    walls = []
+    stats = None
+    peak = 0
+
+    for i in range(ctx.args.repeat + 1):
+        traced = i == ctx.args.repeat
+        with redirect_stdout(io.StringIO()):
+            state = setup()
+        bucket = _find_bucket(state)
+        bucket.reset_stats()
+
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            run(state)
+        wall = time.perf_counter() - start
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            walls.append(wall)
+            if stats is None:
+                stats = bucket.stats()
+
+    if ctx.args.profile:
+        # 剖析单独执行一次，不影响上面的计时
+        with redirect_stdout(io.StringIO()):
+            state = setup()
+        start_profiling(name, os.path.join(ctx.args.profile, name))
+        try:
+            with redirect_stdout(io.StringIO()):
+                run(state)
+        finally:
+            stop_profiling()
+
+    return dict(stats, wall_s=round(statistics.median(walls), 4), wall_s_min=round(min(walls), 4),
+                peak_mem_kb=round(peak / 1024, 1))
+
+
+def _find_bucket(state):
+    candidates = state if isinstance(state, tuple) else (state,)
+    for item in candidates:
+        if isinstance(item, FakeBucket):
+            return item
+        if isinstance(getattr(item, 'bucket', None), FakeBucket):
+            return item.bucket
+    raise ValueError("场景状态中没有 FakeBucket")
+
+
+# ---------- 结果存储与对比 ----------
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=ROOT_DIR, stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def load_previous(config, path=RESULTS_PATH):
+    """同一配置下最近一次的结果"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get('config') == config:
+                    previous = entry
+    return previous
+
+
+def save_result(entry, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def print_report(entry, previous):
+    print(f"\n基准结果 (commit {entry['commit']}{'+dirty' if entry['dirty'] else ''})")
+    if previous:
+        print(f"对比: commit {previous['commit']} @ {previous['created_at']}")
+    header = (f"{'场景':<34}{'耗时(s)':>10}{'变化':>9}{'请求数':>9}{'变化':>9}"
+              f"{'读取(KB)':>12}{'变化':>9}{'内存峰值(KB)':>14}{'变化':>9}")
+    print(header)
+    print('-' * 120)
+    for name, result in entry['results'].items():
+        before = (previous or {}).get('results', {}).get(name, {})
+        read_kb = result['bytes_read'] / 1024
+        before_kb = before['bytes_read'] / 1024 if 'bytes_read' in before else None
+        print(f"{name:<34}{result['wall_s']:>10.3f}{_delta(result['wall_s'], before.get('wall_s')):>9}"
+              f"{result['total_requests']:>9}{_delta(result['total_requests'], before.get('total_requests')):>9}"
+              f"{read_kb:>12.1f}{_delta(read_kb, before_kb):>9}"
+              f"{result['peak_mem_kb']:>14.1f}{_delta(result['peak_mem_kb'], before.get('peak_mem_kb')):>9}")
+
+
+def _delta(current, before):
+    if not before:
+        return '-'
+    return f"{(current - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地 OSS 替身上运行基准测试')
+    parser.add_argument('--spots', type=int, default=150, help='景点数量（默认: 150）')
+    parser.add_argument('--days', type=int, default=35, help='生成数据的天数（默认: 35）')
+    parser.add_argument('--interval', type=int, default=20, help='爬取间隔分钟数（默认: 20）')
+    parser.add_argument('--legacy-days', type=int, default=3, help='旧格式数据天数（默认: 3）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子（默认: 42）')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='每次 OSS 请求的延迟（默认: 2ms）')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='额外随机延迟上限（默认: 0）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='请求失败概率（默认: 0）')
+    parser.add_argument('--crawls', type=int, default=3, help='upload_data 场景的爬取次数（默认: 3）')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数（默认: 3）')
+    parser.add_argument('--only', nargs='*', help='只运行指定场景')
+    parser.add_argument('--work-dir', default=None, help='工作目录（默认使用临时目录并在结束后删除）')
+    parser.add_argument('--no-save', action='store_true', help='不写入结果历史')
+    parser.add_argument('--profile', metavar='DIR', default=None,
+                        help='计时后每个场景再剖析一次，报告写入 DIR/<场景>/profile.json')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='tourist-bench-')
+    ctx = BenchContext(args, work_dir)
+    logging.disable(logging.CRITICAL)
+
+    # 数据加载结果写入工作目录，不覆盖 web/data
+    data_loader.DATA_DIR = ctx.output_dir
+    data_loader.SPOTS_DIR = os.path.join(ctx.output_dir, 'spots')
+    data_loader.BUILD_STATE_PATH = os.path.join(work_dir, 'cache', 'build_state.json')
+    os.makedirs(data_loader.SPOTS_DIR, exist_ok=True)
+
+    try:
+        with redirect_stdout(io.StringIO()):
+            generate_raw_data(ctx.oss_root, n_spots=args.spots, days=args.days, interval=args.interval,
+                              seed=args.seed, legacy_days=args.legacy_days)
+        ctx.stash_legacy()
+
+        config = {k: getattr(args, k) for k in ('spots', 'days', 'interval', 'legacy_days', 'seed',
+                                                 'latency_ms', 'jitter_ms', 'failure_rate', 'crawls', 'repeat')}
+        results = {}
+        for name, factory in SCENARIOS:
+            if args.only and name not in args.only:
+                continue
+            print(f"运行场景: {name} ...")
+            results[name] = measure(name, factory, ctx)
+
+        commit, dirty = git_revision()
+        entry = {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': config,
+            'results': results
+        }
+        previous = load_previous(config)
+        print_report(entry, previous)
+        if not args.no_save:
+            save_result(entry)
+            print(f"\n结果已追加到: {RESULTS_PATH}")
+        if args.profile:
+            print(f"剖析报告已写入: {args.profile}/<场景>/profile.json")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+景点客流接口的本地替身 - 模拟慢响应、连接中断、非200状态码与业务错误
+
+    # 启动替身服务，供爬虫使用（TOURIST_API_URL=http://127.0.0.1:8765/）
+    python benchmarks/stub_api.py --port 8765 --slow-rate 0.1 --error-rate 0.1
+
+    # 对比单次请求与 ApiFetcher 在同一故障分布下的尾延迟与成功率
+    python benchmarks/stub_api.py --bench 200 --slow-rate 0.05 --slow-delay 5 --error-rate 0.1
+
+    # 4 个延迟各不相同的替身数据源，对比逐个爬取与并发爬取（写入本地 OSS 替身）的总耗时
+    python benchmarks/stub_api.py --sources 4 --latency 0.5 --oss-latency-ms 2
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'web'))
+
+from api_fetcher import ApiFetcher, CircuitBreaker  # noqa: E402
+from crawl_sources import Source, crawl_all  # noqa: E402
+from tourist_crawler import TouristCrawler  # noqa: E402
+from fake_oss import FakeBucket  # noqa: E402
+from generate_mock_data import build_raw_spots  # noqa: E402
+
+
+def build_payload(n_spots=150, seed=42):
+    """与真实接口结构一致的响应体"""
+    rng = random.Random(seed)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M')
+    rows = []
+    for spot in build_raw_spots(rng, n_spots):
+        num = rng.randint(0, spot['max_num'])
+        rows.append(json.loads(spot['template'] % (now, '舒适', num, '正常')))
+    return {'total': str(len(rows)), 'rows': rows, 'code': 200, 'msg': '查询成功'}
+
+
+class StubApi:
+    """
+    故障分布（每个请求独立抽样）：
+
+    - latency: 正常响应的基础延迟（秒），叠加 0~latency_jitter 的随机延迟
+    - slow_rate / slow_delay: 以该概率额外等待 slow_delay 秒（长尾）
+    - error_rate: 以该概率返回 503
+    - bad_code_rate: 以该概率返回 HTTP 200 但 code 为 500 的业务错误
+    - reset_rate: 以该概率不返回任何内容直接断开连接
+    - outage: 为 True 时所有请求返回 503
+
+    request_times 按到达顺序记录每个请求的 time.monotonic()，用于检查请求间隔
+    """
+
+    def __init__(self, payload=None, latency=0.05, latency_jitter=0.05, slow_rate=0.0, slow_delay=5.0,
+                 error_rate=0.0, bad_code_rate=0.0, reset_rate=0.0, seed=0):
+        self.body = json.dumps(payload or build_payload(), ensure_ascii=False).encode('utf-8')
+        self.error_body = json.dumps({'code': 500, 'msg': '系统繁忙'}, ensure_ascii=False).encode('utf-8')
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate
+        self.bad_code_rate = bad_code_rate
+        self.reset_rate = reset_rate
+        self.outage = False
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.request_times = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def decide(self):
+        """抽样本次请求的 (行为, 延迟秒数)"""
+        with self._lock:
+            self.requests += 1
+            self.request_times.append(time.monotonic())
+            r = self.rng.random
+            delay = self.latency + r() * self.latency_jitter
+            if r() < self.slow_rate:
+                delay += self.slow_delay
+            if self.outage or r() < self.error_rate:
+                return 'error', delay
+            if r() < self.reset_rate:
+                return 'reset', delay
+            if r() < self.bad_code_rate:
+                return 'bad_code', delay
+            return 'ok', delay
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.stub._lock:
+            self.server.stub.connections += 1
+
+    def do_GET(self):
+        action, delay = self.server.stub.decide()
+        time.sleep(delay)
+        if action == 'reset':
+            self.close_connection = True
+            return
+        if action == 'error':
+            self._send(503, b'Service Unavailable', 'text/plain')
+        elif action == 'bad_code':
+            self._send(200, self.server.stub.error_body)
+        else:
+            self._send(200, self.server.stub.body)
+
+    def _send(self, status, body, content_type='application/json;charset=UTF-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubApiServer:
+    """在后台线程中运行的替身服务，port=0 时自动分配端口"""
+
+    def __init__(self, stub, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = stub
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/statistics/getViewTourist"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ---------- 对比测试 ----------
+
+def naive_fetch(url, timeout=30):
+    """改造前的请求方式：单次 requests.get，无重试"""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def run_bench(args):
+    results = {}
+    for label in ('单次请求', 'ApiFetcher'):
+        stub = StubApi(latency=args.latency, latency_jitter=args.jitter, slow_rate=args.slow_rate,
+                       slow_delay=args.slow_delay, error_rate=args.error_rate,
+                       bad_code_rate=args.bad_code_rate, reset_rate=args.reset_rate, seed=args.seed)
+        with StubApiServer(stub) as server:
+            fetcher = ApiFetcher(server.url, deadline=args.deadline, read_timeout=args.read_timeout,
+                                 breaker=CircuitBreaker(threshold=10 ** 9),
+                                 validate=lambda data: data.get('code') == 200, seed=args.seed)
+            walls, ok = [], 0
+            for _ in range(args.bench):
+                start = time.perf_counter()
+                try:
+                    data = naive_fetch(server.url) if label == '单次请求' else fetcher.fetch()
+                    ok += data.get('code') == 200
+                except Exception:
+                    pass
+                walls.append(time.perf_counter() - start)
+            fetcher.close()
+        walls.sort()
+        results[label] = {
+            'success': ok / args.bench,
+            'p50': statistics.median(walls),
+            'p95': walls[int(0.95 * (len(walls) - 1))],
+            'p99': walls[int(0.99 * (len(walls) - 1))],
+            'max': walls[-1],
+            'requests': stub.requests,
+            'connections': stub.connections,
+        }
+
+    print(f"\n{'方式':<12}{'成功率':>8}{'p50(s)':>9}{'p95(s)':>9}{'p99(s)':>9}{'max(s)':>9}{'请求数':>8}{'连接数':>8}")
+    print('-' * 72)
+    for label, r in results.items():
+        print(f"{label:<12}{r['success']:>8.1%}{r['p50']:>9.3f}{r['p95']:>9.3f}{r['p99']:>9.3f}"
+              f"{r['max']:>9.3f}{r['requests']:>8}{r['connections']:>8}")
+    return results
+
+
+def run_sources_bench(args):
+    """第 i 个替身数据源的延迟为 (i + 1) * latency；逐个爬取的耗时约为各数据源之和，并发爬取约为最慢的一个"""
+    servers = [StubApiServer(StubApi(latency=args.latency * (i + 1), latency_jitter=0, seed=args.seed + i)).start()
+               for i in range(args.sources)]
+    sources = [Source(f"stub{i}", server.url, min_interval=0) for i, server in enumerate(servers)]
+    results = {}
+    try:
+        for label in ('逐个爬取', '并发爬取'):
+            with tempfile.TemporaryDirectory() as root:
+                bucket = FakeBucket(root, latency=args.oss_latency_ms / 1000.0)
+                crawlers = [TouristCrawler(bucket=bucket, source=source) for source in sources]
+                start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    if label == '逐个爬取':
+                        per_source = []
+                        for crawler in crawlers:
+                            t = time.perf_counter()
+                            crawler.upload_data(crawler.fetch_data())
+                            per_source.append(time.perf_counter() - t)
+                    else:
+                        per_source = [r['fetch_s'] + r['upload_s'] for r in crawl_all(crawlers)]
+                results[label] = {'wall': time.perf_counter() - start, 'slowest': max(per_source),
+                                  'sum': sum(per_source), 'requests': bucket.stats()['total_requests']}
+    finally:
+        for server in servers:
+            server.stop()
+
+    print(f"\n{'方式':<10}{'总耗时(s)':>12}{'最慢数据源(s)':>16}{'各数据源之和(s)':>18}{'OSS请求数':>12}")
+    print('-' * 70)
+    for label, r in results.items():
+        print(f"{label:<10}{r['wall']:>12.3f}{r['slowest']:>16.3f}{r['sum']:>18.3f}{r['requests']:>12}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='景点客流接口的本地替身')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口（默认: 8765）')
+    parser.add_argument('--latency', type=float, default=0.05, help='基础延迟秒数（默认: 0.05）')
+    parser.add_argument('--jitter', type=float, default=0.05, help='随机附加延迟上限（默认: 0.05）')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='慢响应概率')
+    parser.add_argument('--slow-delay', type=float, default=5.0, help='慢响应附加延迟秒数（默认: 5）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--bad-code-rate', type=float, default=0.0, help='返回业务错误 (code 500) 的概率')
+    parser.add_argument('--reset-rate', type=float, default=0.0, help='直接断开连接的概率')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认: 0）')
+    parser.add_argument('--bench', type=int, default=0, help='不启动服务，改为执行 N 次请求的对比测试')
+    parser.add_argument('--deadline', type=float, default=20.0, help='对比测试中 ApiFetcher 的截止时间（默认: 20）')
+    parser.add_argument('--read-timeout', type=float, default=10.0, help='对比测试中 ApiFetcher 的读取超时（默认: 10）')
+    parser.add_argument('--sources', type=int, default=0,
+                        help='不启动服务，改为对比 N 个替身数据源逐个爬取与并发爬取的总耗时')
+    parser.add_argument('--oss-latency-ms', type=float, default=2.0,
+                        help='多数据源对比中本地 OSS 替身每个请求的延迟毫秒数（默认: 2）')
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args)
+        return
+    if args.sources:
+        run_sources_bench(args)
+        return
+
+    stub = StubApi(latency=args.latency, latency_jitter=args.jitter, slow_rate=args.slow_rate,
+                   slow_delay=args.slow_delay, error_rate=args.error_rate,
+                   bad_code_rate=args.bad_code_rate, reset_rate=args.reset_rate, seed=args.seed)
+    server = StubApiServer(stub, port=args.port)
+    print(f"替身接口已启动: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"共处理 {stub.requests} 个请求，{stub.connections} 个连接")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+数据源注册表与并发爬取 - 多个结构相同的客流接口并发爬取，各自写入 tourist_data/<数据源>/ 命名空间
+
+默认数据源 shanghai 写入 tourist_data/ 本身（与原有结构相同），其他数据源由代码 register_source()
+或 TOURIST_SOURCES_FILE 指向的 JSON 文件注册：
+    [{"name": "hangzhou", "url": "https://.../getViewTourist", "min_interval": 2, "headers": {"Referer": "..."}}]
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+
+DATA_PREFIX = 'tourist_data/'
+DEFAULT_SOURCE = 'shanghai'
+SOURCES_FILE = os.getenv('TOURIST_SOURCES_FILE')
+# 同一数据源相邻两次请求的最小间隔（秒）
+DEFAULT_MIN_INTERVAL = float(os.getenv('TOURIST_SOURCE_MIN_INTERVAL', '1'))
+
+# 数据源名即目录名：不能是纯数字（年份分区）或以下划线开头（_backup、_shards 等内部目录）
+_NAME_RE = re.compile(r'^[a-z][a-z0-9_-]*$')
+
+
+class Source:
+    """一个客流接口：名称、地址、附加请求头、写入前缀与请求间隔"""
+
+    __slots__ = ('name', 'url', 'headers', 'prefix', 'min_interval', 'limiter')
+
+    def __init__(self, name, url, headers=None, prefix=None, min_interval=DEFAULT_MIN_INTERVAL):
+        self.name = name
+        self.url = url
+        self.headers = dict(headers or {})
+        self.prefix = prefix or (DATA_PREFIX if name == DEFAULT_SOURCE else f"{DATA_PREFIX}{name}/")
+        self.min_interval = min_interval
+        self.limiter = RateLimiter(min_interval)
+
+
+class RateLimiter:
+    """
+    相邻两次请求的最小间隔（进程内，函数计算热启动时保留）
+
+    由 ApiFetcher 在每个 HTTP 请求（含重试与对冲请求）发出前调用；对冲请求来自线程池，预约时加锁
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预约下一个时间槽，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + self.min_interval
+            return start - now
+
+
+_registry = {}
+_loaded = False
+
+
+def register_source(name, url, headers=None, prefix=None, min_interval=DEFAULT_MIN_INTERVAL, replace=True):
+    """注册数据源，返回 Source；replace 为 False 时已注册的同名数据源（如配置文件中的）保持不变"""
+    if not _NAME_RE.match(name):
+        raise ValueError(f"无效的数据源名称: {name}（只能包含小写字母、数字、- 与 _，且以字母开头）")
+    if not replace and name in _registry:
+        return _registry[name]
+    source = _registry[name] = Source(name, url, headers, prefix, min_interval)
+    return source
+
+
+def load_sources(path=SOURCES_FILE):
+    """从 JSON 配置文件注册数据源（只加载一次），返回注册的个数"""
+    global _loaded
+    if _loaded or not path:
+        return 0
+    _loaded = True
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    for item in items:
+        register_source(item['name'], item['url'], headers=item.get('headers'), prefix=item.get('prefix'),
+                        min_interval=float(item.get('min_interval', DEFAULT_MIN_INTERVAL)))
+    return len(items)
+
+
+def get_source(name):
+    load_sources()
+    return _registry[name]
+
+
+def all_sources():
+    """按注册顺序返回所有数据源"""
+    load_sources()
+    return list(_registry.values())
+
+
+# ---------- 并发爬取 ----------
+
+async def _crawl_one(crawler):
+    """
+    取数据，取到后立即上传；请求与上传都是阻塞调用，放到线程中执行，因此一个数据源上传时其他数据源的请求
+    仍在进行。请求间隔由爬虫的 ApiFetcher 按 source.limiter 在每个 HTTP 请求前等待
+    """
+    source = crawler.source
+    result = {'source': source.name, 'success': False, 'fetch_s': None, 'upload_s': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        data = await asyncio.to_thread(crawler.fetch_data)
+        result['fetch_s'] = time.perf_counter() - start
+        if not data:
+            result['error'] = '未获取到数据'
+            return result
+        start = time.perf_counter()
+        result['success'] = await asyncio.to_thread(crawler.upload_data, data)
+        result['upload_s'] = time.perf_counter() - start
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+async def crawl_sources(crawlers):
+    """并发爬取：crawlers 为各数据源的爬虫（有 source、fetch_data()、upload_data(data)），返回各自的结果"""
+    return await asyncio.gather(*(_crawl_one(crawler) for crawler in crawlers))
+
+
+def crawl_all(crawlers):
+    """同步入口，总耗时接近最慢的单个数据源（请求 + 上传），而不是各数据源之和"""
+    return asyncio.run(crawl_sources(crawlers))
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+"""本地缓存目录 - OSS 对象清单、构建状态、矩阵缓存与剖析报告共用（不依赖 oss2）"""
+
+import os
+
+CACHE_DIR = os.getenv('TOURIST_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
@@ -7,109 +7,144 @@ import json
 from datetime import datetime
 from collections import defaultdict
 
+from oss_inventory import OSSInventory
+from oss_writer import AppendWriter, index_path, parse_index, INDEX_SUFFIX
+from oss_manifest import ManifestWriter, LEGACY_MANIFEST_NAME
+from stage_profiler import stage, start_profiling, stop_profiling, format_report
+from spot_catalog import SpotCatalog, safe_name
+
 # 配置
 OSS_ACCESS_KEY_ID = os.getenv('OSS_ACCESS_KEY_ID')
 OSS_ACCESS_KEY_SECRET = os.getenv('OSS_ACCESS_KEY_SECRET')
 OSS_ENDPOINT = os.getenv('OSS_ENDPOINT', 'oss-cn-shanghai.aliyuncs.com')
 OSS_BUCKET_NAME = os.getenv('OSS_BUCKET_NAME', 'shanghai-tourist-traffic')
 
+def safe_spot_name(spot):
+    return safe_name(spot.get('NAME') or '未知景点')
+
 class OSSDataMigrator:
-    def __init__(self, dry_run=True):
+    def __init__(self, dry_run=True, prefix='tourist_data/', use_cache=True, bucket=None):
         """
         初始化迁移器
 
         Args:
             dry_run: 如果为True，只打印操作不实际执行
+            prefix: OSS路径前缀
+            use_cache: 是否复用本地缓存的对象清单（已封存的月份分区不再列举）
+            bucket: 已创建的 Bucket 对象（默认按环境变量创建）
         """
-        if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET_NAME]):
-            raise ValueError("缺少必要的OSS配置项")
+        if bucket is None:
+            if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET_NAME]):
+                raise ValueError("缺少必要的OSS配置项")
 
-        auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
-        self.bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET_NAME)
+            auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
+            bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET_NAME)
+        self.bucket = bucket
         self.dry_run = dry_run
+        self.prefix = prefix
+        self.catalog = SpotCatalog()
+        # 迁移结果总是写入逻辑路径本身；与爬虫并发追加时按服务端返回的位置重试
+        self.manifest = ManifestWriter(self.bucket)
+        self.writer = AppendWriter(self.bucket, mode='single', manifest=self.manifest)
 
-    def list_old_data_files(self, prefix='tourist_data/'):
-        """列出所有旧的数据文件"""
-        print(f"\n正在扫描 {prefix} 下的文件...")
-        files = []
-
-        for obj in oss2.ObjectIterator(self.bucket, prefix=prefix):
-            # 跳过已经是新格式的文件 (YYYY/MM/DD.jsonl 或 YYYY/MM/景点名.jsonl)
-            path_parts = obj.key.replace(prefix, '').split('/')
-
-            # 新格式: tourist_data/2025/11/20.jsonl 或 tourist_data/2025/11/景点名.jsonl
-            if len(path_parts) == 3 and path_parts[0].isdigit() and path_parts[1].isdigit():
-                print(f"  跳过（已是新格式）: {obj.key}")
-                continue
-
-            files.append(obj.key)
-            print(f"  发现旧文件: {obj.key}")
+        self.inventory = OSSInventory(self.bucket, prefix=prefix)
+        if use_cache and self.inventory.load():
+            print(f"已加载本地对象清单缓存: {self.inventory.cache_path}")
 
+    def list_old_data_files(self):
+        """列出所有旧的数据文件"""
+        print(f"\n正在扫描 {self.prefix} 下的文件...")
+        start = datetime.now()
+
+        # 按 年/月 分区分层并发列举，新格式分区 (YYYY/MM/DD.jsonl 或 YYYY/MM/景点名.jsonl) 只统计不迁移
+        with stage('fetch'):
+            self.inventory.refresh()
+        with stage('write'):
+            self.inventory.save()
+
+        for partition, info in sorted(self.inventory.partitions.items()):
+            print(f"  跳过（已是新格式）: {self.prefix}{partition} ({len(info['objects'])} 个文件)")
+        for directory in self.inventory.skipped_dirs:
+            print(f"  跳过（不是旧格式目录）: {directory}")
+
+        files = self.inventory.legacy_keys()
+        for key in files:
+            print(f"  发现旧文件: {key}")
+
+        elapsed = (datetime.now() - start).total_seconds()
+        print(f"  扫描完成: {len(self.inventory.partitions)} 个分区，"
+              f"{self.inventory.list_requests} 次列举请求，耗时 {elapsed:.2f}s")
         return files
 
     def parse_old_file(self, file_path):
         """读取并解析旧文件内容"""
         try:
             print(f"\n读取文件: {file_path}")
-            result = self.bucket.get_object(file_path)
-            content = result.read().decode('utf-8')
+            with stage('fetch'):
+                result = self.bucket.get_object(file_path)
+                content = result.read()
+            with stage('decode'):
+                content = content.decode('utf-8')
 
             records = []
 
             # 尝试解析为单个JSON对象（旧格式）
             try:
-                data = json.loads(content)
-
-                # 处理 by_date 格式：包含 date、last_updated、data 字段
-                if 'data' in data and isinstance(data['data'], list):
-                    # by_date 格式
-                    if 'date' in data:
-                        for item in data['data']:
-                            if 'fetch_time' in item:
-                                # 转换为新格式
-                                records.append({
-                                    'timestamp': item['fetch_time'],
-                                    'data': item
-                                })
-                    # by_name 格式：包含 spot_name、month、data 字段
-                    elif 'spot_name' in data:
-                        spot_name = data['spot_name']
-                        for item in data['data']:
-                            # 使用 TIME 字段作为时间戳
-                            time_str = item.get('TIME', '')
-                            if time_str:
-                                # 转换时间格式：2025-11-07 15:42 -> 2025-11-07T15:42:00
-                                try:
-                                    timestamp = datetime.strptime(time_str, '%Y-%m-%d %H:%M').isoformat()
-                                except:
-                                    timestamp = time_str
-
-                                records.append({
-                                    'timestamp': timestamp,
-                                    'spot': item
-                                })
-                # 处理其他格式
-                elif isinstance(data, dict) and 'records' in data:
-                    records = data['records']
-                elif isinstance(data, list):
-                    records = data
-                else:
-                    # 直接使用这个数据对象
-                    records = [data]
+                with stage('decode'):
+                    data = json.loads(content)
+
+                with stage('parse'):
+                    # 处理 by_date 格式：包含 date、last_updated、data 字段
+                    if 'data' in data and isinstance(data['data'], list):
+                        # by_date 格式
+                        if 'date' in data:
+                            for item in data['data']:
+                                if 'fetch_time' in item:
+                                    # 转换为新格式
+                                    records.append({
+                                        'timestamp': item['fetch_time'],
+                                        'data': item
+                                    })
+                        # by_name 格式：包含 spot_name、month、data 字段
+                        elif 'spot_name' in data:
+                            spot_name = data['spot_name']
+                            for item in data['data']:
+                                # 使用 TIME 字段作为时间戳
+                                time_str = item.get('TIME', '')
+                                if time_str:
+                                    # 转换时间格式：2025-11-07 15:42 -> 2025-11-07T15:42:00
+                                    try:
+                                        timestamp = datetime.strptime(time_str, '%Y-%m-%d %H:%M').isoformat()
+                                    except:
+                                        timestamp = time_str
+
+                                    records.append({
+                                        'timestamp': timestamp,
+                                        'spot': item
+                                    })
+                    # 处理其他格式
+                    elif isinstance(data, dict) and 'records' in data:
+                        records = data['records']
+                    elif isinstance(data, list):
+                        records = data
+                    else:
+                        # 直接使用这个数据对象
+                        records = [data]
 
                 print(f"  成功解析 {len(records)} 条记录")
                 return records
             except json.JSONDecodeError:
                 # 如果不是单个JSON，尝试按行解析（JSONL格式）
-                for line_num, line in enumerate(content.strip().split('\n'), 1):
-                    if not line.strip():
-                        continue
-                    try:
-                        record = json.loads(line)
-                        records.append(record)
-                    except json.JSONDecodeError as e:
-                        print(f"  警告: 第 {line_num} 行JSON解析失败: {e}")
-                        continue
+                with stage('decode'):
+                    for line_num, line in enumerate(content.strip().split('\n'), 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                            records.append(record)
+                        except json.JSONDecodeError as e:
+                            print(f"  警告: 第 {line_num} 行JSON解析失败: {e}")
+                            continue
 
                 print(f"  成功解析 {len(records)} 条记录")
                 return records
@@ -127,7 +162,9 @@ class OSSDataMigrator:
             spot_groups: {(year, month, spot_name): [records]}
         """
         daily_groups = defaultdict(list)
-        spot_groups = defaultdict(list)
+        # 按景点ID分组，同一景点在该月内更名时写入最新名称对应的文件
+        spot_id_groups = defaultdict(list)
+        group_latest = {}  # {(year, month, spot_id): (timestamp, 最新的景点数据)}
 
         for record in records:
             # 解析时间戳
@@ -153,48 +190,61 @@ class OSSDataMigrator:
             # 按景点分组
             data = record.get('data', {})
             if 'rows' in data:
-                for spot in data['rows']:
-                    spot_name = spot.get('NAME', '未知景点')
-                    safe_name = spot_name.replace('/', '_').replace('\\', '_')
-                    spot_key = (year, month, safe_name)
-
-                    spot_record = {
-                        'timestamp': timestamp_str,
-                        'spot': spot
-                    }
-                    spot_groups[spot_key].append(spot_record)
+                spot_records = [(spot, {'timestamp': timestamp_str, 'spot': spot}) for spot in data['rows']]
             elif 'spot' in record:
                 # 如果记录本身就是景点数据
-                spot = record.get('spot', {})
-                spot_name = spot.get('NAME', '未知景点')
-                safe_name = spot_name.replace('/', '_').replace('\\', '_')
-                spot_key = (year, month, safe_name)
-                spot_groups[spot_key].append(record)
+                spot_records = [(record.get('spot', {}), record)]
+            else:
+                spot_records = []
+
+            for spot, spot_record in spot_records:
+                spot_id = self.catalog.intern(spot)
+                spot_key = (year, month, spot_id)
+                spot_id_groups[spot_key].append(spot_record)
+                if spot_key not in group_latest or group_latest[spot_key][0] <= timestamp:
+                    group_latest[spot_key] = (timestamp, spot)
+
+        spot_groups = {}
+        for (year, month, spot_id), spot_records in spot_id_groups.items():
+            spot_key = (year, month, safe_spot_name(group_latest[(year, month, spot_id)][1]))
+            spot_groups.setdefault(spot_key, []).extend(spot_records)
 
         return daily_groups, spot_groups
 
-    def write_to_new_path(self, path, records):
-        """将记录写入新路径（追加模式）"""
+    def write_to_new_path(self, path, records, indexed=False):
+        """将记录写入新路径（追加模式），indexed 为 True 时同步追加时间索引"""
         if not records:
             return True
 
-        content = '\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n'
+        with stage('serialize'):
+            lines = [json.dumps(r, ensure_ascii=False) + '\n' for r in records]
 
         if self.dry_run:
             print(f"  [DRY RUN] 将写入 {len(records)} 条记录到: {path}")
             return True
 
         try:
-            if self.bucket.object_exists(path):
-                # 追加到已有文件
-                head_result = self.bucket.head_object(path)
-                position = head_result.content_length
-                result = self.bucket.append_object(path, position, content.encode('utf-8'))
-            else:
-                # 创建新文件
-                result = self.bucket.append_object(path, 0, content.encode('utf-8'))
+            with stage('write'):
+                # 清单中有该文件时以其大小作为追加位置，否则由位置冲突的响应得到文件长度
+                for key in (path, index_path(path)) if indexed else (path,):
+                    known = self.inventory.lookup(key)
+                    if known and key not in self.writer.positions:
+                        self.writer.positions[key] = known[0]
+                if indexed:
+                    _, result = self.writer.append_indexed(path, [(r.get('timestamp', ''), line)
+                                                                  for r, line in zip(records, lines)])
+                    if index_path(path) in self.writer.positions:
+                        self.inventory.record(index_path(path), self.writer.positions[index_path(path)])
+                else:
+                    timestamps = [r['timestamp'] for r in records if r.get('timestamp')]
+                    spot = records[-1].get('spot') or {}
+                    _, result = self.writer.append(path, ''.join(lines),
+                                                   first=min(timestamps, default=None),
+                                                   last=max(timestamps, default=None),
+                                                   code=spot.get('CODE'), name=spot.get('NAME'))
 
             if result.status == 200:
+                self.inventory.record(path, result.next_position, result.etag)
                 print(f"  ✓ 成功写入 {len(records)} 条记录到: {path}")
                 return True
             else:
@@ -213,7 +263,8 @@ class OSSDataMigrator:
             return True
 
         try:
-            self.bucket.copy_object(OSS_BUCKET_NAME, old_path, backup_path)
+            with stage('write'):
+                self.bucket.copy_object(self.bucket.bucket_name, old_path, backup_path)
             print(f"  ✓ 备份成功: {backup_path}")
             return True
         except Exception as e:
@@ -227,7 +278,9 @@ class OSSDataMigrator:
             return True
 
         try:
-            self.bucket.delete_object(old_path)
+            with stage('write'):
+                self.bucket.delete_object(old_path)
+            self.inventory.forget(old_path)
             print(f"  ✓ 删除成功: {old_path}")
             return True
         except Exception as e:
@@ -248,7 +301,8 @@ class OSSDataMigrator:
 
         # 2. 按日期和景点分组
         print("\n分组记录...")
-        daily_groups, spot_groups = self.group_records_by_date_and_spot(records)
+        with stage('aggregate'):
+            daily_groups, spot_groups = self.group_records_by_date_and_spot(records)
         print(f"  日期分组: {len(daily_groups)} 个")
         print(f"  景点分组: {len(spot_groups)} 个")
 
@@ -257,7 +311,7 @@ class OSSDataMigrator:
         daily_success = True
         for (year, month, day), day_records in sorted(daily_groups.items()):
             new_path = f"tourist_data/{year}/{month}/{day}.jsonl"
-            if not self.write_to_new_path(new_path, day_records):
+            if not self.write_to_new_path(new_path, day_records, indexed=True):
                 daily_success = False
 
         # 4. 写入按景点分组的数据
@@ -268,6 +322,10 @@ class OSSDataMigrator:
             if not self.write_to_new_path(new_path, spot_records):
                 spot_success = False
 
+        # 写入的文件同步到分区清单
+        if not self.dry_run and self.manifest.flush():
+            print("  ✓ 分区清单已更新")
+
         # 5. 如果成功，备份并删除旧文件
         if daily_success and spot_success:
             print("\n处理旧文件...")
@@ -278,6 +336,68 @@ class OSSDataMigrator:
             print("\n迁移失败，保留旧文件")
             return False
 
+    def scan_object(self, key, size):
+        """读取对象的前 size 字节，统计记录数、首末时间与景点CODE（清单条目的字段）"""
+        if not size:
+            return {'records': 0}
+        with stage('fetch'):
+            content = self.bucket.get_object(key, byte_range=(0, size - 1),
+                                             headers={'x-oss-range-behavior': 'standard'}).read()[:size]
+        with stage('parse'):
+            if key.endswith(INDEX_SUFFIX):
+                timestamps = [entry[0] for entry in parse_index(content)]
+                return {'records': len(timestamps), 'first': min(timestamps, default=None),
+                        'last': max(timestamps, default=None)}
+
+            lines = [line for line in content.decode('utf-8', errors='replace').split('\n') if line.strip()]
+            stats = {'records': len(lines)}
+            for field, line in (('first', lines[0] if lines else None), ('last', lines[-1] if lines else None)):
+                try:
+                    record = json.loads(line) if line else {}
+                except ValueError:
+                    continue
+                stats[field] = record.get('timestamp')
+                if field == 'last' and record.get('spot'):
+                    stats['code'] = record['spot'].get('CODE')
+                    stats['name'] = record['spot'].get('NAME')
+            return stats
+
+    def rebuild_manifests(self):
+        """
+        按列举结果重建所有月份分区的清单（逐个读取对象统计记录数），写入本写入者的 _manifest/<写入者ID>.json
+        并标记为完整；旧的单文件清单 _manifest.json 随之删除
+        """
+        print("="*60)
+        print("重建分区清单")
+        print("="*60)
+        with stage('fetch'):
+            self.inventory.refresh()
+
+        for partition, info in sorted(self.inventory.partitions.items()):
+            legacy_manifest = f"{self.prefix}{partition}{LEGACY_MANIFEST_NAME}"
+            objects = {key: value for key, value in info['objects'].items() if key != legacy_manifest}
+            if self.dry_run:
+                print(f"  [DRY RUN] 将重建: {self.manifest.key(self.prefix + partition)} ({len(objects)} 个对象)")
+                continue
+            failed = 0
+            for key, (size, etag) in sorted(objects.items()):
+                try:
+                    stats = self.scan_object(key, size)
+                except oss2.exceptions.OssError as e:
+                    print(f"  ✗ 读取失败，跳过: {key} - {e}")
+                    failed += 1
+                    continue
+                self.manifest.replace(key, size, etag, **stats)
+            # 有对象未能计入时清单不标记为完整，读取端仍按列举结果读取
+            if self.manifest.flush(complete=not failed):
+                print(f"  ✓ 已重建: {self.manifest.key(self.prefix + partition)} ({len(objects)} 个对象)")
+                if legacy_manifest in info['objects']:
+                    self.bucket.delete_object(legacy_manifest)
+                    self.inventory.forget(legacy_manifest)
+
+        if self.dry_run:
+            print("\n这是预览模式，如需写入清单，请使用: --execute 参数")
+
     def run(self):
         """执行迁移"""
         print("="*60)
@@ -317,6 +437,10 @@ class OSSDataMigrator:
             else:
                 fail_count += 1
 
+        # 写入和删除已同步到清单，保存供下次运行复用
+        if not self.dry_run:
+            self.inventory.save()
+
         # 总结
         print("\n" + "="*60)
         print("迁移完成")
@@ -333,15 +457,33 @@ def main():
                        help='实际执行迁移（默认为预览模式）')
     parser.add_argument('--prefix', default='tourist_data/',
                        help='OSS路径前缀（默认: tourist_data/）')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='忽略本地对象清单缓存，重新列举所有分区')
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                       help='按阶段剖析（fetch/decode/parse/aggregate/serialize/write），'
+                            '报告写入 DIR（默认 .cache/profile/migrate-<时间>）')
+    parser.add_argument('--rebuild-manifest', action='store_true',
+                       help='列举并读取所有对象，重建各月份分区的清单 _manifest/（不迁移旧文件）')
 
     args = parser.parse_args()
 
+    if args.profile is not None:
+        start_profiling('migrate', args.profile or None)
     try:
-        migrator = OSSDataMigrator(dry_run=not args.execute)
-        migrator.run()
+        migrator = OSSDataMigrator(dry_run=not args.execute, prefix=args.prefix,
+                                   use_cache=not args.no_cache)
+        if args.rebuild_manifest:
+            migrator.rebuild_manifests()
+        else:
+            migrator.run()
     except Exception as e:
         print(f"\n错误: {e}")
         exit(1)
+    finally:
+        if args.profile is not None:
+            path, report = stop_profiling()
+            print(f"\n剖析报告已保存至: {path}")
+            print(format_report(report))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""OSS对象清单 - 按 年/月 分区并发列举，并在本地缓存 (key, size, ETag)"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import oss2
+
+from oss_writer import SHARD_DIR, logical_path
+from oss_manifest import MANIFEST_DIR, read_manifest
+from local_cache import CACHE_DIR
+
+# 本地缓存路径
+INVENTORY_CACHE_PATH = os.path.join(CACHE_DIR, 'oss_inventory.json')
+# 2: 增加 skipped_dirs
+INVENTORY_VERSION = 2
+
+# 并发列举的线程数
+LIST_WORKERS = int(os.getenv('OSS_LIST_WORKERS', '8'))
+
+# 已知的旧格式目录。tourist_data/ 下的其他目录（_backup/、其他数据源的命名空间 tourist_data/<数据源>/ 等）
+# 一律跳过，不论是否注册了对应的数据源——误当作旧数据迁移会把其他数据源的记录并入上海的分区并删除原文件
+LEGACY_DIRS = ('by_date/', 'by_name/')
+
+
+def is_partition_dir(name):
+    """判断 'YYYY/' 或 'MM/' 这类纯数字目录"""
+    return name.endswith('/') and name[:-1].isdigit()
+
+
+class OSSInventory:
+    """
+    tourist_data/ 下对象的清单
+
+    - partitions: {'YYYY/MM/': {'listed_at': iso, 'objects': {key: [size, etag]}, 'dirs': [...]}}
+      分区内直接存放的对象及 _shards/ 下的分片即新格式文件，dirs 为分区下的其他子目录（其中是旧格式文件）；
+      由分区清单 _manifest/ 得到的分区另有 'manifest': {key: 清单条目}
+    - legacy: {key: [size, etag]} 旧格式文件：by_date/、by_name/ 下的文件，tourist_data/ 与年份目录下直接存放的文件，
+      以及月份分区的子目录中的文件
+    - skipped_dirs: 列举时跳过的其他顶层目录
+
+    已结束月份的分区在月末之后列举过一次即视为封存，之后直接复用缓存，不再列举其内容。
+    """
+
+    def __init__(self, bucket, prefix='tourist_data/', cache_path=INVENTORY_CACHE_PATH, workers=LIST_WORKERS):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_path = cache_path
+        self.workers = workers
+        self.partitions = {}
+        self.legacy = {}
+        self.skipped_dirs = []
+        self.list_requests = 0
+        self._lock = threading.Lock()
+        self._shard_index = {}
+
+    # ---------- 缓存读写 ----------
+
+    def load(self):
+        """读取本地缓存，前缀或版本不一致时忽略"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if cached.get('version') != INVENTORY_VERSION or cached.get('prefix') != self.prefix:
+            return False
+
+        self.partitions = cached.get('partitions', {})
+        self.legacy = cached.get('legacy', {})
+        self.skipped_dirs = cached.get('skipped_dirs', [])
+        return True
+
+    def save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INVENTORY_VERSION,
+                'prefix': self.prefix,
+                'saved_at': datetime.now().isoformat(),
+                'partitions': self.partitions,
+                'legacy': self.legacy,
+                'skipped_dirs': self.skipped_dirs
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    # ---------- 查询 ----------
+
+    def lookup(self, key):
+        """返回 (size, etag)，清单中没有时返回 None"""
+        partition = self.partition_of(key)
+        if partition is not None:
+            entry = self.partitions.get(partition, {}).get('objects', {}).get(key)
+        else:
+            entry = self.legacy.get(key)
+        return tuple(entry) if entry else None
+
+    def contains(self, key):
+        """
+        对象是否存在：分区已列举过时返回 True/False，
+        无法从清单判断（分区未列举或不是新格式路径）时返回 None
+        """
+        partition = self.partition_of(key)
+        info = self.partitions.get(partition) if partition is not None else None
+        if not info or not info.get('listed_at'):
+            return None
+        return key in info['objects']
+
+    def partition_of(self, key):
+        """新格式对象（含分片）所在的分区 'YYYY/MM/'，不是新格式时返回 None"""
+        if not key.startswith(self.prefix):
+            return None
+        parts = key[len(self.prefix):].split('/')
+        if len(parts) == 5 and parts[2] == SHARD_DIR:
+            parts = parts[:2] + parts[4:]
+        if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+            return f"{parts[0]}/{parts[1]}/"
+        return None
+
+    def sources(self, key):
+        """
+        逻辑文件（如 YYYY/MM/DD.jsonl）实际存在的对象：文件本身及各写入者的分片，
+        无法从清单判断时返回 None
+        """
+        if self.contains(key) is None:
+            return None
+        partition = self.partition_of(key)
+        index = self._shard_index.get(partition)
+        if index is None:
+            index = {}
+            for object_key in sorted(self.partitions[partition]['objects']):
+                logical = logical_path(object_key)
+                if logical is not None:
+                    index.setdefault(logical, []).append(object_key)
+            self._shard_index[partition] = index
+        keys = [key] if self.contains(key) else []
+        return keys + index.get(key, [])
+
+    def legacy_keys(self):
+        return sorted(self.legacy)
+
+    def partition_objects(self, partition):
+        return self.partitions.get(partition, {}).get('objects', {})
+
+    def partition_manifest(self, partition):
+        """分区清单中的条目 {key: {size, etag, records, first, last, code, name}}，分区不是由清单得到时返回 None"""
+        return self.partitions.get(partition, {}).get('manifest')
+
+    # ---------- 变更记录（迁移写入/删除后同步清单） ----------
+
+    def record(self, key, size, etag=None):
+        partition = self.partition_of(key)
+        if partition is not None:
+            self.partitions.setdefault(partition, {'listed_at': None, 'objects': {}, 'dirs': []})
+            self.partitions[partition]['objects'][key] = [size, etag]
+            self._shard_index.pop(partition, None)
+        elif self._is_legacy(key):
+            self.legacy[key] = [size, etag]
+
+    def forget(self, key):
+        partition = self.partition_of(key)
+        if partition is not None:
+            self.partitions.get(partition, {}).get('objects', {}).pop(key, None)
+            self._shard_index.pop(partition, None)
+        else:
+            self.legacy.pop(key, None)
+
+    # ---------- 列举 ----------
+
+    def is_sealed(self, partition, now=None):
+        """分区所在月份已结束，且在月末之后完整列举过"""
+        info = self.partitions.get(partition)
+        if not info or not info.get('listed_at') or info.get('dirs') or info.get('manifest') is not None:
+            return False
+
+        now = now or datetime.now()
+        year, month = int(partition[:4]), int(partition[5:7])
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        if now < next_month:
+            return False
+        return datetime.fromisoformat(info['listed_at']) >= next_month
+
+    def refresh(self):
+        """
+        分层列举：
+          1. tourist_data/ 使用分隔符列举，得到年份目录与其他目录
+          2. 并发列举每个年份目录下的月份目录，及旧格式目录 LEGACY_DIRS 的全部内容（其他目录跳过）
+          3. 并发列举未封存的月份分区（仅一层），封存分区直接复用缓存
+        """
+        self.list_requests = 0
+        now = datetime.now()
+        listed_at = now.isoformat()
+
+        top_objects, top_dirs = self._list_level(self.prefix)
+        legacy = {obj.key: [obj.size, obj.etag] for obj in top_objects}
+        partitions = {}
+        skipped_dirs = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            year_futures = []
+            legacy_futures = []
+            for d in top_dirs:
+                if is_partition_dir(d[len(self.prefix):]):
+                    year_futures.append(pool.submit(self._list_level, d))
+                elif d[len(self.prefix):] in LEGACY_DIRS:
+                    legacy_futures.append(pool.submit(self._list_all, d))
+                else:
+                    skipped_dirs.append(d)
+
+            month_futures = []
+            for future in year_futures:
+                objects, dirs = future.result()
+                # 年份目录下直接存放的文件不属于新格式
+                legacy.update((obj.key, [obj.size, obj.etag]) for obj in objects)
+                for d in dirs:
+                    partition = d[len(self.prefix):]
+                    if not is_partition_dir(partition.split('/', 1)[1]):
+                        legacy_futures.append(pool.submit(self._list_all, d))
+                    elif self.is_sealed(partition, now):
+                        partitions[partition] = self.partitions[partition]
+                    else:
+                        month_futures.append((partition, pool.submit(self._list_partition, d)))
+
+            for partition, future in month_futures:
+                objects, dirs = future.result()
+                partitions[partition] = {
+                    'listed_at': listed_at,
+                    'objects': {obj.key: [obj.size, obj.etag] for obj in objects},
+                    'dirs': dirs
+                }
+                # 月份分区下的子目录不是新格式
+                legacy_futures.extend(pool.submit(self._list_all, d) for d in dirs)
+
+            for future in legacy_futures:
+                legacy.update((obj.key, [obj.size, obj.etag]) for obj in future.result())
+
+        self.partitions = partitions
+        self.legacy = legacy
+        self.skipped_dirs = skipped_dirs
+        self._shard_index = {}
+        return self
+
+    def refresh_partition(self, partition, max_age=None, manifest=False):
+        """
+        只重新列举单个月份分区 'YYYY/MM/'（一层），返回其对象字典
+
+        max_age: 分区在该秒数内列举过时直接复用
+        manifest: 先读取分区清单（一次 GET），清单完整时不再列举
+        """
+        info = self.partitions.get(partition)
+        if max_age is not None and info and info.get('listed_at'):
+            age = (datetime.now() - datetime.fromisoformat(info['listed_at'])).total_seconds()
+            if age <= max_age:
+                return info['objects']
+
+        if manifest:
+            entries = read_manifest(self.bucket, self.prefix + partition)
+            if entries is not None and entries.get('complete'):
+                self._shard_index.pop(partition, None)
+                self.partitions[partition] = {
+                    'listed_at': datetime.now().isoformat(),
+                    'objects': {key: [entry['size'], entry['etag']] for key, entry in entries['objects'].items()},
+                    'dirs': [],
+                    'manifest': entries['objects']
+                }
+                return self.partitions[partition]['objects']
+
+        objects, dirs = self._list_partition(self.prefix + partition)
+        self._shard_index.pop(partition, None)
+        self.partitions[partition] = {
+            'listed_at': datetime.now().isoformat(),
+            'objects': {obj.key: [obj.size, obj.etag] for obj in objects},
+            'dirs': dirs
+        }
+        return self.partitions[partition]['objects']
+
+    def _is_legacy(self, key):
+        """不在月份分区中的对象是否属于旧格式（与 refresh() 的划分一致）"""
+        if not key.startswith(self.prefix):
+            return False
+        rel = key[len(self.prefix):]
+        top = rel.split('/', 1)[0]
+        if f"/{MANIFEST_DIR}/" in rel:
+            return False
+        return '/' not in rel or rel.startswith(LEGACY_DIRS) or top.isdigit()
+
+    def _list_level(self, prefix):
+        """使用分隔符列举一层，返回 (对象列表, 子目录列表)"""
+        objects, dirs = [], []
+        for obj in _CountingObjectIterator(self, self.bucket, prefix=prefix, delimiter='/', max_keys=1000):
+            if obj.is_prefix():
+                dirs.append(obj.key)
+            else:
+                objects.append(obj)
+        return objects, dirs
+
+    def _list_partition(self, prefix):
+        """列举月份分区（一层），分片目录下的对象并入分区对象，不再作为子目录；清单目录 _manifest/ 不是数据"""
+        objects, dirs = self._list_level(prefix)
+        if f"{prefix}{MANIFEST_DIR}/" in dirs:
+            dirs.remove(f"{prefix}{MANIFEST_DIR}/")
+        shard_prefix = f"{prefix}{SHARD_DIR}/"
+        if shard_prefix in dirs:
+            dirs.remove(shard_prefix)
+            objects.extend(self._list_all(shard_prefix))
+        return objects, dirs
+
+    def _list_all(self, prefix):
+        """不使用分隔符递归列举前缀下的全部对象"""
+        return list(_CountingObjectIterator(self, self.bucket, prefix=prefix, max_keys=1000))
+
+    def _count_request(self):
+        with self._lock:
+            self.list_requests += 1
+
+
+class _CountingObjectIterator(oss2.ObjectIterator):
+    """统计 list_objects 调用次数的迭代器"""
+
+    def __init__(self, inventory, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.inventory = inventory
+
+    def _fetch(self):
+        self.inventory._count_request()
+        return super()._fetch()
+
+
+def load_inventory(bucket, prefix='tourist_data/', cache_path=INVENTORY_CACHE_PATH):
+    """只读取本地缓存的清单（不发起列举请求），没有缓存时返回 None"""
+    inventory = OSSInventory(bucket, prefix=prefix, cache_path=cache_path)
+    return inventory if inventory.load() else None
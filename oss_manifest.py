@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""分区清单 - 每个月份分区下每个写入者一个 _manifest/<写入者ID>.json，记录其写入的对象的大小、ETag、记录数、首末时间与景点CODE，读取端合并"""
+
+import os
+import re
+import json
+from datetime import datetime
+
+import oss2
+
+from oss_writer import WRITER_ID
+
+# 每个写入者一个清单对象：tourist_data/YYYY/MM/_manifest/<写入者ID>.json，读取端合并
+MANIFEST_DIR = '_manifest'
+# 改为按写入者分开之前的单个清单文件，重建清单时删除
+LEGACY_MANIFEST_NAME = '_manifest.json'
+MANIFEST_VERSION = 1
+# 写入后校验失败（同一写入者ID的多个实例同时写入）时的最大重试次数
+MANIFEST_RETRIES = int(os.getenv('OSS_MANIFEST_RETRIES', '3'))
+
+_PARTITION_RE = re.compile(r'^(.*?\d{4}/\d{2}/)')
+
+
+def partition_prefix(key):
+    """'tourist_data/2025/11/_shards/w/07.jsonl' -> 'tourist_data/2025/11/'，不在月份分区中时返回 None"""
+    match = _PARTITION_RE.match(key)
+    return match.group(1) if match else None
+
+
+def manifest_prefix(partition):
+    return f"{partition}{MANIFEST_DIR}/"
+
+
+def manifest_key(partition, writer_id=WRITER_ID):
+    return f"{manifest_prefix(partition)}{writer_id}.json"
+
+
+def new_manifest(complete=False):
+    """
+    complete: 清单是否覆盖分区内的全部对象。写入者新建的清单只在列举分区确认其中没有其他对象时视为完整，
+    否则需要迁移工具 --rebuild-manifest 列举重建；读取端只在至少一个写入者的清单完整时信任合并结果
+    """
+    return {'version': MANIFEST_VERSION, 'complete': complete, 'updated_at': None, 'objects': {}}
+
+
+def _read_object(bucket, key):
+    """读取单个清单对象，不存在或无法解析时返回 None"""
+    try:
+        content = bucket.get_object(key).read()
+    except oss2.exceptions.NoSuchKey:
+        return None
+    try:
+        manifest = json.loads(content)
+    except ValueError:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def read_writer_manifest(bucket, partition, writer_id=WRITER_ID):
+    return _read_object(bucket, manifest_key(partition, writer_id))
+
+
+def read_manifest(bucket, partition):
+    """
+    读取并合并分区内所有写入者的清单（一次列举 + 每个写入者一次 GET），没有清单时返回 None
+
+    同一对象出现在多个清单中时取大小最大（最新）的条目；任一清单完整（分区的第一批写入或重建）
+    即视为完整——之后的写入者都会把自己写入的对象记入各自的清单
+    """
+    merged = None
+    for obj in oss2.ObjectIterator(bucket, prefix=manifest_prefix(partition), max_keys=1000):
+        if not obj.key.endswith('.json'):
+            continue
+        manifest = _read_object(bucket, obj.key)
+        if manifest is None:
+            continue
+        if merged is None:
+            merged = new_manifest()
+        merged['complete'] = merged['complete'] or bool(manifest.get('complete'))
+        merged['updated_at'] = max(filter(None, (merged['updated_at'], manifest.get('updated_at'))), default=None)
+        objects = merged['objects']
+        for key, entry in manifest.get('objects', {}).items():
+            if key not in objects or entry['size'] > objects[key]['size']:
+                objects[key] = entry
+    return merged
+
+
+def partition_is_new(bucket, partition, keys):
+    """
+    列举分区（一次或多次 LIST），除 keys 与清单之外没有其他对象时返回 True
+
+    本次写入的对象都从 0 开始并不能说明分区是新的：分片写入在月中开启，或迁移工具向已有数据的分区
+    写入新文件时，分区中已有未记入任何清单的对象
+    """
+    keys = set(keys)
+    skip = manifest_prefix(partition)
+    legacy = f"{partition}{LEGACY_MANIFEST_NAME}"
+    for obj in oss2.ObjectIterator(bucket, prefix=partition, max_keys=1000):
+        if obj.key not in keys and not obj.key.startswith(skip) and obj.key != legacy:
+            return False
+    return True
+
+
+def apply_update(manifest, key, update):
+    """
+    把一次写入合并进清单条目 {size, etag, records, first, last, code, name}
+
+    追加写入时，只有清单中的大小正好等于本次追加的起始位置，记录数才能累加；
+    否则（中间有未记入清单的写入）记录数记为 None，由重建清单补全
+    """
+    objects = manifest['objects']
+    entry = objects.get(key)
+    if entry is not None and entry['size'] > update['size']:
+        # 清单中已经是更新的状态（其他写入者之后又追加过并写入了清单）
+        return
+    if update['replace'] or update['start'] == 0:
+        records, first = update['records'], update['first']
+    elif entry is not None and entry['size'] == update['start'] and entry.get('records') is not None:
+        records, first = entry['records'] + update['records'], entry.get('first') or update['first']
+    else:
+        records, first = None, entry.get('first') if entry else None
+    previous = entry or {}
+    objects[key] = {
+        'size': update['size'],
+        'etag': update['etag'],
+        'records': records,
+        'first': first,
+        'last': update['last'] or previous.get('last'),
+        'code': update['code'] or previous.get('code'),
+        'name': update['name'] or previous.get('name'),
+    }
+
+
+class ManifestWriter:
+    """
+    写入端的清单维护
+
+    record() 在每次追加成功后记录对象的新状态，flush() 按分区合并进本写入者自己的清单
+    _manifest/<写入者ID>.json。不同写入者各写各的清单对象，互相不会覆盖（OSS 没有条件写入，
+    共用一个清单时，校验之后的覆盖无法发现）；同一写入者ID的多个实例同时写入时，
+    写入后再次读取校验本次的条目都在，否则重新合并，最多重试 retries 次。
+    清单写入失败不影响已写入的数据，未写入的更新保留到下一次 flush()
+    """
+
+    def __init__(self, bucket, writer_id=None, retries=MANIFEST_RETRIES):
+        self.bucket = bucket
+        self.writer_id = writer_id or WRITER_ID
+        self.retries = retries
+        self.pending = {}  # {分区: {key: 更新}}
+        self.conflicts = 0
+
+    def key(self, partition):
+        return manifest_key(partition, self.writer_id)
+
+    def record(self, key, start, size, etag, records, first=None, last=None, code=None, name=None):
+        """记录一次追加：start 为追加的起始位置，size 为追加后的对象大小"""
+        self._record(key, dict(start=start, size=size, etag=etag, records=records, first=first, last=last,
+                               code=code, name=name, replace=False))
+
+    def replace(self, key, size, etag, records, first=None, last=None, code=None, name=None):
+        """以完整统计替换条目（重建清单时使用）"""
+        self._record(key, dict(start=0, size=size, etag=etag, records=records, first=first, last=last,
+                               code=code, name=name, replace=True))
+
+    def _record(self, key, update):
+        partition = partition_prefix(key)
+        if partition is None:
+            return
+        updates = self.pending.setdefault(partition, {})
+        previous = updates.get(key)
+        if previous is not None and not update['replace'] and previous['size'] == update['start']:
+            # 同一次运行中对同一对象的连续追加合并为一次更新
+            update['start'] = previous['start']
+            update['records'] += previous['records']
+            update['first'] = previous['first'] or update['first']
+            update['replace'] = previous['replace']
+        updates[key] = update
+
+    def flush(self, complete=None):
+        """写入所有有更新的分区清单，返回成功写入的分区数；complete 非 None 时覆盖本写入者清单的完整标记"""
+        written = 0
+        for partition in sorted(self.pending):
+            updates = self.pending[partition]
+            try:
+                if self._flush_partition(partition, updates, complete):
+                    del self.pending[partition]
+                    written += 1
+                else:
+                    print(f"分区清单多次被同一写入者ID的其他实例覆盖，稍后重试: {self.key(partition)}")
+            except oss2.exceptions.OssError as e:
+                print(f"分区清单写入失败（数据已写入）: {self.key(partition)} - {e}")
+        return written
+
+    def _flush_partition(self, partition, updates, complete):
+        key = self.key(partition)
+        for _ in range(self.retries + 1):
+            # 其他写入者清单中的条目作为起点，追加到其他写入者创建的对象时记录数仍可累加
+            merged = read_manifest(self.bucket, partition)
+            manifest = read_writer_manifest(self.bucket, partition, self.writer_id)
+            if manifest is None:
+                manifest = new_manifest(merged is None and all(update['start'] == 0 for update in updates.values())
+                                        and partition_is_new(self.bucket, partition, updates))
+            if merged is not None:
+                for object_key in updates:
+                    if object_key in merged['objects'] and object_key not in manifest['objects']:
+                        manifest['objects'][object_key] = dict(merged['objects'][object_key])
+            for object_key, update in updates.items():
+                apply_update(manifest, object_key, update)
+            if complete is not None:
+                manifest['complete'] = complete
+            manifest['updated_at'] = datetime.now().isoformat()
+            self.bucket.put_object(key, json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+            # 校验：读取与写入之间同一写入者ID的其他实例可能已覆盖清单
+            check = read_writer_manifest(self.bucket, partition, self.writer_id)
+            if check is not None and all(object_key in check['objects']
+                                         and check['objects'][object_key]['size'] >= update['size']
+                                         for object_key, update in updates.items()):
+                return True
+            self.conflicts += 1
+        return False
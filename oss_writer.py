@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""OSS追加写入 - 记录追加位置，位置冲突时按服务端返回的位置重试，支持按写入者分片"""
+
+import os
+import re
+import socket
+
+import oss2
+
+# single: 所有写入者追加到同一文件；sharded: 每个写入者追加到自己的分片文件
+WRITE_MODE = os.getenv('OSS_WRITE_MODE', 'single')
+# 分片目录名，位于月份分区下：tourist_data/YYYY/MM/_shards/<写入者ID>/<DD|景点名>.jsonl
+SHARD_DIR = '_shards'
+# 位置冲突时的最大重试次数
+APPEND_RETRIES = int(os.getenv('OSS_APPEND_RETRIES', '5'))
+# 时间索引：与数据文件同名的 .idx 文件，每行 "timestamp\toffset\tlength"
+INDEX_SUFFIX = '.idx'
+
+
+def _sanitize(value):
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', value).strip('-')[:48]
+
+
+def default_writer_id():
+    """
+    稳定的默认写入者ID：函数计算为函数名，GitHub Actions 为工作流名，其他环境为主机名
+
+    不能含进程号或随机数：否则每次冷启动 / 每次 Actions 运行都会产生一组新的分片，
+    分片数无限增长，读取端每次都要列举并合并。同一ID的多个实例同时写入时，
+    与 single 模式一样按服务端返回的位置重试，不会丢失数据
+    """
+    if os.getenv('FC_FUNCTION_NAME'):
+        return f"fc-{_sanitize(os.getenv('FC_FUNCTION_NAME'))}"
+    if os.getenv('GITHUB_ACTIONS') == 'true':
+        return f"gha-{_sanitize(os.getenv('GITHUB_WORKFLOW', '')) or 'workflow'}"
+    return _sanitize(socket.gethostname()) or 'host'
+
+
+WRITER_ID = _sanitize(os.getenv('OSS_WRITER_ID', '')) or default_writer_id()
+
+
+def shard_path(path, writer_id):
+    """'tourist_data/2025/11/07.jsonl' -> 'tourist_data/2025/11/_shards/<writer_id>/07.jsonl'"""
+    directory, file_name = path.rsplit('/', 1)
+    return f"{directory}/{SHARD_DIR}/{writer_id}/{file_name}"
+
+
+def logical_path(key):
+    """分片文件对应的逻辑路径，不是分片文件时返回 None"""
+    parts = key.rsplit('/', 3)
+    if len(parts) == 4 and parts[1] == SHARD_DIR:
+        return f"{parts[0]}/{parts[3]}"
+    return None
+
+
+def index_path(key):
+    """数据文件对应的时间索引文件：'.../07.jsonl' -> '.../07.idx'"""
+    return key.rsplit('.', 1)[0] + INDEX_SUFFIX
+
+
+def parse_index(content):
+    """解析时间索引，返回按偏移排序的 [(timestamp, offset, length)]，跳过不完整的行"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    entries = []
+    for line in content.split('\n'):
+        parts = line.split('\t')
+        if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+            entries.append((parts[0], int(parts[1]), int(parts[2])))
+    entries.sort(key=lambda entry: entry[1])
+    return entries
+
+
+class AppendWriter:
+    """
+    追加写入器
+
+    - 在内存中记录每个对象的下一个追加位置，已知位置时不再发送 HEAD 请求
+    - 位置未知时先按 0 追加；位置不一致（对象已存在或其他写入者已追加）时，
+      使用服务端返回的 next_position 重试，不会丢弃数据
+    - sharded 模式下写入 shard_path(path, writer_id)，不同写入者之间无需协调
+    - 给出 manifest（oss_manifest.ManifestWriter）时，每次追加成功后记录对象的大小、ETag、记录数、
+      首末时间与景点CODE，由调用方在写入结束后 manifest.flush()
+    """
+
+    def __init__(self, bucket, mode=None, writer_id=None, retries=APPEND_RETRIES, manifest=None):
+        self.bucket = bucket
+        self.mode = mode or WRITE_MODE
+        if self.mode not in ('single', 'sharded'):
+            raise ValueError(f"未知的写入模式: {self.mode}")
+        self.writer_id = writer_id or WRITER_ID
+        self.retries = retries
+        self.manifest = manifest
+        self.positions = {}
+        self.conflicts = 0
+
+    def target(self, path):
+        """逻辑路径实际写入的对象"""
+        return shard_path(path, self.writer_id) if self.mode == 'sharded' else path
+
+    def append(self, path, content, first=None, last=None, code=None, name=None):
+        """
+        追加内容到 path（或其分片），返回 (实际写入的key, AppendObjectResult)
+
+        first / last（本次记录的首末时间）、code / name（景点）只用于分区清单
+        """
+        key = self.target(path)
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        meta = dict(records=data.count(b'\n'), first=first, last=last or first, code=code, name=name)
+        return key, self._append_key(key, data, meta)
+
+    def append_indexed(self, path, lines, code=None, name=None):
+        """
+        追加多行记录并同步追加时间索引
+
+        lines: [(timestamp, 一行JSON文本)]；先写数据再写索引，
+        索引写入失败只会让读取端对未索引的尾部退回到读取原文件，不会丢失数据
+        """
+        key = self.target(path)
+        data = [line.encode('utf-8') for _, line in lines]
+        timestamps = [timestamp for timestamp, _ in lines if timestamp]
+        meta = dict(records=len(lines), first=min(timestamps, default=None), last=max(timestamps, default=None),
+                    code=code, name=name)
+        result = self._append_key(key, b''.join(data), meta)
+
+        offset = result.next_position - sum(len(d) for d in data)
+        index_lines = []
+        for (timestamp, _), line_data in zip(lines, data):
+            index_lines.append(f"{timestamp}\t{offset}\t{len(line_data)}\n")
+            offset += len(line_data)
+        try:
+            self._append_key(index_path(key), ''.join(index_lines).encode('utf-8'), meta)
+        except oss2.exceptions.OssError as e:
+            print(f"时间索引写入失败（数据已写入）: {index_path(key)} - {e}")
+        return key, result
+
+    def _append_key(self, key, data, meta=None):
+        for attempt in range(self.retries + 1):
+            position = self.positions.get(key, 0)
+            try:
+                result = self.bucket.append_object(key, position, data)
+            except oss2.exceptions.PositionNotEqualToLength as e:
+                self.conflicts += 1
+                self.positions[key] = e.next_position
+                if attempt == self.retries:
+                    raise
+                continue
+            self.positions[key] = result.next_position
+            if self.manifest is not None and meta is not None:
+                self.manifest.record(key, position, result.next_position, result.etag, **meta)
+            return result
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""景点目录 - 以稳定的 CODE 为键，为景点分配连续整数ID，并记录更名历史"""
+
+import os
+import sys
+import json
+
+
+def safe_name(name):
+    """景点名中的路径分隔符替换为下划线，作为OSS文件名"""
+    return name.replace('/', '_').replace('\\', '_')
+
+
+class SpotRecord:
+    """景点的静态属性（每个景点一条，事件中只保存其整数ID）"""
+
+    __slots__ = ('id', 'code', 'name', 'safe_name', 'grade', 'district', 'dname', 'max_num', 'aliases')
+
+    def __init__(self, spot_id, code, name):
+        self.id = spot_id
+        self.code = code
+        self.name = name
+        self.safe_name = safe_name(name)
+        self.grade = None
+        self.district = None
+        self.dname = None
+        self.max_num = 0
+        # 曾用名（按出现顺序），读取历史文件时需要一并读取
+        self.aliases = ()
+
+    def names(self):
+        """当前名称及所有曾用名"""
+        return (self.name,) + self.aliases
+
+    def to_dict(self):
+        return {
+            'code': self.code, 'name': self.name, 'grade': self.grade, 'district': self.district,
+            'dname': self.dname, 'max_num': self.max_num, 'aliases': list(self.aliases)
+        }
+
+
+class SpotCatalog:
+    """
+    景点目录
+
+    - intern(row) 返回景点的整数ID（按首次出现顺序从0开始连续分配）
+    - 同一 CODE 出现新的 NAME 时视为更名：更新当前名称，旧名称记入 aliases
+    - 没有 CODE 的数据以名称作为键
+    """
+
+    def __init__(self):
+        self.records = []
+        self._by_code = {}
+        self._by_name = {}
+        self.renames = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, spot_id):
+        return self.records[spot_id]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def intern(self, row):
+        """登记一条景点数据（API返回的行），返回其整数ID"""
+        name = row.get('NAME') or '未知景点'
+        code = row.get('CODE') or f"NAME:{name}"
+
+        spot_id = self._by_code.get(code)
+        if spot_id is None:
+            spot_id = self._add(code, name)
+        else:
+            record = self.records[spot_id]
+            if record.name != name:
+                self._rename(record, name)
+
+        record = self.records[spot_id]
+        record.grade = row.get('GRADE', record.grade)
+        record.district = row.get('DISTRICT', record.district)
+        record.dname = row.get('DNAME', record.dname)
+        try:
+            record.max_num = int(row.get('MAX_NUM', record.max_num) or 0)
+        except (TypeError, ValueError):
+            pass
+        return spot_id
+
+    def lookup_code(self, code):
+        return self._by_code.get(code)
+
+    def lookup_name(self, name):
+        """按当前名称或曾用名查找ID"""
+        return self._by_name.get(name)
+
+    def _add(self, code, name):
+        name = sys.intern(name)
+        spot_id = len(self.records)
+        self.records.append(SpotRecord(spot_id, sys.intern(code), name))
+        self._by_code[self.records[spot_id].code] = spot_id
+        self._by_name.setdefault(name, spot_id)
+        return spot_id
+
+    def _rename(self, record, new_name):
+        new_name = sys.intern(new_name)
+        old_name = record.name
+        if new_name in record.aliases:
+            record.aliases = tuple(a for a in record.aliases if a != new_name)
+        record.aliases = record.aliases + (old_name,)
+        record.name = new_name
+        record.safe_name = safe_name(new_name)
+        self._by_name[new_name] = record.id
+        self.renames.append((record.code, old_name, new_name))
+
+    # ---------- 持久化 ----------
+
+    def to_dict(self):
+        return {'spots': [record.to_dict() for record in self.records]}
+
+    @classmethod
+    def from_dict(cls, data):
+        catalog = cls()
+        for item in data.get('spots', []):
+            spot_id = catalog._add(item['code'], item['aliases'][0] if item.get('aliases') else item['name'])
+            record = catalog.records[spot_id]
+            for name in item.get('aliases', [])[1:] + [item['name']]:
+                if name != record.name:
+                    catalog._rename(record, name)
+            record.grade = item.get('grade')
+            record.district = item.get('district')
+            record.dname = item.get('dname')
+            record.max_num = item.get('max_num', 0)
+        catalog.renames = []
+        return catalog
+
+    @classmethod
+    def load(cls, path):
+        """读取持久化的目录，文件不存在或损坏时返回空目录"""
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return cls.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                pass
+        return cls()
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
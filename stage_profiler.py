@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+分阶段性能剖析 - 按 fetch / decode / parse / aggregate / serialize / write 等阶段统计耗时、内存分配与热点函数
+
+    # 对比两次剖析结果
+    python stage_profiler.py .cache/profile/old/profile.json .cache/profile/new/profile.json
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from local_cache import CACHE_DIR
+
+PROFILE_DIR = os.path.join(CACHE_DIR, 'profile')
+# 采样线程的采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 报告中每个阶段列出的热点函数个数
+TOP_FUNCTIONS = 15
+
+_NULL_STAGE = nullcontext()
+
+
+class _StageStats:
+    __slots__ = ('calls', 'wall', 'cpu', 'alloc', 'peak', 'profile', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.alloc = 0
+        self.peak = 0
+        self.profile = cProfile.Profile()
+        self.samples = Counter()
+
+
+class StageProfiler:
+    """
+    阶段剖析器，未启用时 stage() 直接返回空上下文，几乎没有开销
+
+    每个阶段：
+    - 墙钟时间、CPU 时间（进程级）、tracemalloc 统计的净分配与峰值
+    - cProfile 确定性剖析，报告中列出按自身耗时排序的热点函数
+    - 采样线程定期抓取进入该阶段的线程的调用栈，写出 <阶段>.folded（flamegraph.pl / speedscope 可直接读取）
+
+    阶段可以嵌套，内层阶段运行期间外层阶段的 cProfile 暂停、采样归入内层阶段
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.out_dir = None
+        self.label = None
+        self.stages = {}
+        self._stack = {}  # {线程ID: [(阶段名, 统计), ...]}
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._started_at = None
+        self._started_tracemalloc = False
+
+    def enable(self, out_dir, label=None, sample_interval=SAMPLE_INTERVAL):
+        self.enabled = True
+        self.out_dir = out_dir
+        self.label = label
+        self.stages = {}
+        self._started_at = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, args=(sample_interval,), daemon=True)
+        self._sampler.start()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = _StageStats()
+            stack = self._stack.setdefault(threading.get_ident(), [])
+            outer = stack[-1] if stack else None
+            entry = [stats, False, 0]  # [统计, cProfile 是否生效, 进行中观测到的内存峰值]
+            # reset_peak() 是进程级的，会清掉进行中的其他阶段（外层阶段、其他线程的阶段）的峰值，先记入它们
+            self._fold_peak()
+            stack.append(entry)
+            tracemalloc.reset_peak()
+            mem_before = tracemalloc.get_traced_memory()[0]
+
+        # 同一线程同一时刻只能有一个 cProfile 生效
+        if outer is not None and outer[1]:
+            outer[0].profile.disable()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        entry[1] = _enable_profile(stats.profile)
+        try:
+            yield
+        finally:
+            if entry[1]:
+                stats.profile.disable()
+            stats.wall += time.perf_counter() - wall_before
+            stats.cpu += time.process_time() - cpu_before
+            with self._lock:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, entry[2])
+                stack.pop()
+            stats.alloc += current - mem_before
+            stats.peak = max(stats.peak, peak - mem_before)
+            stats.calls += 1
+            if outer is not None and outer[1]:
+                outer[1] = _enable_profile(outer[0].profile)
+
+    def _fold_peak(self):
+        """把当前的内存峰值记入所有进行中的阶段（调用方持有 self._lock）"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for stack in self._stack.values():
+            for entry in stack:
+                entry[2] = max(entry[2], peak)
+
+    def _sample_loop(self, interval):
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            with self._lock:
+                active = [(thread_id, stack[-1][0]) for thread_id, stack in self._stack.items() if stack]
+            for thread_id, stats in active:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stats.samples[';'.join(reversed(names))] += 1
+
+    # ---------- 报告 ----------
+
+    def report(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            stages[name] = {
+                'calls': stats.calls,
+                'wall_s': round(stats.wall, 4),
+                'cpu_s': round(stats.cpu, 4),
+                'alloc_kb': round(stats.alloc / 1024, 1),
+                'peak_kb': round(stats.peak / 1024, 1),
+                'samples': sum(stats.samples.values()),
+                'folded': f"{name}.folded",
+                'top_functions': _top_functions(stats.profile),
+            }
+        return {
+            'label': self.label,
+            'created_at': datetime.now().isoformat(),
+            'total_wall_s': round(time.perf_counter() - self._started_at, 4) if self._started_at else None,
+            'stages': stages,
+        }
+
+    def write(self):
+        """写出 profile.json 与每个阶段的 .folded 文件，返回 (profile.json 路径, 报告)"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        report = self.report()
+        for name, stats in self.stages.items():
+            with open(os.path.join(self.out_dir, f"{name}.folded"), 'w', encoding='utf-8') as f:
+                for stack, count in stats.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        path = os.path.join(self.out_dir, 'profile.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path, report
+
+
+def _enable_profile(profile):
+    try:
+        profile.enable()
+        return True
+    except ValueError:
+        # Python 3.12+ 全进程同时只能有一个 cProfile（如其他线程中的阶段），此时只统计时间与内存
+        return False
+
+
+def _top_functions(profile, limit=TOP_FUNCTIONS):
+    try:
+        stats = pstats.Stats(profile)
+    except TypeError:
+        # 该阶段没有采集到任何调用
+        return []
+    rows = []
+    for (filename, line, func), (_, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            'function': f"{func} ({os.path.basename(filename)}:{line})",
+            'calls': nc,
+            'tottime_s': round(tt, 4),
+            'cumtime_s': round(ct, 4),
+        })
+    rows.sort(key=lambda row: row['tottime_s'], reverse=True)
+    return rows[:limit]
+
+
+# 进程内共享的剖析器，各模块通过 stage() 标记阶段
+PROFILER = StageProfiler()
+
+
+def stage(name):
+    return PROFILER.stage(name)
+
+
+def start_profiling(label, out_dir=None):
+    """启用剖析，out_dir 默认为 .cache/profile/<label>-<时间>"""
+    out_dir = out_dir or os.path.join(PROFILE_DIR, f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    PROFILER.enable(out_dir, label=label)
+    return out_dir
+
+
+def stop_profiling():
+    """停止剖析并写出报告，返回 (profile.json 路径, 报告)"""
+    PROFILER.disable()
+    return PROFILER.write()
+
+
+def format_report(report):
+    lines = [f"{'阶段':<12}{'次数':>8}{'耗时(s)':>10}{'CPU(s)':>10}{'净分配(KB)':>12}{'峰值(KB)':>12}  最热函数"]
+    for name, s in report['stages'].items():
+        hottest = s['top_functions'][0]['function'] if s['top_functions'] else '-'
+        lines.append(f"{name:<12}{s['calls']:>8}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}"
+                     f"{s['alloc_kb']:>12.1f}{s['peak_kb']:>12.1f}  {hottest}")
+    return '\n'.join(lines)
+
+
+def compare_reports(before, after):
+    """逐阶段对比两份报告的耗时、CPU 与内存"""
+    lines = [f"{'阶段':<12}{'耗时(s)':>28}{'CPU(s)':>28}{'峰值(KB)':>30}"]
+    for name in list(after['stages']) + [n for n in before['stages'] if n not in after['stages']]:
+        a = before['stages'].get(name, {})
+        b = after['stages'].get(name, {})
+        cells = []
+        for key, width in (('wall_s', 28), ('cpu_s', 28), ('peak_kb', 30)):
+            old, new = a.get(key), b.get(key)
+            if old is None or new is None:
+                cells.append(f"{'-' if new is None else new:>{width}}")
+            else:
+                change = f"{(new - old) / old * 100:+.0f}%" if old else '-'
+                cells.append(f"{f'{old}→{new} ({change})':>{width}}")
+        lines.append(f"{name:<12}{''.join(cells)}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两份 profile.json')
+    parser.add_argument('before', help='基准 profile.json')
+    parser.add_argument('after', help='对比的 profile.json')
+    args = parser.parse_args()
+
+    with open(args.before, 'r', encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+    print(compare_reports(before, after))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,16 @@
 #   logger.info('initializing')
 
 import os
-import requests
 import json
 import oss2
 from datetime import datetime
+
+from spot_catalog import SpotCatalog
+from oss_writer import AppendWriter, INDEX_SUFFIX
+from oss_manifest import ManifestWriter
+from api_fetcher import shared_fetcher
+from crawl_sources import DEFAULT_SOURCE, register_source, get_source, all_sources, crawl_all
+from alert_engine import shared_engine
 import logging
 
 # 配置
@@ -18,49 +24,68 @@ OSS_ACCESS_KEY_ID = os.getenv('OSS_ACCESS_KEY_ID')
 OSS_ACCESS_KEY_SECRET = os.getenv('OSS_ACCESS_KEY_SECRET')
 OSS_ENDPOINT = os.getenv('OSS_ENDPOINT', 'oss-cn-shanghai.aliyuncs.com')
 OSS_BUCKET_NAME = os.getenv('OSS_BUCKET_NAME', 'shanghai-tourist-traffic')
-API_URL = 'https://tourist.whlyj.sh.gov.cn/api/statistics/getViewTourist'
+API_URL = os.getenv('TOURIST_API_URL', 'https://tourist.whlyj.sh.gov.cn/api/statistics/getViewTourist')
+
+# 默认数据源写入 tourist_data/；其他城市/区的接口见 crawl_sources.py（TOURIST_SOURCES_FILE）
+register_source(DEFAULT_SOURCE, API_URL, replace=False)
 
 class TouristCrawler:
-    def __init__(self):
-        if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET_NAME]):
-            raise ValueError("缺少必要的OSS配置项")
-        
-        auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
-        self.bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET_NAME)
+    def __init__(self, bucket=None, source=None):
+        if bucket is None:
+            if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET_NAME]):
+                raise ValueError("缺少必要的OSS配置项")
+            
+            auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
+            bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET_NAME)
+        self.bucket = bucket
+        # 数据源：请求地址与写入前缀（默认数据源为 tourist_data/，其他数据源为 tourist_data/<名称>/）
+        self.source = source or get_source(DEFAULT_SOURCE)
+        self.prefix = self.source.prefix
+        # 景点目录：按 CODE 复用景点的文件名等静态信息，并记录更名
+        self.catalog = SpotCatalog()
+        # 分区清单：记录写入对象的大小、ETag、记录数等，读取端据此规划读取，无需列举
+        self.manifest = ManifestWriter(bucket)
+        # 追加写入：记录追加位置，并发写入时按服务端返回的位置重试（OSS_WRITE_MODE=sharded 时写入本实例的分片）
+        self.writer = AppendWriter(bucket, manifest=self.manifest)
+        # 客流告警：只对与上一次爬取相比有变化的景点评估规则（进程内保留上一次快照）
+        self.alerts = shared_engine(self.source.name)
         
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json, text/plain, */*',
             'Referer': 'https://tourist.whlyj.sh.gov.cn/'
         }
+        self.headers.update(self.source.headers)
+        # 复用连接的请求器：短超时、截止时间内重试、慢请求对冲、连续失败熔断
+        self.fetcher = shared_fetcher(self.source.url, self.headers, validate=lambda data: data.get('code') == 200,
+                                      limiter=self.source.limiter)
     
     def fetch_data(self):
         try:
-            response = requests.get(API_URL, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = self.fetcher.fetch()
             
             if data.get('code') != 200:
                 print(f"API返回错误: {data.get('msg', '未知错误')}")
                 return None
             
-            print(f"成功获取数据，共 {data.get('total', 0)} 条记录")
+            print(f"成功获取数据，共 {data.get('total', 0)} 条记录（{self.fetcher.summary()}）")
             return data
         except Exception as e:
             print(f"获取数据失败: {e}")
+            if self.fetcher.attempts:
+                print(f"  {self.fetcher.summary()}")
             return None
     
-    def append_to_oss(self, path, content):
+    def append_to_oss(self, path, content, timestamp=None, indexed=False, code=None, name=None):
+        """追加一行记录；indexed 时同步追加时间索引（同名 .idx 文件）"""
         try:
-            if self.bucket.object_exists(path):
-                head_result = self.bucket.head_object(path)
-                position = head_result.content_length
-                result = self.bucket.append_object(path, position, content.encode('utf-8'))
+            if indexed:
+                key, result = self.writer.append_indexed(path, [(timestamp, content)], code=code, name=name)
             else:
-                result = self.bucket.append_object(path, 0, content.encode('utf-8'))
+                key, result = self.writer.append(path, content, first=timestamp, code=code, name=name)
             
             if result.status == 200:
-                print(f"数据追加成功: {path}")
+                print(f"数据追加成功: {key}")
                 return True
             return False
         except Exception as e:
@@ -71,28 +96,43 @@ class TouristCrawler:
         now = datetime.now()
         
         # 按日期存储
-        daily_path = f"tourist_data/{now.strftime('%Y/%m/%d')}.jsonl"
+        daily_path = f"{self.prefix}{now.strftime('%Y/%m/%d')}.jsonl"
         daily_record = json.dumps({
             'timestamp': now.isoformat(),
             'data': data
         }, ensure_ascii=False) + '\n'
         
-        daily_success = self.append_to_oss(daily_path, daily_record)
+        daily_success = self.append_to_oss(daily_path, daily_record, timestamp=now.isoformat(), indexed=True)
         
         # 按景点存储
         spot_success = True
         if 'rows' in data:
+            renames = len(self.catalog.renames)
             for spot in data['rows']:
-                spot_name = spot.get('NAME', '未知景点')
-                safe_name = spot_name.replace('/', '_').replace('\\', '_')
-                spot_path = f"tourist_data/{now.strftime('%Y/%m/')}{safe_name}.jsonl"
+                record = self.catalog[self.catalog.intern(spot)]
+                spot_path = f"{self.prefix}{now.strftime('%Y/%m/')}{record.safe_name}.jsonl"
                 spot_record = json.dumps({
                     'timestamp': now.isoformat(),
                     'spot': spot
                 }, ensure_ascii=False) + '\n'
                 
-                if not self.append_to_oss(spot_path, spot_record):
+                if not self.append_to_oss(spot_path, spot_record, timestamp=now.isoformat(),
+                                          code=record.code, name=record.name):
                     spot_success = False
+            
+            for code, old_name, new_name in self.catalog.renames[renames:]:
+                print(f"景点更名: {old_name} -> {new_name} (CODE {code})")
+        
+        # 数据写入后更新分区清单；清单写入失败不影响本次结果
+        if self.manifest.flush():
+            print(f"分区清单已更新: {self.manifest.key(self.prefix + now.strftime('%Y/%m/'))}")
+        
+        # 数据与清单都写入后再评估告警，webhook 较慢时不拖延写入；告警评估失败不影响本次结果
+        if 'rows' in data:
+            try:
+                self.alerts.evaluate(data['rows'], now)
+            except Exception as e:
+                print(f"告警评估失败: {e}")
         
         return daily_success and spot_success
     
@@ -108,18 +148,44 @@ class TouristCrawler:
         if success:
             now = datetime.now()
             print("数据上传成功！")
-            print(f"- 按日期存储：tourist_data/{now.strftime('%Y/%m/%d')}.jsonl")
-            print(f"- 按景点存储：tourist_data/{now.strftime('%Y/%m/')}<景点名>.jsonl")
+            print(f"- 按日期存储：{self.prefix}{now.strftime('%Y/%m/%d')}.jsonl（时间索引 {now.strftime('%d')}{INDEX_SUFFIX}）")
+            print(f"- 按景点存储：{self.prefix}{now.strftime('%Y/%m/')}<景点名>.jsonl")
             print("- 使用追加写入，节省OSS费用")
+            if self.writer.mode == 'sharded':
+                print(f"- 分片写入：{self.prefix}{now.strftime('%Y/%m/')}_shards/{self.writer.writer_id}/")
         else:
             print("数据上传失败")
         
         return success
 
+def run_sources(sources, bucket=None):
+    """并发爬取多个数据源：各数据源的请求互不等待，取到数据后立即上传（共用同一个 Bucket）"""
+    crawlers = []
+    for source in sources:
+        crawler = TouristCrawler(bucket=bucket, source=source)
+        bucket = crawler.bucket
+        crawlers.append(crawler)
+
+    print(f"开始并发爬取 {len(crawlers)} 个数据源...")
+    start = datetime.now()
+    results = crawl_all(crawlers)
+    for result in results:
+        timing = f"请求 {result['fetch_s']:.2f}s" if result['fetch_s'] is not None else ''
+        if result['upload_s'] is not None:
+            timing += f"，上传 {result['upload_s']:.2f}s"
+        status = '成功' if result['success'] else f"失败（{result['error'] or '上传失败'}）"
+        print(f"- {result['source']}: {status} {timing}")
+    print(f"全部数据源完成，耗时 {(datetime.now() - start).total_seconds():.2f}s")
+    return all(result['success'] for result in results)
+
 def main():
     try:
-        crawler = TouristCrawler()
-        success = crawler.run()
+        sources = all_sources()
+        if len(sources) > 1:
+            success = run_sources(sources)
+        else:
+            crawler = TouristCrawler()
+            success = crawler.run()
         print("程序结束", success)
     except Exception as e:
         print(f"程序运行失败: {e}")
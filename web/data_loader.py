@@ -1,8 +1,28 @@
 import os
+import sys
 import json
+import argparse
+import hashlib
 import oss2
 from datetime import datetime, timedelta
 import logging
+import tracemalloc
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+# 共享模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oss_inventory import OSSInventory, load_inventory
+from local_cache import CACHE_DIR
+from spot_catalog import SpotCatalog, safe_name
+from oss_writer import index_path, parse_index
+from stage_profiler import PROFILER, stage, start_profiling, stop_profiling, format_report
+from traffic_cube import DayCube, capacity, encode_month, decode_month
+from quantile_sketch import SketchMonth
+from spot_matrix import SpotMatrix
+from spot_chunks import (index_logical, chunk_logical, split_weeks, week_months, daily_peaks,
+                         chunk_payload, chunk_entry, build_index, INDEX_VERSION)
+from json_codec import JSON_ENCODER, ENCODERS, encode, use_encoder, current_encoder
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,6 +36,20 @@ OSS_BUCKET_NAME = os.getenv('OSS_BUCKET_NAME', 'shanghai-tourist-traffic')
 # 本地存储路径
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 SPOTS_DIR = os.path.join(DATA_DIR, 'spots')
+CATALOG_PATH = os.path.join(CACHE_DIR, 'spot_catalog.json')
+BUILD_STATE_PATH = os.path.join(CACHE_DIR, 'build_state.json')
+MATRIX_DIR = os.path.join(CACHE_DIR, 'matrix')
+
+# 输出文件名中内容哈希的长度
+HASH_LENGTH = 10
+# 同一次构建中，分区列举结果在该秒数内复用
+PARTITION_MAX_AGE = 600
+# 优先读取写入端维护的分区清单 _manifest/（合并各写入者的清单），清单不完整或不存在时再列举
+USE_MANIFEST = os.getenv('OSS_USE_MANIFEST', '1') != '0'
+# 景点详情包含的月份数（当月及之前的月份），按周分块输出
+SPOT_DETAIL_MONTHS = 1
+# 景点详情去重排序与序列化的进程数（默认为 CPU 核数，1 表示在主进程中处理）
+SPOT_WORKERS = int(os.getenv('DATA_LOADER_WORKERS', '0')) or os.cpu_count() or 1
 
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
@@ -30,57 +64,503 @@ def get_bucket():
     auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
     return oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET_NAME)
 
-def fetch_overview_jsonl_from_oss(bucket, object_key):
-    """从OSS读取概览JSONL文件并返回解析后的景点列表（格式：data.rows）"""
+def ensure_partition(bucket, object_key, inventory=None):
+    """
+    确保 object_key 所在的月份分区已在清单中（优先读取分区清单，否则列举），返回清单；
+    不传 inventory 时新建一个只在本次调用中使用的清单
+    """
+    if inventory is None:
+        inventory = OSSInventory(bucket, cache_path=None)
+    partition = inventory.partition_of(object_key)
+    if partition is not None and inventory.contains(object_key) is None:
+        with stage('fetch'):
+            inventory.refresh_partition(partition, max_age=PARTITION_MAX_AGE, manifest=USE_MANIFEST)
+    return inventory
+
+def source_keys(bucket, object_key, inventory=None):
+    """
+    逻辑文件实际存在的对象：文件本身及各写入者的分片（_shards/<写入者ID>/）。
+    分片只能通过分区内容得知，所在分区未列举过时先列举（或读取分区清单）；不在月份分区中的路径发 HEAD 请求
+    """
+    inventory = ensure_partition(bucket, object_key, inventory)
+    keys = inventory.sources(object_key)
+    if keys is not None:
+        return keys
+    return [object_key] if bucket.object_exists(object_key) else []
+
+def read_jsonl_records(bucket, object_keys):
+    """依次读取多个JSONL对象，返回解析后的记录列表（跳过无法解析的行）"""
+    records = []
+    for object_key in object_keys:
+        with stage('fetch'):
+            content = bucket.get_object(object_key).read()
+        with stage('decode'):
+            for line in content.decode('utf-8').strip().split('\n'):
+                try:
+                    if line.strip():
+                        records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        return None
+
+def _window_bound(value, date):
+    """时间窗口边界：datetime 原样返回，'HH:MM' 视为 date 当天的时刻，None 表示不限"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(f"{date.strftime('%Y-%m-%d')} {value}", "%Y-%m-%d %H:%M")
+
+def load_time_index(bucket, object_key, inventory=None):
+    """读取数据文件的时间索引，没有索引时返回 None"""
+    key = index_path(object_key)
+    if inventory is not None and inventory.contains(key) is False:
+        return None
     try:
-        if not bucket.object_exists(object_key):
+        return parse_index(bucket.get_object(key).read())
+    except oss2.exceptions.NoSuchKey:
+        return None
+
+def _index_covers_file(entries):
+    """索引是否从文件开头起连续覆盖（中间缺失的行只能通过读取整个文件找回）"""
+    end = 0
+    for _, offset, length in entries:
+        if offset != end:
+            return False
+        end = offset + length
+    return True
+
+def _range_get(bucket, object_key, first, last):
+    """读取 [first, last] 字节（last 为 None 时读到文件末尾），起点超出文件长度时返回空"""
+    try:
+        result = bucket.get_object(object_key, byte_range=(first, last),
+                                   headers={'x-oss-range-behavior': 'standard'})
+    except oss2.exceptions.ServerError as e:
+        if e.status == 416:
+            return b''
+        raise
+    content = result.read()
+    if result.status == 200:
+        # 服务端忽略了 Range，返回了整个文件
+        content = content[first:] if last is None else content[first:last + 1]
+    return content
+
+def read_window(bucket, object_key, start=None, end=None, entries=None):
+    """
+    读取单个数据文件中 timestamp 位于 [start, end] 的记录
+
+    有连续的时间索引时只发一次 Range GET：窗口内的行，窗口延伸到最后一个索引项之后时
+    一直读到文件末尾（包括尚未写入索引的行）；否则读取整个文件
+    """
+    if entries and _index_covers_file(entries):
+        times = [_parse_timestamp(ts) for ts, _, _ in entries]
+        selected = [entry for entry, t in zip(entries, times)
+                    if t is not None and (start is None or t >= start) and (end is None or t <= end)]
+        last_time = max((t for t in times if t is not None), default=None)
+        open_tail = end is None or last_time is None or last_time < end
+        if selected:
+            first = selected[0][1]
+        elif open_tail:
+            first = entries[-1][1] + entries[-1][2]
+        else:
+            return []
+        last = None if open_tail else selected[-1][1] + selected[-1][2] - 1
+        content = _range_get(bucket, object_key, first, last)
+    else:
+        content = bucket.get_object(object_key).read()
+
+    records = []
+    for line in content.decode('utf-8').split('\n'):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        t = _parse_timestamp(record.get('timestamp'))
+        if t is not None and (start is None or t >= start) and (end is None or t <= end):
+            records.append(record)
+    return records
+
+def fetch_time_slice(bucket, date, start=None, end=None, inventory=None):
+    """
+    读取某天 [start, end] 时间段内每次爬取的完整数据（合并各分片），按 timestamp 排序
+
+    start / end 可以是 datetime 或 'HH:MM'，省略表示不限。
+    每个数据文件读取时间索引（KB级）与一次 Range GET，而不是下载整天的文件
+    """
+    object_key = f"tourist_data/{date.strftime('%Y/%m/%d')}.jsonl"
+    start, end = _window_bound(start, date), _window_bound(end, date)
+    inventory = ensure_partition(bucket, object_key, inventory)
+    records = []
+    for key in source_keys(bucket, object_key, inventory):
+        entries = load_time_index(bucket, key, inventory)
+        records.extend(read_window(bucket, key, start, end, entries))
+    records.sort(key=lambda record: record.get('timestamp', ''))
+    return records
+
+def fetch_latest_snapshot(bucket, date=None, inventory=None):
+    """某天（默认今天）最后一次爬取的完整数据记录，有时间索引时只读取文件末尾"""
+    date = date or datetime.now()
+    object_key = f"tourist_data/{date.strftime('%Y/%m/%d')}.jsonl"
+    inventory = ensure_partition(bucket, object_key, inventory)
+    latest = None
+    for key in source_keys(bucket, object_key, inventory):
+        entries = load_time_index(bucket, key, inventory)
+        last_time = max((t for t in (_parse_timestamp(ts) for ts, _, _ in entries or ()) if t), default=None)
+        for record in read_window(bucket, key, last_time, None, entries):
+            if latest is None or record.get('timestamp', '') > latest.get('timestamp', ''):
+                latest = record
+    return latest
+
+def source_signature(inventory, object_keys, *extra):
+    """源对象（含分片）ETag（及额外参数）的摘要，任一源对象变化时签名随之变化"""
+    parts = [str(x) for x in extra]
+    for key in sorted(object_keys):
+        for source in inventory.sources(key) or [key]:
+            entry = inventory.lookup(source)
+            parts.append(f"{source}={entry[1] if entry else '-'}")
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def store_content(data_dir, logical, content):
+    """按内容哈希写出文件，返回带哈希的文件名；同名文件已存在时内容必然相同，不再写入"""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(logical)
+    hashed = f"{base}.{digest}{ext}"
+
+    output_path = os.path.join(data_dir, hashed)
+    if not os.path.exists(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with stage('write'), open(output_path, 'wb') as f:
+            f.write(content)
+    return hashed
+
+class SiteBuild:
+    """
+    增量构建
+
+    - 输出文件名带内容哈希（如 spots/豫园.3f2a9c01de.json），可长期缓存
+    - data/manifest.json 记录 逻辑文件名 -> 带哈希的文件名，前端先读取它
+    - 构建状态记录每个输出对应的源对象签名，签名不变且文件仍在时直接复用，跳过下载与聚合
+    """
+
+    def __init__(self, data_dir=None, state_path=None, full=False):
+        self.data_dir = data_dir or DATA_DIR
+        self.full = full
+        self.manifest_path = os.path.join(self.data_dir, 'manifest.json')
+        self.state_path = state_path or BUILD_STATE_PATH
+        self.files = self._load_json(self.manifest_path).get('files', {})
+        self.signatures = self._load_json(self.state_path).get('signatures', {})
+        self.written = 0
+        self.reused = 0
+
+    def reuse(self, logical, signature):
+        """签名与上次构建一致且输出文件仍在时返回 True"""
+        hashed = self.files.get(logical)
+        if (not self.full and hashed and self.signatures.get(logical) == signature
+                and os.path.exists(os.path.join(self.data_dir, hashed))):
+            self.reused += 1
+            return True
+        return False
+
+    def write(self, logical, payload, signature, indent=2):
+        """按内容哈希写出 JSON，返回输出路径；内容未变时文件名也不变"""
+        with stage('serialize'):
+            content = encode(payload, indent)
+        return self.record(logical, store_content(self.data_dir, logical, content), signature)
+
+    def record(self, logical, hashed, signature):
+        """记录已由 store_content() 写出的文件（可能在其他进程中写出），返回输出路径"""
+        previous = self.files.get(logical)
+        if previous and previous != hashed:
+            try:
+                os.remove(os.path.join(self.data_dir, previous))
+            except OSError:
+                pass
+
+        self.files[logical] = hashed
+        self.signatures[logical] = signature
+        self.written += 1
+        return os.path.join(self.data_dir, hashed)
+
+    def discard(self, logical):
+        """删除不再输出的逻辑文件"""
+        hashed = self.files.pop(logical, None)
+        self.signatures.pop(logical, None)
+        if hashed:
+            try:
+                os.remove(os.path.join(self.data_dir, hashed))
+            except OSError:
+                pass
+
+    def read(self, logical):
+        with open(os.path.join(self.data_dir, self.files[logical]), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with stage('write'), open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generated_at": datetime.now().isoformat(),
+                "files": self.files
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump({"signatures": self.signatures}, f, ensure_ascii=False)
+
+    @staticmethod
+    def _load_json(path):
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+def fetch_overview_jsonl_from_oss(bucket, object_key, inventory=None):
+    """
+    从OSS读取概览JSONL文件并返回解析后的景点列表（格式：data.rows）
+
+    存在多个写入者的分片时合并读取，并按 (CODE, TIME) 去重：
+    保留首次出现的位置，内容取最后一次出现的记录
+    """
+    try:
+        keys = source_keys(bucket, object_key, inventory)
+        if not keys:
             logging.warning(f"文件不存在: {object_key}")
             return []
         
-        obj = bucket.get_object(object_key)
-        content = obj.read().decode('utf-8')
-        lines = content.strip().split('\n')
         spots = []
-        for line in lines:
-            try:
-                if line.strip():
-                    record = json.loads(line)
-                    # 概览数据结构：从 data.rows 中提取景点数据
-                    if 'data' in record and 'rows' in record['data']:
-                        spots.extend(record['data']['rows'])
-            except json.JSONDecodeError:
-                continue
-        return spots
+        for record in read_jsonl_records(bucket, keys):
+            # 概览数据结构：从 data.rows 中提取景点数据
+            if 'data' in record and 'rows' in record['data']:
+                spots.extend(record['data']['rows'])
+        if len(keys) == 1:
+            return spots
+        
+        unique_spots = {}
+        for spot in spots:
+            unique_spots[(spot.get('CODE') or spot.get('NAME'), spot.get('TIME'))] = spot
+        return list(unique_spots.values())
     except Exception as e:
         logging.error(f"读取概览文件失败 {object_key}: {e}")
         return []
 
-def fetch_spot_detail_jsonl_from_oss(bucket, object_key):
-    """从OSS读取景点详情JSONL文件并返回解析后的景点数据列表（格式：spot）"""
+def fetch_spot_detail_jsonl_from_oss(bucket, object_key, inventory=None):
+    """从OSS读取景点详情JSONL文件（合并各分片）并返回解析后的景点数据列表（格式：spot）"""
     try:
-        if not bucket.object_exists(object_key):
+        keys = source_keys(bucket, object_key, inventory)
+        if not keys:
             logging.warning(f"文件不存在: {object_key}")
             return []
         
-        obj = bucket.get_object(object_key)
-        content = obj.read().decode('utf-8')
-        lines = content.strip().split('\n')
-        spots = []
-        for line in lines:
-            try:
-                if line.strip():
-                    record = json.loads(line)
-                    # 景点详情数据结构：从 spot 中提取景点数据
-                    if 'spot' in record:
-                        spots.append(record['spot'])
-            except json.JSONDecodeError:
-                continue
-        return spots
+        # 景点详情数据结构：从 spot 中提取景点数据（调用方按 TIME 去重）
+        return [record['spot'] for record in read_jsonl_records(bucket, keys) if 'spot' in record]
     except Exception as e:
         logging.error(f"读取景点详情文件失败 {object_key}: {e}")
         return []
 
-def process_overview_data(bucket):
+def parse_day_events(daily_records, date, catalog):
+    """
+    把当天概览记录转换为事件 (相对当天0点的分钟数, 景点ID, 人数, 行号)，不再持有景点数据字典；
+    TIME 格式可能是 "YYYY-MM-DD HH:mm" 或 "HH:mm"，无法解析的记录跳过
+    """
+    day_start = datetime(date.year, date.month, date.day)
+    day_prefix = date.strftime('%Y-%m-%d')
+    events = []
+    minute_cache = {}  # TIME 字符串大量重复（数据未更新时），解析结果缓存
+    for row_idx, spot in enumerate(daily_records):
+        t_str = spot.get('TIME', '')
+        try:
+            minute = minute_cache.get(t_str)
+            if minute is None:
+                if len(t_str) > 10:
+                    t_obj = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
+                else:
+                    # 只有时间的情况，加上日期
+                    t_obj = datetime.strptime(f"{day_prefix} {t_str}", "%Y-%m-%d %H:%M")
+                minute = int((t_obj - day_start).total_seconds()) // 60
+                minute_cache[t_str] = minute
+            
+            num = int(spot.get('NUM', 0))
+            events.append((minute, catalog.intern(spot), num, row_idx))
+        except Exception:
+            continue
+    return events
+
+def load_cube_month(build, month):
+    """读取上次构建的 cube/YYYY-MM.json，返回 (days, signatures)；不存在或无法读取时返回空结果"""
+    logical = f"cube/{month}.json"
+    if logical not in build.files:
+        return {}, {}
+    try:
+        return decode_month(build.read(logical))
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        logging.warning(f"聚合立方体无法读取，将重新生成: {logical} - {e}")
+        return {}, {}
+
+def update_cube(build, day_cubes, signatures):
+    """把若干天的立方体合并进对应月份的 cube/YYYY-MM.json，其他日期保留上次的结果"""
+    months = {}
+    for cube in day_cubes:
+        months.setdefault(cube.date[:7], []).append(cube)
+    
+    for month, cubes in sorted(months.items()):
+        days, day_signatures = load_cube_month(build, month)
+        for cube in cubes:
+            with stage('aggregate'):
+                cells = cube.cells()
+            # 当天没有数据（文件缺失）时保留已有结果
+            if cells:
+                days[cube.date] = cells
+                day_signatures[cube.date] = signatures[cube.date]
+        if not days:
+            continue
+        month_signature = hashlib.sha1(json.dumps(day_signatures, sort_keys=True).encode('utf-8')).hexdigest()
+        output_path = build.write(f"cube/{month}.json", encode_month(month, days, day_signatures),
+                                  month_signature, indent=None)
+        logging.info(f"聚合立方体已保存至: {output_path}（{len(days)} 天）")
+
+def day_readings(events, daily_records):
+    """
+    当天各景点的读数 {景点ID: [(人数, 最大承载量), ...]}，按 (景点, TIME) 去重，前一天遗留的读数不计入；
+    最大承载量取自读数所在的行（景点扩容前后的读数按各自当时的承载量计算承载率）
+    """
+    readings = {}
+    seen = set()
+    for minute, spot_id, num, row_idx in events:
+        if 0 <= minute < 24 * 60 and (spot_id, minute) not in seen:
+            seen.add((spot_id, minute))
+            readings.setdefault(spot_id, []).append((num, capacity(daily_records[row_idx])))
+    return readings
+
+def load_sketch_month(build, month):
+    """读取上次构建的 sketch/YYYY-MM.json；不存在或无法读取时返回空的月份"""
+    logical = f"sketch/{month}.json"
+    if logical in build.files:
+        try:
+            return SketchMonth.from_dict(build.read(logical))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"分位数草图无法读取，将重新计入: {logical} - {e}")
+    return SketchMonth(month)
+
+def save_sketch_months(build, months):
+    for month in months:
+        signature = hashlib.sha1(json.dumps(month.days, sort_keys=True).encode('utf-8')).hexdigest()
+        output_path = build.write(f"sketch/{month.month}.json", month.to_dict(), signature, indent=None)
+        logging.info(f"分位数草图已保存至: {output_path}（{len(month.days)} 天）")
+
+def process_history(bucket, days, inventory=None, catalog=None, build=None):
+    """
+    补建最近 days 天的聚合立方体与分位数草图（process_overview_data 只更新最近5天）
+
+    - 源文件签名与立方体中记录的一致的日期不再聚合；草图已计入的日期不再计入
+    - 草图中已计入日期的源文件发生变化时，该月草图清空后重新计入整月
+    """
+    logging.info(f"开始补建最近 {days} 天的聚合立方体与分位数草图...")
+    
+    today = datetime.now()
+    if inventory is None:
+        inventory = OSSInventory(bucket, cache_path=None)
+    if build is None:
+        build = SiteBuild()
+    if catalog is None:
+        catalog = SpotCatalog()
+    dates = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    
+    def day_signature(date):
+        return source_signature(inventory, [f"tourist_data/{date.strftime('%Y/%m/%d')}.jsonl"])
+    
+    cube_signatures = {}
+    sketch_months = {}
+    window = {date.strftime('%Y-%m-%d'): date for date in dates}
+    wanted = dict(window)
+    with stage('fetch'):
+        for partition in sorted({date.strftime('%Y/%m/') for date in dates}):
+            inventory.refresh_partition(partition, max_age=PARTITION_MAX_AGE, manifest=USE_MANIFEST)
+    for month in sorted({date.strftime('%Y-%m') for date in dates}):
+        cube_signatures.update(load_cube_month(build, month)[1])
+        sketch = sketch_months[month] = load_sketch_month(build, month)
+        changed = [day for day, signature in sketch.days.items()
+                   if signature != day_signature(datetime.strptime(day, '%Y-%m-%d'))]
+        if changed or build.full:
+            if changed:
+                logging.info(f"{month} 已计入日期的源文件有变化（{', '.join(changed)}），重新计入整月草图")
+            sketch.reset()
+            first = datetime.strptime(month, '%Y-%m')
+            for n in range(31):
+                date = first + timedelta(days=n)
+                if date.strftime('%Y-%m') == month and date < today:
+                    wanted.setdefault(date.strftime('%Y-%m-%d'), date)
+    
+    day_cubes = []
+    signatures = {}
+    for day, date in sorted(wanted.items()):
+        signatures[day] = day_signature(date)
+        sketch = sketch_months[day[:7]]
+        # 当天尚未结束，不计入草图
+        need_sketch = day < today.strftime('%Y-%m-%d') and day not in sketch.days
+        need_cube = day in window and (build.full or cube_signatures.get(day) != signatures[day])
+        if not (need_sketch or need_cube):
+            continue
+        
+        object_key = f"tourist_data/{date.strftime('%Y/%m/%d')}.jsonl"
+        logging.info(f"正在获取: {object_key}")
+        daily_records = fetch_overview_jsonl_from_oss(bucket, object_key, inventory)
+        with stage('parse'):
+            events = parse_day_events(daily_records, date, catalog)
+        with stage('aggregate'):
+            if need_cube:
+                day_cube = DayCube(day)
+                for minute, spot_id, num, row_idx in events:
+                    day_cube.add(spot_id, minute, num, daily_records[row_idx])
+                day_cubes.append(day_cube)
+            if need_sketch and events:
+                sketch.add_day(day, signatures[day], day_readings(events, daily_records), catalog)
+    
+    update_cube(build, day_cubes, signatures)
+    save_sketch_months(build, [month for month in sketch_months.values() if month.days])
+    build.save()
+    logging.info(f"补建完毕（重新聚合 {len(day_cubes)} 天的立方体）")
+
+def update_matrix(bucket, days=5, inventory=None, path=None):
+    """
+    把新的爬取记录追加到本地矩阵缓存（景点 × 爬取时间，见 spot_matrix.py）
+
+    只读取最后计入时间之后的记录：有时间索引时每个文件只需一次 Range GET；
+    缓存为空时从最近 days 天开始
+    """
+    matrix = SpotMatrix(path or MATRIX_DIR)
+    today = datetime.now()
+    first_day = today - timedelta(days=days - 1)
+    if matrix.last_ingested is not None:
+        first_day = max(first_day, matrix.last_ingested)
+    start = matrix.last_ingested + timedelta(microseconds=1) if matrix.last_ingested else None
+    
+    date = datetime(first_day.year, first_day.month, first_day.day)
+    while date <= today:
+        if inventory is not None:
+            with stage('fetch'):
+                inventory.refresh_partition(date.strftime('%Y/%m/'), max_age=PARTITION_MAX_AGE, manifest=USE_MANIFEST)
+        records = fetch_time_slice(bucket, date, start, None, inventory)
+        with stage('aggregate'):
+            for record in records:
+                matrix.add_record(record)
+        date += timedelta(days=1)
+    
+    with stage('write'):
+        added = matrix.commit()
+    logging.info(f"矩阵缓存新增 {added} 次爬取（共 {matrix.rows} 次，{len(matrix.spots)} 个景点）: {matrix.path}")
+    return matrix
+
+def process_overview_data(bucket, inventory=None, catalog=None, build=None):
     """处理最近5天的概览数据（包含趋势、Top10、Treemap）"""
     logging.info("开始处理概览数据...")
     
@@ -96,8 +576,42 @@ def process_overview_data(bucket):
         time_buckets.append(current.strftime("%H:%M"))
         current += timedelta(minutes=30)
     
+    # 最近5天的源文件都没有变化时，直接复用上次的输出
+    if inventory is None:
+        inventory = OSSInventory(bucket, cache_path=None)
+    if build is None:
+        build = SiteBuild()
+    dates = [today - timedelta(days=i) for i in range(4, -1, -1)]
+    with stage('fetch'):
+        for partition in sorted({date.strftime('%Y/%m/') for date in dates}):
+            inventory.refresh_partition(partition, max_age=PARTITION_MAX_AGE, manifest=USE_MANIFEST)
+    day_keys = [f"tourist_data/{date.strftime('%Y/%m/%d')}.jsonl" for date in dates]
+    signature = source_signature(inventory, day_keys, today.strftime('%Y-%m-%d'))
+    # 已结束的日期计入各景点的分位数草图
+    sketch_months = {}
+    for date in dates[:-1]:
+        month = date.strftime('%Y-%m')
+        if month not in sketch_months:
+            sketch_months[month] = load_sketch_month(build, month)
+    history_ready = (all(f"cube/{date.strftime('%Y-%m')}.json" in build.files for date in dates)
+                     and all(date.strftime('%Y-%m-%d') in sketch_months[date.strftime('%Y-%m')].days
+                             for date in dates[:-1]))
+    if history_ready and build.reuse('overview.json', signature):
+        logging.info("概览数据源未变化，复用上次构建结果")
+        return build.read('overview.json')['all_spots']
+    
     trend_series = []
-    spot_stats = {} # {name: {max_num_5days: 0, district: "", latest_info: {}}}
+    if catalog is None:
+        catalog = SpotCatalog()
+    # 按景点ID索引的统计数组（景点数随数据增长）
+    max_peak_5days = []
+    sum_peak_5days = []
+    spot_district = []
+    latest_info = []
+    seen_order = []  # 景点首次被统计的顺序
+    bucket_minutes = [int(t[:2]) * 60 + int(t[3:]) for t in time_buckets]
+    day_cubes = []
+    updated_sketches = set()
     
     # 获取最近5天的数据
     for i in range(4, -1, -1):
@@ -105,196 +619,393 @@ def process_overview_data(bucket):
         date_str = date.strftime('%Y/%m/%d')
         short_date = date.strftime('%m-%d')
         object_key = f"tourist_data/{date_str}.jsonl"
+        day_prefix = date.strftime('%Y-%m-%d')
         
         logging.info(f"正在获取: {object_key}")
-        daily_records = fetch_overview_jsonl_from_oss(bucket, object_key)
+        daily_records = fetch_overview_jsonl_from_oss(bucket, object_key, inventory)
         
         # --- 处理单日趋势 ---
         # 提取所有记录并按时间排序
-        events = []
-        for spot in daily_records:
-            t_str = spot.get('TIME', '')
-            # 尝试解析时间，格式可能是 "YYYY-MM-DD HH:mm" 或 "HH:mm"
-            try:
-                if len(t_str) > 10:
-                    t_obj = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
-                else:
-                    # 只有时间的情况，加上日期
-                    t_obj = datetime.strptime(f"{date.strftime('%Y-%m-%d')} {t_str}", "%Y-%m-%d %H:%M")
-                
-                events.append({
-                    'time': t_obj,
-                    'name': spot.get('NAME'),
-                    'num': int(spot.get('NUM', 0)),
-                    'spot_data': spot
-                })
-            except Exception:
-                continue
+        with stage('parse'):
+            events = parse_day_events(daily_records, date, catalog)
         
-        events.sort(key=lambda x: x['time'])
+        with stage('aggregate'):
+            # 同一遍数据顺带更新当天的聚合立方体
+            day_cube = DayCube(day_prefix)
+            for minute, spot_id, num, row_idx in events:
+                day_cube.add(spot_id, minute, num, daily_records[row_idx])
+            day_cubes.append(day_cube)
+            
+            if i > 0:
+                sketch = sketch_months[date.strftime('%Y-%m')]
+                day_sig = source_signature(inventory, [object_key])
+                recorded = sketch.days.get(day_prefix)
+                if recorded is None and events:
+                    sketch.add_day(day_prefix, day_sig, day_readings(events, daily_records), catalog)
+                    updated_sketches.add(date.strftime('%Y-%m'))
+                elif recorded is not None and recorded != day_sig:
+                    logging.warning(f"{object_key} 在计入分位数草图后有变化，运行 --history-days 重新计入")
         
-        # 重放事件计算每个 bucket 的总人数
-        daily_trend_data = []
-        current_spot_nums = {} # {name: num}
-        event_idx = 0
+            events.sort(key=itemgetter(0))
         
-        # 记录当天的每个景点峰值
-        daily_spot_peaks = {}
+            n_spots = len(catalog)
+            for arr, default in ((max_peak_5days, 0), (sum_peak_5days, 0), (spot_district, None), (latest_info, None)):
+                arr.extend([default] * (n_spots - len(arr)))
         
-        for bucket_time_str in time_buckets:
-            bucket_dt = datetime.strptime(f"{date.strftime('%Y-%m-%d')} {bucket_time_str}", "%Y-%m-%d %H:%M")
-            
-            # 处理所有早于等于当前 bucket 时间的事件
-            while event_idx < len(events) and events[event_idx]['time'] <= bucket_dt:
-                ev = events[event_idx]
-                current_spot_nums[ev['name']] = ev['num']
+            # 重放事件计算每个 bucket 的总人数
+            daily_trend_data = []
+            current_spot_nums = [0] * n_spots
+            total_visitors = 0
+            event_idx = 0
+        
+            # 记录当天的每个景点峰值（-1 表示当天没有数据）
+            daily_spot_peaks = [-1] * n_spots
+        
+            for bucket_minute in bucket_minutes:
+                # 处理所有早于等于当前 bucket 时间的事件
+                while event_idx < len(events) and events[event_idx][0] <= bucket_minute:
+                    _, spot_id, num, row_idx = events[event_idx]
+                    total_visitors += num - current_spot_nums[spot_id]
+                    current_spot_nums[spot_id] = num
                 
-                # 更新全局统计信息
-                name = ev['name']
-                if name not in spot_stats:
-                    spot_stats[name] = {'max_num_5days': 0, 'district': ev['spot_data'].get('DNAME', '其他'), 'latest_info': ev['spot_data']}
+                    # 更新全局统计信息
+                    if latest_info[spot_id] is None:
+                        seen_order.append(spot_id)
+                        spot_district[spot_id] = daily_records[row_idx].get('DNAME', '其他')
+                        latest_info[spot_id] = daily_records[row_idx]
                 
-                # 更新当天峰值
-                daily_spot_peaks[name] = max(daily_spot_peaks.get(name, 0), ev['num'])
+                    # 更新当天峰值
+                    if num > daily_spot_peaks[spot_id]:
+                        daily_spot_peaks[spot_id] = num
                 
-                # 更新最新信息（如果是最后一天）
-                if i == 0:
-                    spot_stats[name]['latest_info'] = ev['spot_data']
+                    # 更新最新信息（如果是最后一天）
+                    if i == 0:
+                        latest_info[spot_id] = daily_records[row_idx]
                 
-                event_idx += 1
+                    event_idx += 1
             
-            # 计算当前时刻总人数
-            total_visitors = sum(current_spot_nums.values())
-            daily_trend_data.append(total_visitors)
+                # 当前时刻总人数
+                daily_trend_data.append(total_visitors)
             
-        trend_series.append({
-            "name": short_date,
-            "type": "line",
-            "smooth": True,
-            "data": daily_trend_data
-        })
+            trend_series.append({
+                "name": short_date,
+                "type": "line",
+                "smooth": True,
+                "data": daily_trend_data
+            })
         
-        # 更新全局峰值 (取5天中最大的那一天峰值? 还是累加? 用户说"客流峰值"，通常指最大承载压力，取Max)
-        # 用户之前说"统计过去5天的客流峰值总和" (Top 10)
-        # 用户后来又说"矩形树图...使用客流峰值替代"
-        # 我们统一逻辑：
-        # Top 10: 使用 5天峰值之和 (反映持续热度)
-        # Treemap: 使用 5天内的最大峰值 (反映最大规模)
+            # 更新全局峰值 (取5天中最大的那一天峰值? 还是累加? 用户说"客流峰值"，通常指最大承载压力，取Max)
+            # 用户之前说"统计过去5天的客流峰值总和" (Top 10)
+            # 用户后来又说"矩形树图...使用客流峰值替代"
+            # 我们统一逻辑：
+            # Top 10: 使用 5天峰值之和 (反映持续热度)
+            # Treemap: 使用 5天内的最大峰值 (反映最大规模)
         
-        for name, peak in daily_spot_peaks.items():
-            if name in spot_stats:
-                # 累加峰值用于 Top 10
-                spot_stats[name]['sum_peak_5days'] = spot_stats[name].get('sum_peak_5days', 0) + peak
-                # 最大峰值用于 Treemap
-                spot_stats[name]['max_num_5days'] = max(spot_stats[name]['max_num_5days'], peak)
-
-    # --- 生成 Top 10 数据 (按5天峰值总和) ---
-    all_spots_list = []
-    for name, stats in spot_stats.items():
-        all_spots_list.append({
-            "NAME": name,
-            "SUM_PEAK": stats.get('sum_peak_5days', 0),
-            "MAX_PEAK": stats['max_num_5days'],
-            "DISTRICT": stats['district'],
-            "LATEST": stats['latest_info']
-        })
+            for spot_id, peak in enumerate(daily_spot_peaks):
+                if peak >= 0:
+                    # 累加峰值用于 Top 10
+                    sum_peak_5days[spot_id] += peak
+                    # 最大峰值用于 Treemap
+                    max_peak_5days[spot_id] = max(max_peak_5days[spot_id], peak)
+
+    with stage('aggregate'):
+        # --- 生成 Top 10 数据 (按5天峰值总和) ---
+        all_spots_list = []
+        for spot_id in seen_order:
+            all_spots_list.append({
+                "NAME": catalog[spot_id].name,
+                "SUM_PEAK": sum_peak_5days[spot_id],
+                "MAX_PEAK": max_peak_5days[spot_id],
+                "DISTRICT": spot_district[spot_id],
+                "LATEST": latest_info[spot_id]
+            })
     
-    top_10 = sorted(all_spots_list, key=lambda x: x['SUM_PEAK'], reverse=True)[:10]
+        top_10 = sorted(all_spots_list, key=lambda x: x['SUM_PEAK'], reverse=True)[:10]
     
-    # --- 生成 Treemap 数据 ---
-    # 结构: 直接展示所有景点 (Size = MAX_PEAK)
-    treemap_data = []
-    for spot in all_spots_list:
-        treemap_data.append({
-            "name": spot['NAME'],
-            "value": spot['MAX_PEAK']
-        })
-
-    # 准备最终输出
-    # 为了兼容之前的表格，all_spots 需要包含 LATEST 的信息，并补充统计数据
-    final_all_spots = []
-    for s in all_spots_list:
-        info = s['LATEST'].copy()
-        info['SUM_PEAK'] = s['SUM_PEAK']
-        info['MAX_PEAK'] = s['MAX_PEAK']
-        final_all_spots.append(info)
-
-    final_overview = {
-        "generated_at": today.isoformat(),
-        "time_buckets": time_buckets,
-        "trend_series": trend_series,
-        "top_10": top_10,
-        "treemap_data": treemap_data,
-        "all_spots": sorted(final_all_spots, key=lambda x: int(x.get('NUM', 0)), reverse=True)
-    }
+        # --- 生成 Treemap 数据 ---
+        # 结构: 直接展示所有景点 (Size = MAX_PEAK)
+        treemap_data = []
+        for spot in all_spots_list:
+            treemap_data.append({
+                "name": spot['NAME'],
+                "value": spot['MAX_PEAK']
+            })
+
+        # 准备最终输出
+        # 为了兼容之前的表格，all_spots 需要包含 LATEST 的信息，并补充统计数据
+        final_all_spots = []
+        for s in all_spots_list:
+            info = s['LATEST'].copy()
+            info['SUM_PEAK'] = s['SUM_PEAK']
+            info['MAX_PEAK'] = s['MAX_PEAK']
+            final_all_spots.append(info)
+
+        final_overview = {
+            "generated_at": today.isoformat(),
+            "time_buckets": time_buckets,
+            "trend_series": trend_series,
+            "top_10": top_10,
+            "treemap_data": treemap_data,
+            "all_spots": sorted(final_all_spots, key=lambda x: int(x.get('NUM', 0)), reverse=True)
+        }
     
-    output_path = os.path.join(DATA_DIR, 'overview.json')
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(final_overview, f, ensure_ascii=False, indent=2)
+    output_path = build.write('overview.json', final_overview, signature)
+    update_cube(build, day_cubes, {cube.date: source_signature(inventory, [key])
+                                   for cube, key in zip(day_cubes, day_keys)})
+    save_sketch_months(build, [sketch_months[month] for month in sorted(updated_sketches)])
+    build.save()
     
     logging.info(f"概览数据已保存至: {output_path}")
     return final_all_spots
 
-def process_spot_details(bucket, all_spots):
-    """处理每个景点的详细数据（最近1个月）"""
-    logging.info("开始处理景点详情数据...")
-    
-    today = datetime.now()
-    # 假设数据按月存储在 tourist_data/YYYY/MM/景点名.jsonl
-    # 我们需要获取当前月的数据
-    current_month_prefix = f"tourist_data/{today.strftime('%Y/%m')}/"
-    
-    # 注意：如果跨月，可能需要读取上个月的数据。
-    # 为了简化，这里先只读取当前月份的文件夹。
-    # 用户示例路径: /tourist_data/2025/11/上海M50创意园.jsonl
-    
-    for spot_info in all_spots:
-        name = spot_info.get('NAME')
-        if not name:
-            continue
-            
-        # 处理文件名中的特殊字符 (参考 crawler 中的逻辑)
-        safe_name = name.replace('/', '_').replace('\\', '_')
-        object_key = f"{current_month_prefix}{safe_name}.jsonl"
-        
-        logging.info(f"处理景点: {name}")
-        records = fetch_spot_detail_jsonl_from_oss(bucket, object_key)
-        
-        if not records:
-            logging.info(f"  无数据: {object_key}")
-            continue
-            
+def detail_months(today, months=SPOT_DETAIL_MONTHS):
+    """景点详情包含的月份分区 ['YYYY/MM/', ...]（由早到晚，最后一个为当月）"""
+    result = []
+    year, month = today.year, today.month
+    for _ in range(max(months, 1)):
+        result.append(f"{year:04d}/{month:02d}/")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return result[::-1]
+
+def _init_spot_worker(encoder):
+    """进程池初始化：与主进程使用相同的 JSON 编码器；fork 继承的剖析状态在子进程中关闭"""
+    PROFILER.enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    use_encoder(encoder)
+
+def transform_spot(data_dir, name, spot_name, records, previous, changed, needed, window):
+    """
+    景点详情的 CPU 部分（可在进程池中运行）：去重、排序、按周切分、合并每日峰值，
+    序列化并写出需要重建的周分块；沿用上次构建中未变化月份的周
+
+    返回 {'chunks': 沿用的分块条目, 'written': [(带哈希的文件名, 分块条目)], 'discard': [逻辑文件名],
+    'daily': {日期: 峰值}, 'latest': 最新读数}
+    """
+    with stage('aggregate'):
         # 去重逻辑：按 TIME 字段去重
         unique_data = {}
         for spot_data in records:
             time_key = spot_data.get('TIME')
             if time_key:
                 unique_data[time_key] = spot_data
-        
+    
         # 转换为列表并按时间排序
         sorted_data = sorted(unique_data.values(), key=lambda x: x.get('TIME', ''))
+        weeks = split_weeks(sorted_data)
         
-        # 保存
-        output_path = os.path.join(SPOTS_DIR, f"{safe_name}.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "name": name,
-                "data": sorted_data
-            }, f, ensure_ascii=False, indent=2)
+        chunks = []
+        discard = []
+        for chunk in previous.get('chunks', []):
+            touched = week_months(chunk['week'])
+            if touched & changed or not touched & window:
+                if chunk['week'] not in weeks:
+                    discard.append(chunk['file'])
+                continue
+            chunks.append(chunk)
+            weeks.pop(chunk['week'], None)
+        
+        daily = {date: peak for date, peak in previous.get('daily', [])
+                 if f"{date[:4]}/{date[5:7]}/" in window and f"{date[:4]}/{date[5:7]}/" not in needed}
+        daily.update(daily_peaks(sorted_data))
+        latest = previous.get('latest')
+        if sorted_data and (latest is None or sorted_data[-1].get('TIME', '') >= latest.get('TIME', '')):
+            latest = sorted_data[-1]
+    
+    written = []
+    for week, week_records in sorted(weeks.items()):
+        chunk_file = chunk_logical(spot_name, week)
+        with stage('serialize'):
+            content = encode(chunk_payload(name, week, week_records))
+        hashed = store_content(data_dir, chunk_file, content)
+        written.append((hashed, chunk_entry(week, chunk_file, week_records, len(content))))
+    return {'chunks': chunks, 'written': written, 'discard': discard, 'daily': daily, 'latest': latest}
+
+def process_spot_details(bucket, all_spots, inventory=None, catalog=None, build=None, months=SPOT_DETAIL_MONTHS,
+                         workers=None):
+    """
+    处理每个景点的详细数据（最近 months 个月），按周分块输出，另有每个景点的索引
+
+    源文件按月存储（tourist_data/YYYY/MM/景点名.jsonl），只重建覆盖了源文件有变化的月份的周，
+    其余的周沿用上次构建的分块与索引条目
+
+    主进程依次下载各景点的源文件，去重排序与序列化交给 workers 个进程（transform_spot），
+    分块由子进程直接写出，主进程按完成顺序记入构建状态并写出索引；workers 为 1 时在主进程中处理
+    """
+    logging.info("开始处理景点详情数据...")
+    
+    today = datetime.now()
+    partitions = detail_months(today, months)
+    current_partition = partitions[-1]
+    window = set(partitions)
+    workers = SPOT_WORKERS if workers is None else max(workers, 1)
+    
+    # 列举各月份分区，得到所有景点文件的 ETag
+    if inventory is None:
+        inventory = OSSInventory(bucket, cache_path=None)
+    if build is None:
+        build = SiteBuild()
+    with stage('fetch'):
+        for partition in partitions:
+            inventory.refresh_partition(partition, max_age=PARTITION_MAX_AGE, manifest=USE_MANIFEST)
+    
+    # 分区清单记录了每个景点文件的CODE与名称，补充本月有数据但不在概览中的景点
+    spots = list(all_spots)
+    entries = inventory.partition_manifest(current_partition)
+    if entries:
+        known = {spot.get('CODE') for spot in spots if spot.get('CODE')} | {spot.get('NAME') for spot in spots}
+        for key in sorted(entries):
+            code, name = entries[key].get('code'), entries[key].get('name')
+            if name and (code or name) not in known and name not in known:
+                known.update((code or name, name))
+                spots.append({'NAME': name, 'CODE': code})
+        if len(spots) > len(all_spots):
+            logging.info(f"分区清单中另有 {len(spots) - len(all_spots)} 个景点")
+    
+    def finish(spot, result):
+        name, spot_name, logical, signature, month_keys, month_signatures = spot
+        for chunk_file in result['discard']:
+            build.discard(chunk_file)
+        chunks = result['chunks']
+        if not result['written'] and not chunks:
+            # 仍写出（空的）索引并记录签名：旧索引引用的分块已删除，且下次构建可以直接复用
+            logging.info(f"  无数据: tourist_data/{current_partition}{spot_name}.jsonl")
+        
+        # 分块已经写出，记入构建状态后最后写索引
+        for hashed, chunk in result['written']:
+            week_signature = source_signature(inventory, [k for p in sorted(week_months(chunk['week']) & window)
+                                                          for k in month_keys[p]])
+            build.record(chunk['file'], hashed, week_signature)
+            chunks.append(chunk)
+        build.write(logical, build_index(name, chunks, result['daily'], result['latest'], month_signatures),
+                    signature)
+        # 改为分块输出之前的单个文件
+        build.discard(f"spots/{spot_name}.json")
+    
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_spot_worker,
+                                   initargs=(current_encoder(),))
+    pending = {}
+    try:
+        for spot_info in spots:
+            name = spot_info.get('NAME')
+            if not name:
+                continue
+                
+            # 景点更名后，数据可能分布在曾用名的文件中
+            names = (name,)
+            if catalog is not None:
+                spot_id = catalog.lookup_code(spot_info.get('CODE'))
+                if spot_id is None:
+                    spot_id = catalog.lookup_name(name)
+                if spot_id is not None:
+                    names = (name,) + tuple(n for n in catalog[spot_id].names() if n != name)
+            
+            spot_name = safe_name(name)
+            month_keys = {partition: [f"tourist_data/{partition}{safe_name(file_name)}.jsonl" for file_name in names]
+                          for partition in partitions}
+            month_signatures = {partition: source_signature(inventory, keys) for partition, keys in month_keys.items()}
+            logical = index_logical(spot_name)
+            signature = source_signature(inventory, [], *sorted(month_signatures.items()))
+            if build.reuse(logical, signature):
+                logging.info(f"未变化，跳过: {name}")
+                continue
+            
+            # 上次构建的索引：未变化月份中的周直接沿用
+            previous = {}
+            if logical in build.files and not build.full:
+                try:
+                    previous = build.read(logical)
+                except (OSError, ValueError):
+                    pass
+            if previous.get('version') != INDEX_VERSION:
+                previous = {}
+            previous_sources = previous.get('sources', {})
+            changed = {p for p in partitions if previous_sources.get(p) != month_signatures[p]}
+            # 跨月的周需要相邻月份的读数
+            needed = {p for i, p in enumerate(partitions)
+                      if p in changed or any(q in changed for q in partitions[max(i - 1, 0):i + 2])}
+            
+            logging.info(f"处理景点: {name}（读取 {len(needed)} 个月份）")
+            records = []
+            for partition in sorted(needed):
+                for object_key in month_keys[partition]:
+                    records.extend(fetch_spot_detail_jsonl_from_oss(bucket, object_key, inventory))
             
-    logging.info("所有景点详情处理完毕")
+            spot = (name, spot_name, logical, signature, month_keys, month_signatures)
+            job = (build.data_dir, name, spot_name, records, previous, changed, needed, window)
+            if pool is None:
+                finish(spot, transform_spot(*job))
+                continue
+            pending[pool.submit(transform_spot, *job)] = spot
+            # 收尾已完成的景点；在途的景点数达到上限时等待，已下载未处理的读数不会无限堆积在内存中
+            done, _ = wait(pending, timeout=0 if len(pending) < workers * 2 else None,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(pending.pop(future), future.result())
+        
+        for future in as_completed(pending):
+            finish(pending.pop(future), future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    
+    build.save()
+    logging.info(f"所有景点详情处理完毕（更新 {build.written} 个文件，复用 {build.reused} 个）")
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从OSS读取客流数据，生成网站使用的JSON文件')
+    parser.add_argument('--full', action='store_true', help='忽略增量构建状态，重新生成所有文件')
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                        help='按阶段剖析（fetch/decode/parse/aggregate/serialize/write），'
+                             '报告写入 DIR（默认 .cache/profile/data_loader-<时间>）')
+    parser.add_argument('--history-days', type=int, default=0, metavar='N',
+                        help='补建最近 N 天的聚合立方体 data/cube/ 与分位数草图 data/sketch/（默认只随概览更新最近5天）')
+    parser.add_argument('--spot-months', type=int, default=SPOT_DETAIL_MONTHS, metavar='N',
+                        help=f'景点详情包含最近 N 个月的数据，按周分块（默认: {SPOT_DETAIL_MONTHS}，即当月）')
+    parser.add_argument('--workers', type=int, default=SPOT_WORKERS, metavar='N',
+                        help=f'景点详情的处理进程数（默认: {SPOT_WORKERS}，1 表示不使用进程池）')
+    parser.add_argument('--json-encoder', choices=ENCODERS, default=JSON_ENCODER,
+                        help=f'输出文件的 JSON 编码器，orjson 的输出与 json 逐字节相同（默认: {JSON_ENCODER}）')
+    args = parser.parse_args(argv)
+    logging.info(f"JSON 编码器: {use_encoder(args.json_encoder)}")
+    
     bucket = get_bucket()
     if not bucket:
         return
     
-    # 1. 生成概览数据
-    all_spots = process_overview_data(bucket)
+    # 对象清单（复用迁移工具留下的缓存），用于获取源文件 ETag 并省去 HEAD 请求
+    inventory = load_inventory(bucket) or OSSInventory(bucket)
+    build = SiteBuild(full=args.full)
+    # 景点目录在多次构建间持久化，以便识别更早发生的更名
+    catalog = SpotCatalog.load(CATALOG_PATH)
+    
+    if args.profile is not None:
+        start_profiling('data_loader', args.profile or None)
+    try:
+        # 1. 生成概览数据
+        all_spots = process_overview_data(bucket, inventory, catalog, build)
+        
+        # 2. 生成详情数据
+        if all_spots:
+            process_spot_details(bucket, all_spots, inventory, catalog, build, args.spot_months, args.workers)
+        
+        # 3. 补建更早日期的聚合立方体与分位数草图
+        if args.history_days > 0:
+            process_history(bucket, args.history_days, inventory, catalog, build)
+        
+        # 4. 新的爬取记录追加到本地矩阵缓存
+        update_matrix(bucket, max(5, args.history_days), inventory)
+    finally:
+        if args.profile is not None:
+            path, report = stop_profiling()
+            logging.info(f"剖析报告已保存至: {path}\n{format_report(report)}")
     
-    # 2. 生成详情数据
-    if all_spots:
-        process_spot_details(bucket, all_spots)
+    for code, old_name, new_name in catalog.renames:
+        logging.info(f"景点更名: {old_name} -> {new_name} (CODE {code})")
+    catalog.save(CATALOG_PATH)
+    inventory.save()
 
 if __name__ == '__main__':
     main()
@@ -1,8 +1,14 @@
 import os
 import json
+import math
 import random
+import shutil
+import argparse
 from datetime import datetime, timedelta
 
+import spot_chunks
+from spot_chunks import index_logical, chunk_logical, split_weeks, chunk_payload, chunk_entry, build_index
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 SPOTS_DIR = os.path.join(DATA_DIR, 'spots')
 
@@ -122,12 +128,18 @@ def generate_mock_data():
                     "DNAME": district
                 })
         
+        # 与 data_loader 相同的按周分块格式（不带内容哈希，前端找不到清单条目时直接使用逻辑文件名）
         safe_name = name.replace('/', '_').replace('\\', '_')
-        with open(os.path.join(SPOTS_DIR, f"{safe_name}.json"), 'w', encoding='utf-8') as f:
-            json.dump({
-                "name": name,
-                "data": detail_data
-            }, f, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.join(SPOTS_DIR, safe_name), exist_ok=True)
+        chunks = []
+        for week, week_data in sorted(split_weeks(detail_data).items()):
+            chunk_path = os.path.join(DATA_DIR, chunk_logical(safe_name, week))
+            with open(chunk_path, 'w', encoding='utf-8') as f:
+                json.dump(chunk_payload(name, week, week_data), f, ensure_ascii=False, indent=2)
+            chunks.append(chunk_entry(week, chunk_logical(safe_name, week), week_data, os.path.getsize(chunk_path)))
+        with open(os.path.join(DATA_DIR, index_logical(safe_name)), 'w', encoding='utf-8') as f:
+            json.dump(build_index(name, chunks, spot_chunks.daily_peaks(detail_data), detail_data[-1]), f,
+                      ensure_ascii=False, indent=2)
 
     # 4. Generate Top 10
     top_10 = sorted(all_spots_list, key=lambda x: x['SUM_PEAK'], reverse=True)[:10]
@@ -155,5 +167,281 @@ def generate_mock_data():
         
     print("Mock data (v2) generated successfully!")
 
+# ---------------------------------------------------------------------------
+# Raw data in the production OSS layout
+# ---------------------------------------------------------------------------
+
+RAW_DIR = os.path.join(os.path.dirname(__file__), 'mock_oss')
+
+RAW_DISTRICTS = [
+    ("1", "黄浦区"), ("2", "徐汇区"), ("3", "静安区"), ("4", "长宁区"), ("5", "普陀区"),
+    ("7", "虹口区"), ("8", "杨浦区"), ("9", "浦东新区"), ("10", "宝山区"), ("11", "嘉定区"),
+    ("12", "松江区"), ("13", "青浦区"), ("14", "闵行区"), ("15", "金山区"), ("16", "奉贤区"),
+    ("17", "崇明区")
+]
+# Roughly the district mix of a real payload (浦东/崇明 dominate)
+RAW_DISTRICT_WEIGHTS = [11, 6, 5, 3, 6, 5, 4, 27, 8, 6, 15, 8, 8, 10, 4, 24]
+
+RAW_GRADES = ["5A", "4A", "3A", "文化场馆", "其它"]
+RAW_GRADE_WEIGHTS = [8, 64, 62, 11, 5]
+
+RAW_OPEN_HOURS = [
+    "09:00~17:00", "08:30~16:30", "9:00~16:00", "09:00~16:30", "9:00~17:00",
+    "8:00~16:30", "00:00~23:59", "08:00~17:00", "10:00~21:00", "09:00~21:30"
+]
+
+RAW_SPOT_NAMES = [
+    "上海博物馆", "上海豫园", "上海城市规划展示馆", "东方明珠广播电视塔", "上海科技馆",
+    "上海野生动物园", "上海海昌海洋公园", "金茂大厦88层观光厅", "上海M50创意园", "上海动物园",
+    "上海共青森林公园", "上海鲜花港", "新场古镇", "上海川沙古镇", "上海周浦花海景区",
+    "上海国际旅游度假区--迪士尼乐园", "上海长风公园", "上海鲁迅公园", "朱家角古镇", "上海欢乐谷"
+]
+RAW_NAME_SUFFIXES = ["公园", "景区", "博物馆", "纪念馆", "古镇", "美术馆", "乐园", "森林公园", "文化园"]
+
+# (occupancy upper bound, SSD label)
+RAW_SSD_LEVELS = [(0.3, "舒适"), (0.5, "较舒适"), (0.7, "一般"), (0.9, "较拥挤"), (float('inf'), "拥挤")]
+
+RAW_DAILY_LINE = '{"timestamp": "%s", "data": {"total": "%d", "rows": [%s], "code": 200, "msg": "查询成功"}}\n'
+RAW_SPOT_LINE = '{"timestamp": "%s", "spot": %s}\n'
+
+
+def _parse_open_hours(t_time):
+    start, end = t_time.split('~')
+    sh, sm = start.split(':')
+    eh, em = end.split(':')
+    return int(sh) * 60 + int(sm), int(eh) * 60 + int(em)
+
+
+def _row_template(row):
+    """Render a row once; the per-crawl fields become %-placeholders (TIME, SSD, NUM, TYPE)."""
+    rendered = json.dumps(dict(row, TIME="@T@", SSD="@S@", NUM=-7777777, TYPE="@Y@"), ensure_ascii=False)
+    rendered = rendered.replace('%', '%%')
+    return (rendered.replace('"@T@"', '"%s"').replace('"@S@"', '"%s"')
+            .replace('-7777777', '%d').replace('"@Y@"', '"%s"'))
+
+
+def build_raw_spots(rng, n_spots):
+    """Seeded static catalog of spots with per-spot behaviour parameters."""
+    spots = []
+    for i in range(n_spots):
+        code_num, dname = rng.choices(RAW_DISTRICTS, weights=RAW_DISTRICT_WEIGHTS)[0]
+        if i < len(RAW_SPOT_NAMES):
+            name = RAW_SPOT_NAMES[i]
+        else:
+            name = f"上海{dname[:-1]}{rng.choice(RAW_NAME_SUFFIXES)}{i}"
+            if i % 97 == 41:
+                # Exercise safe_name handling
+                name = f"{name}/二期"
+
+        grade = rng.choices(RAW_GRADES, weights=RAW_GRADE_WEIGHTS)[0]
+        t_time = rng.choice(RAW_OPEN_HOURS)
+        max_num = int(rng.lognormvariate(8.3, 1.1))
+        max_num = max(100, min(max_num, 80000))
+
+        # A few spots carry the long snowflake-style codes seen in the real feed
+        row = {"CODE": str(1872556247141269506 + i) if i % 50 == 49 else str(i + 1), "NAME": name}
+        if rng.random() < 0.95:
+            row["ADDRESS"] = f"上海市{dname}{rng.randint(1, 999)}号"
+        row.update({
+            "DES": "", "TIME": "", "GRADE": grade, "T_TIME": t_time, "MAX_NUM": max_num,
+            "SSD": "", "NUM": 0, "TYPE": "", "DISTRICT": code_num, "DNAME": dname
+        })
+        if rng.random() < 0.09:
+            row.update({"WDES": "多云", "WHIGH": rng.randint(5, 35), "WLOW": rng.randint(-3, 25),
+                        "WDIRECTION": "东南风", "WPOWER": "3-4级"})
+
+        open_min, close_min = _parse_open_hours(t_time)
+        spots.append({
+            "name": name,
+            "safe_name": name.replace('/', '_').replace('\\', '_'),
+            "template": _row_template(row),
+            "max_num": max_num,
+            "open_min": open_min,
+            "close_min": close_min,
+            "popularity": rng.betavariate(1.2, 4.0),
+            # Feed refreshes TIME only every few crawls, a few minutes behind the crawl
+            "update_every": rng.choice([1, 1, 2, 3]),
+            "update_offset": rng.randint(0, 2),
+            "lag": rng.randint(0, 9),
+            # Museums and memorial halls close on Mondays
+            "monday_closed": grade == "文化场馆" or ("馆" in name and rng.random() < 0.7),
+            "seasonal": rng.random() < 0.02,
+            # Dead feeds: TIME frozen years ago, always closed
+            "frozen_time": (datetime(2022, 1, 1) + timedelta(minutes=rng.randint(0, 2 * 525600))).strftime("%Y-%m-%d %H:%M")
+            if rng.random() < 0.03 else None,
+        })
+    return spots
+
+
+def _day_factor(rng, date):
+    factor = 1.6 if date.weekday() >= 5 else 1.0
+    if (date.month, date.day) in ((1, 1), (5, 1), (5, 2), (5, 3), (10, 1), (10, 2), (10, 3), (10, 4), (10, 5)):
+        factor = 2.2
+    return factor * (0.85 + rng.random() * 0.3)
+
+
+def generate_raw_data(out_dir=RAW_DIR, n_spots=150, days=30, interval=20, seed=42,
+                      end_date=None, legacy_days=0):
+    """
+    Generate raw crawler output in the exact OSS layout:
+
+      tourist_data/YYYY/MM/DD.jsonl       full API payload per crawl
+      tourist_data/YYYY/MM/DD.idx         time index: "timestamp\toffset\tlength" per crawl
+      tourist_data/YYYY/MM/<spot>.jsonl   one line per spot per crawl
+      tourist_data/by_date/, by_name/     legacy formats (first `legacy_days` days only)
+
+    Rows are rendered from per-spot templates so only TIME/SSD/NUM/TYPE are formatted per crawl.
+    """
+    rng = random.Random(seed)
+    spots = build_raw_spots(rng, n_spots)
+    n = len(spots)
+
+    now = datetime.now()
+    end_date = (end_date or now).replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days - 1)
+
+    root = os.path.join(out_dir, 'tourist_data')
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    slots_per_day = 1440 // interval
+    hhmm = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+    last_time = [spot["frozen_time"] or "" for spot in spots]
+    total_lines = 0
+
+    print(f"Generating raw data: {n} spots x {days} days, every {interval} min (seed={seed}) -> {root}")
+
+    legacy_by_name = {}
+    for day_idx in range(days):
+        date = start_date + timedelta(days=day_idx)
+        day_str = date.strftime('%Y-%m-%d')
+        month_dir = os.path.join(root, date.strftime('%Y'), date.strftime('%m'))
+        is_legacy = day_idx < legacy_days
+        if not is_legacy:
+            os.makedirs(month_dir, exist_ok=True)
+
+        day_factor = _day_factor(rng, date)
+        is_monday = date.weekday() == 0
+        is_winter = date.month in (12, 1, 2)
+        day_scale = [spot["max_num"] * spot["popularity"] * day_factor for spot in spots]
+        closed_today = [spot["frozen_time"] is not None or (is_monday and spot["monday_closed"])
+                        or (is_winter and spot["seasonal"]) for spot in spots]
+        closed_type = ["季节性闭园" if is_winter and spot["seasonal"] else "闭园" for spot in spots]
+
+        daily_lines = []
+        daily_index = []
+        daily_offset = 0
+        spot_lines = [[] for _ in range(n)]
+        legacy_fetches = []
+
+        for slot in range(slots_per_day):
+            minute = slot * interval
+            crawl_dt = date + timedelta(minutes=minute, seconds=rng.randint(0, 5), microseconds=rng.randint(0, 999999))
+            if date == end_date and crawl_dt > now:
+                break
+            timestamp = crawl_dt.isoformat()
+
+            rows = []
+            for s in range(n):
+                spot = spots[s]
+                open_min, close_min = spot["open_min"], spot["close_min"]
+                if closed_today[s] or not (open_min <= minute < close_min):
+                    num, ssd, type_ = 0, "舒适", closed_type[s]
+                else:
+                    phase = (minute - open_min) / max(close_min - open_min, 1)
+                    num = int(day_scale[s] * math.sin(math.pi * phase) * (0.85 + rng.random() * 0.3))
+                    ratio = num / spot["max_num"]
+                    ssd = next(label for bound, label in RAW_SSD_LEVELS if ratio < bound)
+                    type_ = "正常"
+                    if (slot + spot["update_offset"]) % spot["update_every"] == 0:
+                        last_time[s] = f"{day_str} {hhmm[max(minute - spot['lag'], 0)]}"
+                rows.append(spot["template"] % (last_time[s], ssd, num, type_))
+
+            if is_legacy:
+                legacy_fetches.append((timestamp, rows))
+                month_key = date.strftime('%Y-%m')
+                for s in range(n):
+                    legacy_by_name.setdefault((month_key, s), []).append(rows[s])
+                continue
+
+            daily_lines.append(RAW_DAILY_LINE % (timestamp, n, ', '.join(rows)))
+            line_length = len(daily_lines[-1].encode('utf-8'))
+            daily_index.append(f"{timestamp}\t{daily_offset}\t{line_length}\n")
+            daily_offset += line_length
+            for s in range(n):
+                spot_lines[s].append(RAW_SPOT_LINE % (timestamp, rows[s]))
+
+        if is_legacy:
+            _write_legacy_by_date(root, day_str, legacy_fetches, n)
+            if day_idx == legacy_days - 1 or (date + timedelta(days=1)).day == 1:
+                _flush_legacy_by_name(root, spots, legacy_by_name)
+            total_lines += len(legacy_fetches)
+            continue
+
+        # newline='' keeps byte offsets in the index exact on every platform
+        with open(os.path.join(month_dir, f"{date.strftime('%d')}.jsonl"), 'w', encoding='utf-8', newline='') as f:
+            f.writelines(daily_lines)
+        with open(os.path.join(month_dir, f"{date.strftime('%d')}.idx"), 'w', encoding='utf-8', newline='') as f:
+            f.writelines(daily_index)
+        for s in range(n):
+            with open(os.path.join(month_dir, f"{spots[s]['safe_name']}.jsonl"), 'a', encoding='utf-8') as f:
+                f.writelines(spot_lines[s])
+        total_lines += len(daily_lines)
+
+        if day_idx % 30 == 29 or day_idx == days - 1:
+            print(f"  {day_str}: {day_idx + 1}/{days} days, {total_lines} crawls")
+
+    print(f"Raw data generated: {total_lines} crawls, {n} spots")
+    return root
+
+
+def _write_legacy_by_date(root, day_str, fetches, n_spots):
+    legacy_dir = os.path.join(root, 'by_date')
+    os.makedirs(legacy_dir, exist_ok=True)
+    items = ', '.join(
+        '{"fetch_time": "%s", "total": "%d", "rows": [%s], "code": 200, "msg": "查询成功"}'
+        % (timestamp, n_spots, ', '.join(rows)) for timestamp, rows in fetches)
+    last_updated = fetches[-1][0] if fetches else ""
+    with open(os.path.join(legacy_dir, f"{day_str}.json"), 'w', encoding='utf-8') as f:
+        f.write('{"date": "%s", "last_updated": "%s", "data": [%s]}' % (day_str, last_updated, items))
+
+
+def _flush_legacy_by_name(root, spots, legacy_by_name):
+    for (month_key, s), rows in legacy_by_name.items():
+        legacy_dir = os.path.join(root, 'by_name', month_key)
+        os.makedirs(legacy_dir, exist_ok=True)
+        with open(os.path.join(legacy_dir, f"{spots[s]['safe_name']}.json"), 'w', encoding='utf-8') as f:
+            f.write('{"spot_name": %s, "month": "%s", "data": [%s]}'
+                    % (json.dumps(spots[s]['name'], ensure_ascii=False), month_key, ', '.join(rows)))
+    legacy_by_name.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate mock data for the dashboard or raw OSS-layout data')
+    parser.add_argument('--raw', action='store_true',
+                        help='generate raw crawler output in the OSS layout instead of processed web data')
+    parser.add_argument('--out', default=RAW_DIR, help='output root for --raw (default: web/mock_oss)')
+    parser.add_argument('--spots', type=int, default=150, help='number of spots (default: 150)')
+    parser.add_argument('--days', type=int, default=None, help='number of days (default: 30)')
+    parser.add_argument('--years', type=float, default=None, help='number of years, overrides --days')
+    parser.add_argument('--interval', type=int, default=20, help='crawl interval in minutes (default: 20)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default: 42)')
+    parser.add_argument('--end-date', default=None, help='last day to generate, YYYY-MM-DD (default: today)')
+    parser.add_argument('--legacy-days', type=int, default=0,
+                        help='write the first N days in the legacy by_date/by_name formats')
+    args = parser.parse_args()
+
+    if not args.raw:
+        generate_mock_data()
+        return
+
+    days = args.days or 30
+    if args.years:
+        days = int(round(args.years * 365))
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date else None
+    generate_raw_data(args.out, n_spots=args.spots, days=days, interval=args.interval,
+                      seed=args.seed, end_date=end_date, legacy_days=args.legacy_days)
+
+
 if __name__ == "__main__":
-    generate_mock_data()
+    main()
@@ -0,0 +1,106 @@
+"""
+网站输出文件的 JSON 编码，可选使用 orjson
+
+输出必须与 json.dumps(payload, ensure_ascii=False, indent=indent) 逐字节相同：文件名中的内容哈希
+与增量构建的复用都依赖于此。orjson 只支持两空格缩进，因此只在以下条件下代替 json：
+- 已安装，并且 use_encoder() 自检时样例文档经 encode() 的输出与 json 完全一致
+- indent 为 2（cube / sketch 的紧凑输出分隔符不同，始终使用 json）
+- 文档中没有 orjson 不支持或行为不同的类型（非字符串键、超出 64 位的整数、datetime 等），否则该文档改用 json
+- 文档中没有写法不同的浮点数，否则该文档改用 json：json 对绝对值小于 1e-4 或不小于 1e16 的浮点数使用
+  指数形式（2.5e-05、1e+16），orjson 写作 0.000025 / 1e16 等；NaN / Infinity 在 orjson 的输出中为 null
+"""
+
+import os
+import re
+import json
+import math
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# auto: 可用且自检通过时使用 orjson；json: 始终使用标准库；orjson: 同 auto，不可用时给出警告
+JSON_ENCODER = os.getenv('DATA_LOADER_JSON', 'auto')
+ENCODERS = ('auto', 'json', 'orjson')
+
+if orjson is not None:
+    # datetime、dataclass 与 str/int/dict/list 的子类交给 json 处理（json 会报错或有不同的输出）
+    _ORJSON_OPTIONS = (orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME
+                       | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+# 覆盖输出文件中出现的各种值：中文、控制字符与转义、空容器、嵌套、整数与常见范围的浮点数
+_PROBE = {
+    "name": "豫园（城隍庙）\"老街\"\\",
+    "text": "换行\n制表\t回车\r退格\b换页\f\x00\x1f\x7f  😀",
+    "nums": [0, -1, 2 ** 63 - 1, -2 ** 63, 0.0, -0.0, 1.0, 0.1, 0.7834, 123.456, 1234567.125],
+    # 以下浮点数 json 与 orjson 的写法不同，encode() 须退回 json
+    "floats": [2.5e-05, 1e-05, -9.9e-05, 1e-07, 1e16, 1.5e300, float('nan'), float('-inf')],
+    "flags": [True, False, None],
+    "empty": {"list": [], "dict": {}, "str": ""},
+    "nested": [[1, [2, []]], {"a": {"b": [{"c": None}]}}],
+    "data": [{"CODE": "1", "NAME": "上海博物馆", "NUM": 1234, "MAX_NUM": 8000, "SSD": "舒适",
+              "TIME": "2025-11-07 15:40", "TYPE": "开放"}],
+}
+_EXPONENT_RE = re.compile(rb'\d[eE][-+]?\d')
+# orjson 输出中可能来自写法不同的浮点数的内容（NaN / Infinity、小数形式的极小值与极大值），出现时再遍历文档
+_SUSPECT_RE = re.compile(rb'null|0\.0000|\d{17}')
+
+_use_orjson = False
+
+
+def _has_json_only_float(value):
+    """文档中是否有 json 与 orjson 写法不同的浮点数：NaN / Infinity，或绝对值小于 1e-4（非 0）或不小于 1e16"""
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value) or (value and not 1e-4 <= abs(value) < 1e16):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def encode(payload, indent=2):
+    """-> UTF-8 字节串，与 json.dumps(payload, ensure_ascii=False, indent=indent).encode('utf-8') 相同"""
+    if _use_orjson and indent == 2:
+        try:
+            content = orjson.dumps(payload, option=_ORJSON_OPTIONS)
+        except TypeError:
+            content = None
+        # 字符串中恰好有类似指数的内容时也会退回 json，只是慢一些，输出不受影响；
+        # 其他写法不同的浮点数只在输出中有可疑内容时才遍历文档检查
+        if (content is not None and not _EXPONENT_RE.search(content)
+                and not (_SUSPECT_RE.search(content) and _has_json_only_float(payload))):
+            return content
+    return json.dumps(payload, ensure_ascii=False, indent=indent).encode('utf-8')
+
+
+def use_encoder(name=JSON_ENCODER):
+    """选择编码器，返回实际使用的编码器名（orjson 未安装或自检输出不一致时为 json）"""
+    global _use_orjson
+    if name not in ENCODERS:
+        raise ValueError(f"未知的 JSON 编码器: {name}（可选: {', '.join(ENCODERS)}）")
+    _use_orjson = False
+    if name == 'json':
+        return 'json'
+    if orjson is None:
+        if name == 'orjson':
+            logging.warning("未安装 orjson，使用标准库 json")
+        return 'json'
+    # 逐项检查：各项单独编码，写法不同的浮点数只让所在的一项退回 json，其余各项仍由 orjson 输出
+    _use_orjson = True
+    for key, value in _PROBE.items():
+        if encode({key: value}) != json.dumps({key: value}, ensure_ascii=False, indent=2).encode('utf-8'):
+            _use_orjson = False
+            logging.warning(f"orjson {orjson.__version__} 的输出与 json 不一致（{key}），使用标准库 json")
+            return 'json'
+    return 'orjson'
+
+
+def current_encoder():
+    return 'orjson' if _use_orjson else 'json'
@@ -0,0 +1,13 @@
+// 数据文件清单：data/manifest.json 记录 逻辑文件名 -> 带内容哈希的文件名
+// 带哈希的文件内容不变，可被浏览器长期缓存；清单本身每次都重新获取
+const dataManifest = fetch('data/manifest.json', { cache: 'no-cache' })
+    .then(response => response.ok ? response.json() : { files: {} })
+    .catch(() => ({ files: {} }));
+
+// 返回逻辑文件（如 'overview.json'、'spots/xxx.json'）的实际URL，清单中没有时使用原路径
+function resolveDataUrl(logicalName) {
+    return dataManifest.then(manifest => {
+        const fileName = (manifest.files || {})[logicalName] || logicalName;
+        return 'data/' + fileName.split('/').map(encodeURIComponent).join('/');
+    });
+}
@@ -0,0 +1,211 @@
+"""
+景点客流分位数草图 - 按月保存每个景点的可合并分位数草图（data/sketch/YYYY-MM.json）
+
+"今年的 p95 承载率"、"周六的典型峰值"等长周期统计只需合并各月的草图，不必读取原始数据，内存占用固定。
+
+草图采用对数分桶（DDSketch）：值 v 落入第 ceil(log_γ v) 个桶，γ = (1 + α) / (1 - α)，
+任意分位数的相对误差不超过 α；桶计数直接相加即可合并，合并结果与一次性统计完全相同。
+
+每个景点的指标：
+- num: 当天各读数的人数
+- occupancy: 各读数的承载率 NUM / MAX_NUM（按该读数当时的 MAX_NUM，没有最大承载量的读数不统计）
+- peak: 每天的峰值人数，按星期分为 7 个草图（0 为周一）
+"""
+
+import math
+from datetime import datetime
+
+SCHEMA_VERSION = 2
+# 分位数的相对误差
+RELATIVE_ACCURACY = 0.02
+METRICS = ('num', 'occupancy', 'peak')
+
+
+class QuantileSketch:
+    """对数分桶分位数草图；小于等于0的值单独计数"""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}  # {桶序号: 计数}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """合并另一个草图（相对误差必须相同）"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f"相对误差不一致，无法合并: {self.relative_accuracy} != {other.relative_accuracy}")
+        if not other.count:
+            return self
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """第 q 分位数（0 <= q <= 1），草图为空时返回 None"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0)
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # 桶 (γ^(k-1), γ^k] 内相对误差最小的代表值
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        """紧凑格式：连续的桶计数数组 + 起始桶序号"""
+        data = {'n': self.count, 'zero': self.zero_count, 'min': self.min, 'max': self.max}
+        if self.bins:
+            offset = min(self.bins)
+            counts = [0] * (max(self.bins) - offset + 1)
+            for key, count in self.bins.items():
+                counts[key - offset] = count
+            data['offset'] = offset
+            data['bins'] = counts
+        return data
+
+    @classmethod
+    def from_dict(cls, data, relative_accuracy=RELATIVE_ACCURACY):
+        sketch = cls(relative_accuracy)
+        sketch.count = data['n']
+        sketch.zero_count = data['zero']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        offset = data.get('offset', 0)
+        sketch.bins = {offset + i: count for i, count in enumerate(data.get('bins', ())) if count}
+        return sketch
+
+
+class SpotSketches:
+    """一个景点在一个月内的草图"""
+
+    __slots__ = ('name', 'num', 'occupancy', 'peak')
+
+    def __init__(self, name, relative_accuracy=RELATIVE_ACCURACY):
+        self.name = name
+        self.num = QuantileSketch(relative_accuracy)
+        self.occupancy = QuantileSketch(relative_accuracy)
+        self.peak = [QuantileSketch(relative_accuracy) for _ in range(7)]
+
+
+class SketchMonth:
+    """
+    一个月份分区的草图
+
+    days 记录已计入的日期及其源文件签名；只计入已经结束的日期，
+    已计入日期的源文件发生变化（如迁移补写）时需要 reset() 后重新计入整月
+    """
+
+    def __init__(self, month, relative_accuracy=RELATIVE_ACCURACY):
+        self.month = month
+        self.relative_accuracy = relative_accuracy
+        self.days = {}   # {日期: 源文件签名}
+        self.spots = {}  # {CODE: SpotSketches}
+
+    def reset(self):
+        self.days = {}
+        self.spots = {}
+
+    def add_day(self, date, signature, readings, catalog):
+        """
+        计入一天的读数
+
+        readings: {景点ID: [(人数, 该读数的最大承载量), ...]}（已按 (景点, TIME) 去重）；catalog 提供 CODE 与名称
+        """
+        weekday = datetime.strptime(date, '%Y-%m-%d').weekday()
+        for spot_id, nums in readings.items():
+            if not nums:
+                continue
+            record = catalog[spot_id]
+            spot = self.spots.get(record.code)
+            if spot is None:
+                spot = self.spots[record.code] = SpotSketches(record.name, self.relative_accuracy)
+            spot.name = record.name
+            for num, max_num in nums:
+                spot.num.add(num)
+                if max_num > 0:
+                    spot.occupancy.add(num / max_num)
+            spot.peak[weekday].add(max(num for num, _ in nums))
+        self.days[date] = signature
+
+    def to_dict(self):
+        spots = {}
+        for code in sorted(self.spots):
+            spot = self.spots[code]
+            spots[code] = {
+                'name': spot.name,
+                'num': spot.num.to_dict(),
+                'occupancy': spot.occupancy.to_dict(),
+                'peak': [sketch.to_dict() if sketch.count else None for sketch in spot.peak]
+            }
+        return {
+            'schema': SCHEMA_VERSION,
+            'month': self.month,
+            'relative_accuracy': self.relative_accuracy,
+            'metrics': list(METRICS),
+            'days': dict(sorted(self.days.items())),
+            'spots': spots
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """版本或相对误差与当前设置不符时返回空的月份（需要重新计入）"""
+        month = cls(data.get('month'))
+        if data.get('schema') != SCHEMA_VERSION or data.get('relative_accuracy') != month.relative_accuracy:
+            return month
+        month.days = dict(data['days'])
+        for code, item in data['spots'].items():
+            spot = month.spots[code] = SpotSketches(item['name'], month.relative_accuracy)
+            spot.num = QuantileSketch.from_dict(item['num'], month.relative_accuracy)
+            spot.occupancy = QuantileSketch.from_dict(item['occupancy'], month.relative_accuracy)
+            spot.peak = [QuantileSketch.from_dict(sketch, month.relative_accuracy) if sketch
+                         else QuantileSketch(month.relative_accuracy) for sketch in item['peak']]
+        return month
+
+
+def merge_sketches(months, code, metric, weekdays=None):
+    """
+    合并多个月份（SketchMonth 或其 to_dict() 结果）中某个景点某项指标的草图
+
+    weekdays 只对 peak 有效，如 (5,) 表示只合并周六：
+    merge_sketches(months, code, 'occupancy').quantile(0.95)
+    merge_sketches(months, code, 'peak', weekdays=(5,)).quantile(0.5)
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知的指标: {metric}")
+    merged = QuantileSketch()
+    for month in months:
+        if isinstance(month, dict):
+            month = SketchMonth.from_dict(month)
+        spot = month.spots.get(code)
+        if spot is None:
+            continue
+        if metric == 'peak':
+            for weekday, sketch in enumerate(spot.peak):
+                if weekdays is None or weekday in weekdays:
+                    merged.merge(sketch)
+        else:
+            merged.merge(getattr(spot, metric))
+    return merged
@@ -0,0 +1,104 @@
+"""
+景点详情分块 - 把每个景点的历史读数按自然周（周一至周日）切分为固定时间跨度的分块，并为每个景点生成一个小索引
+
+输出（逻辑文件名，经 data/manifest.json 映射为带内容哈希的文件名）：
+- spots/<景点名>/index.json: 时间范围、最新读数、每日峰值（热力日历），以及各分块的时间范围、读数个数与字节数
+- spots/<景点名>/<YYYY-Www>.json: 该周的读数 {"name", "week", "data": [...]}
+
+detail.html 先读取索引，只加载与当前可见时间范围重叠的分块，拖动或缩放时再按需加载其余分块，
+首屏耗时与景点的历史长度无关
+"""
+
+from datetime import datetime, timedelta
+
+INDEX_VERSION = 1
+CHUNK_DAYS = 7
+
+
+def spot_dir(safe_name):
+    return f"spots/{safe_name}/"
+
+
+def index_logical(safe_name):
+    return f"{spot_dir(safe_name)}index.json"
+
+
+def chunk_logical(safe_name, week):
+    return f"{spot_dir(safe_name)}{week}.json"
+
+
+def week_key(time_str):
+    """'2025-11-07 15:42' -> '2025-W45'（ISO 周），无法解析时返回 None"""
+    try:
+        year, week, _ = datetime.strptime(time_str[:10], '%Y-%m-%d').isocalendar()
+    except (TypeError, ValueError):
+        return None
+    return f"{year}-W{week:02d}"
+
+
+def week_days(week):
+    """ISO 周的第一天与最后一天 (周一, 周日)"""
+    monday = datetime.strptime(f"{week}-1", '%G-W%V-%u')
+    return monday, monday + timedelta(days=CHUNK_DAYS - 1)
+
+
+def week_months(week):
+    """ISO 周覆盖的月份分区 {'YYYY/MM/'}（跨月的周有两个）"""
+    monday, sunday = week_days(week)
+    return {monday.strftime('%Y/%m/'), sunday.strftime('%Y/%m/')}
+
+
+def split_weeks(records):
+    """按 TIME 排序的读数 -> {周: [读数]}，TIME 无法解析的读数跳过"""
+    weeks = {}
+    for record in records:
+        week = week_key(record.get('TIME'))
+        if week is not None:
+            weeks.setdefault(week, []).append(record)
+    return weeks
+
+
+def daily_peaks(records):
+    """{日期: 当天最大人数}"""
+    peaks = {}
+    for record in records:
+        date = (record.get('TIME') or '')[:10]
+        try:
+            num = int(record.get('NUM', 0))
+        except (TypeError, ValueError):
+            continue
+        if len(date) == 10 and num > peaks.get(date, -1):
+            peaks[date] = num
+    return peaks
+
+
+def chunk_payload(name, week, records):
+    return {"name": name, "week": week, "data": records}
+
+
+def chunk_entry(week, logical, records, size):
+    return {
+        "week": week,
+        "file": logical,
+        "start": records[0].get('TIME'),
+        "end": records[-1].get('TIME'),
+        "count": len(records),
+        "bytes": size,
+    }
+
+
+def build_index(name, chunks, daily, latest, sources=None):
+    """chunks 为 chunk_entry() 的列表；sources 记录各月份源文件的签名，供下次增量构建判断哪些周需要重建"""
+    chunks = sorted(chunks, key=lambda chunk: chunk['week'])
+    return {
+        "version": INDEX_VERSION,
+        "name": name,
+        "chunk_days": CHUNK_DAYS,
+        "start": chunks[0]['start'] if chunks else None,
+        "end": chunks[-1]['end'] if chunks else None,
+        "count": sum(chunk['count'] for chunk in chunks),
+        "latest": latest,
+        "daily": sorted([date, peak] for date, peak in daily.items()),
+        "chunks": chunks,
+        "sources": dict(sorted((sources or {}).items())),
+    }
@@ -0,0 +1,321 @@
+"""
+景点 × 爬取时间 矩阵缓存 - 以定宽二进制数组保存每次爬取各景点的人数与状态，读取时 mmap，无需解析JSON
+
+目录结构（默认 .cache/matrix/）：
+- time.g<N>.i64: 每次爬取的时间（秒，本地时间相对 1970-01-01）
+- num.g<N>.i32: 人数，按行（爬取）存放，每行 capacity 个景点，-1 表示该次爬取没有该景点
+- ssd.g<N>.u8 / type.g<N>.u8: SSD（舒适度）与 TYPE（开放状态）的编码，0 表示空
+- header.json: 版本、行数、景点列（CODE 与名称）、状态编码表、最后计入的爬取时间
+
+所有数组均为小端序，可以直接用 numpy 打开：
+    np.memmap('.cache/matrix/num.g0.i32', dtype='<i4', mode='r', shape=(rows, capacity))
+
+追加时先把新行写入数据文件并 fsync，再原子替换 header.json；header 中的行数之后的字节视为未提交，
+进程中途退出不会破坏已有数据。景点数超过 capacity 时写入新一代（g<N+1>）文件，切换 header 后删除旧文件
+"""
+
+import os
+import sys
+import json
+import mmap
+import bisect
+from array import array
+from datetime import datetime, timedelta
+
+SCHEMA_VERSION = 1
+HEADER_NAME = 'header.json'
+# 首次创建时的景点列数，不够时翻倍
+INITIAL_CAPACITY = 256
+MISSING = -1
+# 数组名: (array 类型码, 文件扩展名, 是否每行一个值)
+ARRAYS = {
+    'time': ('q', 'i64', True),
+    'num': ('i', 'i32', False),
+    'ssd': ('B', 'u8', False),
+    'type': ('B', 'u8', False),
+}
+STATE_FIELDS = {'ssd': 'SSD', 'type': 'TYPE'}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_seconds(value):
+    return int((value - _EPOCH).total_seconds())
+
+
+def from_seconds(seconds):
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+def spot_code(row):
+    """与景点目录相同：没有 CODE 时以名称作为键"""
+    name = row.get('NAME') or '未知景点'
+    return row.get('CODE') or f"NAME:{name}"
+
+
+class SpotMatrix:
+    """
+    矩阵缓存
+
+    写入：add_record(爬取记录) 逐条追加（早于 last_ingested 的记录忽略），commit() 落盘。
+    读取：row_range / series / snapshot / totals 通过 mmap 直接读取已提交的行
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = self._load_header()
+        self.rows = header['rows']
+        self.capacity = header['capacity']
+        self.generation = header['generation']
+        self.spots = [tuple(spot) for spot in header['spots']]  # [(CODE, 名称)]，下标即列号
+        self.states = {name: list(values) for name, values in header['states'].items()}
+        self.last_ingested = (datetime.fromisoformat(header['last_ingested'])
+                              if header['last_ingested'] else None)
+        self._columns = {code: col for col, (code, _) in enumerate(self.spots)}
+        self._pending = []  # [(秒, {列号: (人数, ssd编码, type编码)})]
+        self._views = None
+
+    # ---------- 写入 ----------
+
+    def add_record(self, record):
+        """计入一次爬取的完整记录（{'timestamp', 'data': {'rows': [...]}}），返回是否计入"""
+        try:
+            timestamp = datetime.fromisoformat(record['timestamp'])
+            rows = record['data']['rows']
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not rows or (self.last_ingested is not None and timestamp <= self.last_ingested):
+            return False
+
+        values = {}
+        for row in rows:
+            col = self._column(row)
+            try:
+                num = int(row.get('NUM', MISSING))
+            except (TypeError, ValueError):
+                num = MISSING
+            values[col] = (num, self._state('ssd', row.get('SSD')), self._state('type', row.get('TYPE')))
+        self._pending.append((to_seconds(timestamp), values))
+        self.last_ingested = timestamp
+        return True
+
+    def commit(self):
+        """把新增的行写入数据文件并更新 header，返回新增行数"""
+        if not self._pending:
+            return 0
+        old_files = None
+        if len(self.spots) > self.capacity:
+            old_files = self._files()
+            capacity = self.capacity
+            while capacity < len(self.spots):
+                capacity *= 2
+            self._grow(capacity)
+
+        chunks = {name: array(typecode) for name, (typecode, _, _) in ARRAYS.items()}
+        for seconds, values in self._pending:
+            chunks['time'].append(seconds)
+            num = array('i', [MISSING]) * self.capacity
+            ssd = array('B', [0]) * self.capacity
+            type_ = array('B', [0]) * self.capacity
+            for col, (n, s, t) in values.items():
+                num[col], ssd[col], type_[col] = n, s, t
+            chunks['num'].extend(num)
+            chunks['ssd'].extend(ssd)
+            chunks['type'].extend(type_)
+
+        for name, chunk in chunks.items():
+            self._write_at(name, self.rows, chunk)
+        added = len(self._pending)
+        self.rows += added
+        self._pending = []
+        self._save_header()
+        if old_files:
+            for file_name in old_files.values():
+                try:
+                    os.remove(os.path.join(self.path, file_name))
+                except OSError:
+                    pass
+        self.close()
+        return added
+
+    def _column(self, row):
+        code = spot_code(row)
+        col = self._columns.get(code)
+        name = row.get('NAME') or '未知景点'
+        if col is None:
+            col = self._columns[code] = len(self.spots)
+            self.spots.append((code, name))
+        elif self.spots[col][1] != name:
+            # 更名后沿用同一列
+            self.spots[col] = (code, name)
+        return col
+
+    def _state(self, field, value):
+        if not value:
+            return 0
+        table = self.states[field]
+        try:
+            return table.index(value)
+        except ValueError:
+            if len(table) >= 256:
+                return 0
+            table.append(value)
+            return len(table) - 1
+
+    def _files(self, generation=None):
+        generation = self.generation if generation is None else generation
+        return {name: f"{name}.g{generation}.{ext}" for name, (_, ext, _) in ARRAYS.items()}
+
+    def _row_width(self, name):
+        return 1 if ARRAYS[name][2] else self.capacity
+
+    def _write_at(self, name, row, chunk):
+        """从第 row 行起写入，截断其后未提交的字节，并 fsync"""
+        if sys.byteorder == 'big':
+            chunk = array(chunk.typecode, chunk)
+            chunk.byteswap()
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, self._files()[name])
+        offset = row * self._row_width(name) * chunk.itemsize
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            f.seek(offset)
+            chunk.tofile(f)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _grow(self, capacity):
+        """按新的景点列数把已提交的行复制到下一代文件（header 切换前旧文件保持不变）"""
+        old_capacity, old_views = self.capacity, self._load_views()
+        self._views = None
+        self.generation += 1
+        self.capacity = capacity
+        for name, (typecode, _, per_row) in ARRAYS.items():
+            view = old_views[name]
+            if per_row:
+                chunk = array(typecode, view[:self.rows])
+            else:
+                fill = MISSING if name == 'num' else 0
+                chunk = array(typecode, [fill]) * (self.rows * capacity)
+                for r in range(self.rows):
+                    chunk[r * capacity:r * capacity + old_capacity] = array(
+                        typecode, view[r * old_capacity:(r + 1) * old_capacity])
+            self._write_at(name, 0, chunk)
+        for view in old_views.values():
+            if isinstance(view, memoryview):
+                view.release()
+
+    def _load_header(self):
+        path = os.path.join(self.path, HEADER_NAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            if header.get('schema') == SCHEMA_VERSION:
+                return header
+        return {'rows': 0, 'capacity': INITIAL_CAPACITY, 'generation': 0, 'spots': [],
+                'states': {name: [''] for name in STATE_FIELDS}, 'last_ingested': None}
+
+    def _save_header(self):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, HEADER_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'schema': SCHEMA_VERSION,
+                'rows': self.rows,
+                'capacity': self.capacity,
+                'generation': self.generation,
+                'files': self._files(),
+                'last_ingested': self.last_ingested.isoformat() if self.last_ingested else None,
+                'spots': [list(spot) for spot in self.spots],
+                'states': self.states,
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ---------- 读取 ----------
+
+    def _load_views(self):
+        """已提交部分的只读视图（小端机器上为 mmap 的 memoryview，否则为字节序转换后的 array）"""
+        if self._views is not None:
+            return self._views
+        views = {}
+        for name, file_name in self._files().items():
+            typecode, _, _ = ARRAYS[name]
+            length = self.rows * self._row_width(name)
+            path = os.path.join(self.path, file_name)
+            if not length or not os.path.exists(path):
+                views[name] = array(typecode)
+                continue
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            size = length * array(typecode).itemsize
+            if sys.byteorder == 'little':
+                # 只映射已提交的部分，之后未提交的字节可能不是完整的元素
+                views[name] = memoryview(mapped)[:size].cast(typecode)
+            else:
+                data = array(typecode)
+                data.frombytes(mapped[:size])
+                data.byteswap()
+                views[name] = data
+        self._views = views
+        return views
+
+    def close(self):
+        if self._views is not None:
+            for view in self._views.values():
+                if isinstance(view, memoryview):
+                    view.release()
+            self._views = None
+
+    def row_range(self, start=None, end=None):
+        """爬取时间位于 [start, end] 的行号范围 (lo, hi)"""
+        times = self._load_views()['time']
+        lo = 0 if start is None else bisect.bisect_left(times, to_seconds(start))
+        hi = len(times) if end is None else bisect.bisect_right(times, to_seconds(end))
+        return lo, max(lo, hi)
+
+    def times(self, start=None, end=None):
+        lo, hi = self.row_range(start, end)
+        return [from_seconds(seconds) for seconds in self._load_views()['time'][lo:hi]]
+
+    def series(self, code, start=None, end=None):
+        """某个景点的 [(爬取时间, 人数)]，跳过没有该景点的爬取"""
+        col = self._columns.get(code)
+        if col is None or col >= self.capacity:
+            return []
+        views = self._load_views()
+        lo, hi = self.row_range(start, end)
+        num, times = views['num'], views['time']
+        result = []
+        for r in range(lo, hi):
+            value = num[r * self.capacity + col]
+            if value != MISSING:
+                result.append((from_seconds(times[r]), value))
+        return result
+
+    def snapshot(self, row=-1):
+        """某次爬取（默认最后一次）各景点的 {CODE: (人数, SSD, TYPE)}"""
+        if not self.rows:
+            return {}
+        row = row % self.rows
+        views = self._load_views()
+        base = row * self.capacity
+        result = {}
+        for col, (code, _) in enumerate(self.spots[:self.capacity]):
+            value = views['num'][base + col]
+            if value != MISSING:
+                result[code] = (value, self.states['ssd'][views['ssd'][base + col]],
+                                self.states['type'][views['type'][base + col]])
+        return result
+
+    def totals(self, start=None, end=None):
+        """每次爬取的全市总人数 [(爬取时间, 总人数)]"""
+        views = self._load_views()
+        lo, hi = self.row_range(start, end)
+        result = []
+        for r in range(lo, hi):
+            row = views['num'][r * self.capacity:(r + 1) * self.capacity]
+            result.append((from_seconds(views['time'][r]), sum(v for v in row if v > 0)))
+        return result
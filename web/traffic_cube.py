@@ -0,0 +1,151 @@
+"""
+客流聚合立方体 - 按 (区, 等级, 日期, 小时) 预聚合客流，按月保存为 data/cube/YYYY-MM.json
+
+按区、等级、星期×小时等维度的图表与查询直接读取立方体，无需重放原始数据。
+
+每个单元格的度量（先取每个景点每小时的峰值，再在单元格内汇总）：
+- sum: 各景点小时峰值之和（区/等级的总客流）
+- max: 单个景点的最大小时峰值
+- count: 景点小时数（参与汇总的景点个数）
+- occ_sum / cap: 有最大承载量的景点的峰值之和 / 承载量之和，二者之比为承载率
+
+所有度量都可以直接相加（max 取最大值）合并，上卷到任意维度组合
+"""
+
+from datetime import datetime
+
+SCHEMA_VERSION = 1
+MEASURES = ('sum', 'max', 'count', 'occ_sum', 'cap')
+# 可用于分组的维度（weekday 由 date 推算，0 为周一）
+DIMENSIONS = ('district', 'grade', 'date', 'hour', 'weekday')
+
+
+def capacity(spot):
+    try:
+        return max(int(spot.get('MAX_NUM') or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class DayCube:
+    """
+    单日立方体
+
+    add() 接收概览数据中的每条读数；同一景点同一小时只保留峰值，
+    因此同一读数 (景点, TIME) 在当天文件中重复出现不会影响结果
+    """
+
+    def __init__(self, date):
+        self.date = date  # 'YYYY-MM-DD'
+        self.peaks = {}  # {(景点ID, 小时): 峰值}
+        self.dims = {}   # {景点ID: (区, 等级, 最大承载量)}
+
+    def add(self, spot_id, minute, num, spot):
+        """minute 为相对当天0点的分钟数；前一天遗留的读数（minute < 0）已计入前一天"""
+        if not 0 <= minute < 24 * 60:
+            return
+        key = (spot_id, minute // 60)
+        if num > self.peaks.get(key, -1):
+            self.peaks[key] = num
+        if spot_id not in self.dims:
+            self.dims[spot_id] = (spot.get('DNAME') or '其他', spot.get('GRADE') or '其他', capacity(spot))
+
+    def cells(self):
+        """{(区, 等级, 小时): [sum, max, count, occ_sum, cap]}"""
+        cells = {}
+        for (spot_id, hour), num in self.peaks.items():
+            district, grade, cap = self.dims[spot_id]
+            cell = cells.get((district, grade, hour))
+            if cell is None:
+                cell = cells[(district, grade, hour)] = [0, 0, 0, 0, 0]
+            cell[0] += num
+            cell[1] = max(cell[1], num)
+            cell[2] += 1
+            if cap:
+                cell[3] += num
+                cell[4] += cap
+        return cells
+
+
+def encode_month(month, days, signatures=None):
+    """
+    按月的紧凑格式：区与等级存为字典表，每天一组行 [区序号, 等级序号, 小时, *度量]
+
+    days: {日期: {(区, 等级, 小时): 度量列表}}；signatures: {日期: 源文件签名}
+    """
+    districts = sorted({key[0] for cells in days.values() for key in cells})
+    grades = sorted({key[1] for cells in days.values() for key in cells})
+    district_idx = {name: i for i, name in enumerate(districts)}
+    grade_idx = {name: i for i, name in enumerate(grades)}
+
+    encoded = {}
+    for date in sorted(days):
+        rows = [[district_idx[district], grade_idx[grade], hour] + list(values)
+                for (district, grade, hour), values in days[date].items()]
+        rows.sort()
+        encoded[date] = rows
+    return {
+        "schema": SCHEMA_VERSION,
+        "month": month,
+        "dimensions": ["district", "grade", "date", "hour"],
+        "measures": list(MEASURES),
+        "districts": districts,
+        "grades": grades,
+        "signatures": dict(sorted((signatures or {}).items())),
+        "days": encoded
+    }
+
+
+def decode_month(payload):
+    """encode_month 的逆过程，返回 (days, signatures)；版本不符时返回空结果"""
+    if not payload or payload.get('schema') != SCHEMA_VERSION:
+        return {}, {}
+    districts, grades = payload['districts'], payload['grades']
+    days = {}
+    for date, rows in payload['days'].items():
+        days[date] = {(districts[row[0]], grades[row[1]], row[2]): row[3:] for row in rows}
+    return days, dict(payload.get('signatures', {}))
+
+
+def iter_cells(payloads):
+    """逐个单元格展开一个或多个月的立方体：{'district', 'grade', 'date', 'hour', 'weekday', 各度量}"""
+    for payload in payloads:
+        days, _ = decode_month(payload)
+        for date, cells in sorted(days.items()):
+            weekday = datetime.strptime(date, '%Y-%m-%d').weekday()
+            for (district, grade, hour), values in cells.items():
+                cell = {'district': district, 'grade': grade, 'date': date, 'hour': hour, 'weekday': weekday}
+                cell.update(zip(MEASURES, values))
+                yield cell
+
+
+def rollup(payloads, by=('district',), where=None):
+    """
+    按 by 中的维度上卷，返回按维度排序的行，附带 mean（平均小时峰值）与 occupancy（承载率）
+
+    例：rollup(months, by=('weekday', 'hour'))、rollup(months, by=('district',), where=lambda c: c['hour'] >= 18)
+    """
+    unknown = set(by) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"未知的维度: {', '.join(sorted(unknown))}")
+    groups = {}
+    for cell in iter_cells(payloads):
+        if where is not None and not where(cell):
+            continue
+        key = tuple(cell[dim] for dim in by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = dict(zip(by, key), **{m: 0 for m in MEASURES})
+        for measure in MEASURES:
+            if measure == 'max':
+                group['max'] = max(group['max'], cell['max'])
+            else:
+                group[measure] += cell[measure]
+
+    rows = []
+    for key in sorted(groups):
+        group = groups[key]
+        group['mean'] = round(group['sum'] / group['count'], 1) if group['count'] else 0
+        group['occupancy'] = round(group['occ_sum'] / group['cap'], 4) if group['cap'] else None
+        rows.append(group)
+    return rows